@@ -0,0 +1,50 @@
+"""
+Mueve las citas antiguas y su historial de estados a las tablas de archivo
+(ver services/archivo_service.py).
+
+Se archivan las citas con fecha anterior al primer día del mes que está
+ARCHIVO_CITAS_MESES meses atrás (24 por defecto). Cada lote se confirma por
+separado, así que el script se puede interrumpir y volver a ejecutar.
+Requiere haber ejecutado migrate_archivo.py. Conviene programarlo una vez
+al mes, en un horario de poco tráfico.
+
+Ejecutar:
+    python archivar_citas.py [--meses N] [--lote N] [--max-lotes N]
+"""
+
+import argparse
+
+from app import app
+from services.archivo_service import ArchivoService, fecha_corte
+
+
+def run_archivo(meses=None, tamano_lote=ArchivoService.TAMANO_LOTE, max_lotes=None):
+    print("=" * 60)
+    print("  ARCHIVO: Citas antiguas")
+    print("=" * 60)
+
+    with app.app_context():
+        meses = meses if meses is not None else app.config["ARCHIVO_CITAS_MESES"]
+        corte = fecha_corte(meses)
+        print(f"  - Citas con fecha anterior a {corte} (lotes de {tamano_lote})")
+
+        try:
+            citas, historial = ArchivoService.archivar(corte, tamano_lote, max_lotes)
+            print(f"  ✓ {citas} citas y {historial} cambios de estado archivados")
+
+            print("\n" + "=" * 60)
+            print("  ✓ ARCHIVO COMPLETADO EXITOSAMENTE")
+            print("=" * 60)
+
+        except Exception as e:
+            print(f"\n✗ Error al archivar: {e}")
+            raise
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archiva las citas antiguas y su historial")
+    parser.add_argument("--meses", type=int, default=None, help="Meses que se conservan (ARCHIVO_CITAS_MESES)")
+    parser.add_argument("--lote", type=int, default=ArchivoService.TAMANO_LOTE, help="Citas por transacción")
+    parser.add_argument("--max-lotes", type=int, default=None, help="Detenerse tras N lotes")
+    args = parser.parse_args()
+    run_archivo(args.meses, args.lote, args.max_lotes)
@@ -40,6 +40,34 @@ class Config:
     # Configuración de CORS para cookies
     CORS_SUPPORTS_CREDENTIALS = True
 
+    # Tiempo que se guardan las respuestas de peticiones con Idempotency-Key
+    IDEMPOTENCY_KEY_TTL = timedelta(hours=int(os.getenv('IDEMPOTENCY_KEY_TTL_HOURS', 24)))
+
+    # Plazo para que la petición que reclamó una Idempotency-Key responda; si
+    # el worker muere antes, un reintento la puede volver a reclamar. Debe
+    # superar lo que tarda la escritura más lenta (gunicorn --timeout 120)
+    IDEMPOTENCY_LEASE = timedelta(seconds=int(os.getenv('IDEMPOTENCY_LEASE_SECONDS', 120)))
+
+    # Streams de disponibilidad abiertos a la vez por proceso. Cada uno ocupa un
+    # hilo de gunicorn, debe quedar por debajo de --threads
+    SSE_MAX_SUSCRIPTORES = int(os.getenv('SSE_MAX_SUSCRIPTORES', 2))
+
+    # Segundos que se reutiliza la matriz de disponibilidad mensual de un área
+    # y el resumen mensual de un médico.
+    # Las escrituras del mismo proceso la invalidan al instante; las de otros
+    # workers se ven a lo sumo tras este tiempo
+    DISPONIBILIDAD_CACHE_SEGUNDOS = int(os.getenv('DISPONIBILIDAD_CACHE_SEGUNDOS', 30))
+
+    # Segundos entre reconstrucciones completas del índice de cupos libres
+    # (/api/horarios/proximo-disponible). Las reservas y liberaciones del
+    # mismo proceso lo actualizan al confirmarse; las de otros workers se ven
+    # a lo sumo tras este tiempo
+    PROXIMO_DISPONIBLE_SEGUNDOS = int(os.getenv('PROXIMO_DISPONIBLE_SEGUNDOS', 60))
+
+    # Meses que las citas permanecen en las tablas principales antes de
+    # pasar al archivo (archivar_citas.py)
+    ARCHIVO_CITAS_MESES = int(os.getenv('ARCHIVO_CITAS_MESES', 24))
+
     
     # Custom Configs
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
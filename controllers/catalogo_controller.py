@@ -22,5 +22,4 @@ class CatalogoController:
     @staticmethod
     def get_estados_cita():
         from models.estado_cita_model import EstadoCita
-        estados = EstadoCita.query.filter_by(activo=True).all()
-        return jsonify([e.to_dict() for e in estados]), 200
+        return jsonify([e._asdict() for e in EstadoCita.catalogo() if e.activo]), 200
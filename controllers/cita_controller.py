@@ -1,4 +1,4 @@
-from flask import jsonify, request, send_file, Response
+from flask import jsonify, request, send_file, Response, stream_with_context
 from extensions.database import db
 from models.cita_model import Cita
 from models.paciente_model import Paciente
@@ -8,12 +8,220 @@ from models.usuario_model import Usuario
 from models.persona_model import Persona
 from models.estado_cita_model import EstadoCita
 from models.historial_estado_cita_model import HistorialEstadoCita
+from models.cita_archivada_model import CitaArchivada, HistorialEstadoCitaArchivado
+from models.lista_espera_model import ListaEspera
+from controllers.lista_espera_controller import ListaEsperaController
 
 from services.pdf_service import PDFService
-from datetime import datetime
+from services.persona_service import PersonaService
+from utils.pagination import paginar, paginar_por_cursor
+from utils.fields import parsear_campos, plan_campos, plan_filas
+from sqlalchemy import bindparam, insert, update
+from datetime import datetime, timedelta
+from collections import Counter, defaultdict
+import csv
+import io
+import json
+
+def _paciente_listado(cita):
+    if not cita.paciente:
+        return None
+    return {
+        "id": cita.paciente.id,
+        "nombres": cita.paciente.nombres,
+        "apellido_paterno": cita.paciente.apellido_paterno,
+        "apellido_materno": cita.paciente.apellido_materno,
+        "dni": cita.paciente.dni,
+        "telefono": cita.paciente.telefono,
+        "email": cita.paciente.email
+    }
+
+
+# Columna de Persona -> clave del payload con los datos del acompañante
+CAMPOS_ACOMPANANTE = (
+    ("nombres", "nombres_acompanante"),
+    ("apellido_paterno", "apellido_paterno_acompanante"),
+    ("apellido_materno", "apellido_materno_acompanante"),
+    ("telefono", "telefono_acompanante"),
+)
+# Valores para un acompañante nuevo sin nombre o apellidos
+ACOMPANANTE_POR_DEFECTO = {"nombres": "ACOMPAÑANTE", "apellido_paterno": ".", "apellido_materno": "."}
+
+
+def _horario_listado(cita):
+    if not cita.horario:
+        return None
+    return {
+        "id": cita.horario.id,
+        "turno": cita.horario.turno,
+        "turno_nombre": cita.horario.turno_nombre,
+        "hora_inicio": str(cita.horario.hora_inicio),
+        "hora_fin": str(cita.horario.hora_fin)
+    }
+
 
 class CitaController:
 
+    FORMATOS_EXPORTACION = ('ndjson', 'csv')
+
+    # Filas leídas por lote desde el cursor del servidor al exportar
+    LOTE_EXPORTACION = 500
+
+    # Máximo de citas por cambio de estado masivo
+    LIMITE_CAMBIO_ESTADO = 500
+
+    # Máximo de citas por creación en lote
+    LIMITE_LOTE = 1000
+
+    # Parámetros de filtro aceptados por _filtrar_listado
+    FILTROS_LISTADO = ('fecha', 'fecha_inicio', 'fecha_fin', 'fecha_registro', 'doctor_id',
+                       'area', 'area_id', 'estado', 'paciente_dni', 'turno')
+
+    # Campos disponibles en el listado: los de Cita.to_dict() más los bloques de paciente y horario
+    CAMPOS_LISTADO = {
+        **Cita.CAMPOS,
+        "paciente": (_paciente_listado,
+                     "paciente.persona.nombres", "paciente.persona.apellido_paterno",
+                     "paciente.persona.apellido_materno", "paciente.persona.dni",
+                     "paciente.persona.telefono", "paciente.persona.email"),
+        "horario": (_horario_listado, "horario.turno"),
+    }
+
+    # Columnas que leen los endpoints de impresión (JSON y PDF)
+    RUTAS_IMPRESION = (
+        "id", "fecha_registro", "hora",
+        "paciente.persona.nombres", "paciente.persona.apellido_paterno",
+        "paciente.persona.apellido_materno", "paciente.persona.dni", "paciente.persona.telefono",
+        "horario.turno",
+        "horario.medico.persona.nombres", "horario.medico.persona.apellido_paterno",
+        "horario.medico.persona.apellido_materno",
+    )
+
+    @staticmethod
+    def _plan_listado(campos=None):
+        """
+        Plan de lectura para serializar citas en listados.
+        Selecciona en una sola consulta, como tuplas, solo las columnas que usan
+        los campos pedidos (todos por defecto), sin hidratar objetos del ORM.
+        """
+        return plan_campos(Cita, CitaController.CAMPOS_LISTADO, campos)
+
+    @staticmethod
+    def _serializar_listado(cita, campos=None):
+        """Serializa una cita para el listado con datos de paciente y horario."""
+        cita_dict = cita.to_dict(campos)
+
+        # Los bloques de paciente y horario solo se incluyen si existen
+        for clave in ("paciente", "horario"):
+            if campos is None or clave in campos:
+                bloque = CitaController.CAMPOS_LISTADO[clave][0](cita)
+                if bloque is not None:
+                    cita_dict[clave] = bloque
+
+        return cita_dict
+
+    @staticmethod
+    def _filtrar_listado(query):
+        """
+        Aplica a `query` los filtros de listado recibidos en request.args.
+        Compartido por el listado paginado y la exportación.
+
+        IMPORTANTE: Si el usuario autenticado es un profesional (rol_id = 2),
+        solo verá las citas asignadas a él.
+        """
+        fecha = request.args.get('fecha')  # Fecha de la cita YYYY-MM-DD
+        fecha_inicio = request.args.get('fecha_inicio')  # Rango de fechas de cita YYYY-MM-DD
+        fecha_fin = request.args.get('fecha_fin')
+        fecha_registro = request.args.get('fecha_registro')  # Fecha de registro YYYY-MM-DD
+        doctor_id = request.args.get('doctor_id')
+        area = request.args.get('area')
+        area_id = request.args.get('area_id')
+        estado = request.args.get('estado')
+        paciente_dni = request.args.get('paciente_dni')
+        turno = request.args.get('turno')
+
+        # Si el usuario autenticado es un profesional (rol_id = 2),
+        # forzar el filtro de doctor_id para que solo vea sus propias citas
+        # y restringir los estados visibles
+        is_profesional = False
+        if hasattr(request, 'user') and request.user:
+            user_rol_id = request.user.get('rol_id')
+            user_id = request.user.get('id')
+            
+            # Rol 2 = Profesional: solo puede ver sus propias citas
+            if user_rol_id == 2 and user_id:
+                doctor_id = user_id
+                is_profesional = True
+
+        # Filtro por fecha de la cita
+        if fecha:
+            try:
+                fecha_obj = datetime.strptime(fecha, "%Y-%m-%d").date()
+                query = query.filter(Cita.fecha == fecha_obj)
+            except ValueError:
+                pass
+
+        # Filtro por rango de fechas de la cita (ambos extremos incluidos).
+        # Parte del contrato de la exportación; al ser compartido también lo usa el listado
+        if fecha_inicio:
+            try:
+                query = query.filter(Cita.fecha >= datetime.strptime(fecha_inicio, "%Y-%m-%d").date())
+            except ValueError:
+                pass
+        if fecha_fin:
+            try:
+                query = query.filter(Cita.fecha <= datetime.strptime(fecha_fin, "%Y-%m-%d").date())
+            except ValueError:
+                pass
+
+        # Filtro por fecha de registro
+        # Rango semiabierto [día, día + 1) para que pueda usar el índice de fecha_registro
+        if fecha_registro:
+            try:
+                inicio_dia = datetime.strptime(fecha_registro, "%Y-%m-%d")
+                query = query.filter(
+                    Cita.fecha_registro >= inicio_dia,
+                    Cita.fecha_registro < inicio_dia + timedelta(days=1)
+                )
+            except ValueError:
+                pass
+
+        if doctor_id:
+            query = query.filter_by(doctor_id=doctor_id)
+        
+        # Filtro por área (por ID o por nombre)
+        if area_id:
+            query = query.filter_by(area_id=area_id)
+        elif area:
+            # Buscar por nombre de área (case-insensitive, parcial)
+            query = query.join(Area, Cita.area_id == Area.id).filter(
+                Area.nombre.ilike(f"%{area}%")
+            )
+        # Filtro de estado
+        # Para profesionales: solo pueden ver estados específicos
+        # (confirmada, atendida, no_asistio, referido) - NO ven pendientes ni canceladas
+            estados_permitidos_nombres = ['confirmada', 'atendida', 'no_asistio', 'referido']
+            if estado and estado in estados_permitidos_nombres:
+                # Filtrar por un estado específico
+                 query = query.filter(Cita.estado_id.in_(EstadoCita.catalogo().ids(estado)))
+            else:
+                # Mostrar todos los permitidos
+                 query = query.filter(Cita.estado_id.in_(EstadoCita.catalogo().ids(*estados_permitidos_nombres)))
+        elif estado:
+            # Filtrar por nombre de estado normalizado (id desde el catálogo, sin JOIN)
+            query = query.filter(Cita.estado_id.in_(EstadoCita.catalogo().ids(estado)))
+
+        if paciente_dni:
+            query = query.join(Paciente).join(Persona, Paciente.persona_id == Persona.id).filter(Persona.dni.ilike(f"%{paciente_dni}%"))
+
+        # Filtro por turno (si tiene horario asociado)
+        if turno:
+            query = query.join(HorarioMedico, Cita.horario_id == HorarioMedico.id).filter(
+                HorarioMedico.turno == turno
+            )
+
+        return query
+
     @staticmethod
     def listar():
         """
@@ -26,6 +234,7 @@ class CitaController:
         - page: Página actual (default: 1)
         - per_page: Items por página (default: 10)
         - fecha: Filtrar por fecha de cita (YYYY-MM-DD)
+        - fecha_inicio / fecha_fin: Filtrar por rango de fechas de cita (YYYY-MM-DD)
         - fecha_registro: Filtrar por fecha de registro (YYYY-MM-DD)
         - doctor_id: Filtrar por ID del doctor
         - area: Filtrar por nombre de área (búsqueda parcial)
@@ -33,116 +242,53 @@ class CitaController:
         - estado: Filtrar por estado (pendiente, confirmada, atendida, cancelada, referido, no_asistio)
         - paciente_dni: Filtrar por DNI del paciente
         - turno: Filtrar por turno ('M' o 'T')
+        - fields: Campos a retornar separados por coma (ej: id,fecha,estado,paciente).
+          Solo se consultan las columnas y relaciones que esos campos necesitan.
+        - cursor: Activa la paginación por cursor. Enviar vacío para la primera
+          página y luego el `next_cursor` recibido. En este modo no se calcula
+          `total` ni `pages`.
         """
         try:
             page = request.args.get('page', 1, type=int)
             per_page = request.args.get('per_page', 10, type=int)
-            fecha = request.args.get('fecha')  # Fecha de la cita YYYY-MM-DD
-            fecha_registro = request.args.get('fecha_registro')  # Fecha de registro YYYY-MM-DD
-            doctor_id = request.args.get('doctor_id')
-            area = request.args.get('area')
-            area_id = request.args.get('area_id')
-            estado = request.args.get('estado')
-            paciente_dni = request.args.get('paciente_dni')
-            turno = request.args.get('turno')
-            
-            # Si el usuario autenticado es un profesional (rol_id = 2),
-            # forzar el filtro de doctor_id para que solo vea sus propias citas
-            # y restringir los estados visibles
-            is_profesional = False
-            if hasattr(request, 'user') and request.user:
-                user_rol_id = request.user.get('rol_id')
-                user_id = request.user.get('id')
-                
-                # Rol 2 = Profesional: solo puede ver sus propias citas
-                if user_rol_id == 2 and user_id:
-                    doctor_id = user_id
-                    is_profesional = True
 
-            query = Cita.query
+            try:
+                campos = parsear_campos(request.args.get('fields'), CitaController.CAMPOS_LISTADO)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
 
-            # Filtro por fecha de la cita
-            if fecha:
-                try:
-                    fecha_obj = datetime.strptime(fecha, "%Y-%m-%d").date()
-                    query = query.filter(Cita.fecha == fecha_obj)
-                except ValueError:
-                    pass
+            # En modo cursor también se cargan las columnas de la clave de ordenamiento
+            campos_carga = campos
+            if campos is not None and 'cursor' in request.args:
+                campos_carga = campos | {"fecha", "fecha_registro"}
 
-            # Filtro por fecha de registro
-            if fecha_registro:
+            plan = CitaController._plan_listado(campos_carga)
+            query = plan.aplicar(CitaController._filtrar_listado(Cita.query))
+
+            if 'cursor' in request.args:
+                # Paginación por cursor sobre (fecha DESC NULLS LAST, fecha_registro DESC, id DESC)
                 try:
-                    fecha_obj = datetime.strptime(fecha_registro, "%Y-%m-%d").date()
-                    query = query.filter(db.func.date(Cita.fecha_registro) == fecha_obj)
-                except ValueError:
-                    pass
-
-            if doctor_id:
-                query = query.filter_by(doctor_id=doctor_id)
-            
-            # Filtro por área (por ID o por nombre)
-            if area_id:
-                query = query.filter_by(area_id=area_id)
-            elif area:
-                # Buscar por nombre de área (case-insensitive, parcial)
-                query = query.join(Area, Cita.area_id == Area.id).filter(
-                    Area.nombre.ilike(f"%{area}%")
-                )
-            # Filtro de estado
-            # Para profesionales: solo pueden ver estados específicos
-            # (confirmada, atendida, no_asistio, referido) - NO ven pendientes ni canceladas
-                estados_permitidos_nombres = ['confirmada', 'atendida', 'no_asistio', 'referido']
-                if estado and estado in estados_permitidos_nombres:
-                    # Filtrar por un estado específico
-                     query = query.join(EstadoCita).filter(EstadoCita.nombre == estado)
-                else:
-                    # Mostrar todos los permitidos
-                     query = query.join(EstadoCita).filter(EstadoCita.nombre.in_(estados_permitidos_nombres))
-            elif estado:
-                # Filtrar por nombre de estado normalizado
-                query = query.join(EstadoCita).filter(EstadoCita.nombre == estado)
-
-            if paciente_dni:
-                query = query.join(Paciente).join(Persona, Paciente.persona_id == Persona.id).filter(Persona.dni.ilike(f"%{paciente_dni}%"))
-
-            # Filtro por turno (si tiene horario asociado)
-            if turno:
-                query = query.join(HorarioMedico, Cita.horario_id == HorarioMedico.id).filter(
-                    HorarioMedico.turno == turno
-                )
+                    filas, next_cursor = paginar_por_cursor(
+                        query,
+                        [(Cita.fecha, True), (Cita.fecha_registro, True), (Cita.id, False)],
+                        request.args.get('cursor'),
+                        per_page
+                    )
+                except ValueError as e:
+                    return jsonify({"error": str(e)}), 400
+
+                return jsonify({
+                    "per_page": per_page,
+                    "next_cursor": next_cursor,
+                    "data": [CitaController._serializar_listado(plan.construir(f), campos) for f in filas]
+                }), 200
 
             # Ordenar por fecha de cita descendente, luego por fecha_registro
             query = query.order_by(Cita.fecha.desc().nullslast(), Cita.fecha_registro.desc())
 
-            pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+            pagination = paginar(query, page, per_page)
 
-            data = []
-            for cita in pagination.items:
-                cita_dict = cita.to_dict()
-                
-                # Incluir datos del paciente
-                if cita.paciente:
-                    cita_dict['paciente'] = {
-                        "id": cita.paciente.id,
-                        "nombres": cita.paciente.nombres,
-                        "apellido_paterno": cita.paciente.apellido_paterno,
-                        "apellido_materno": cita.paciente.apellido_materno,
-                        "dni": cita.paciente.dni,
-                        "telefono": cita.paciente.telefono,
-                        "email": cita.paciente.email
-                    }
-                
-                # Incluir información del horario si existe
-                if cita.horario:
-                    cita_dict['horario'] = {
-                        "id": cita.horario.id,
-                        "turno": cita.horario.turno,
-                        "turno_nombre": cita.horario.turno_nombre,
-                        "hora_inicio": str(cita.horario.hora_inicio),
-                        "hora_fin": str(cita.horario.hora_fin)
-                    }
-                
-                data.append(cita_dict)
+            data = [CitaController._serializar_listado(plan.construir(f), campos) for f in pagination.items]
 
             return jsonify({
                 "total": pagination.total,
@@ -155,6 +301,72 @@ class CitaController:
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
+    @staticmethod
+    def exportar():
+        """
+        Exporta citas en streaming, con los mismos filtros que listar().
+
+        Las filas se leen con un cursor del lado del servidor (yield_per) y se
+        escriben a medida que llegan, por lo que la memoria se mantiene estable
+        y el primer byte sale de inmediato aunque el rango tenga miles de citas.
+
+        Query params:
+        - format: 'ndjson' (default) o 'csv'
+        - fields: Campos a exportar separados por coma (default: todos)
+        - Filtros de listar(): fecha, fecha_inicio, fecha_fin, fecha_registro,
+          doctor_id, area, area_id, estado, paciente_dni, turno
+        """
+        formato = request.args.get('format', 'ndjson')
+        if formato not in CitaController.FORMATOS_EXPORTACION:
+            return jsonify({"error": "Formato inválido. Use 'ndjson' o 'csv'"}), 400
+
+        try:
+            campos = parsear_campos(request.args.get('fields'), CitaController.CAMPOS_LISTADO)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        plan = CitaController._plan_listado(campos)
+        query = plan.aplicar(CitaController._filtrar_listado(Cita.query))
+        query = query.order_by(Cita.fecha.desc().nullslast(), Cita.fecha_registro.desc(), Cita.id.desc())
+        citas = (plan.construir(fila) for fila in query.yield_per(CitaController.LOTE_EXPORTACION))
+
+        columnas = [c for c in CitaController.CAMPOS_LISTADO if campos is None or c in campos]
+
+        def generar_ndjson():
+            for cita in citas:
+                yield json.dumps(CitaController._serializar_listado(cita, campos), ensure_ascii=False, default=str) + "\n"
+
+        def generar_csv():
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=columnas, extrasaction='ignore')
+
+            # BOM para que Excel reconozca UTF-8 (tildes y ñ)
+            buffer.write("\ufeff")
+            writer.writeheader()
+            for cita in citas:
+                fila = CitaController._serializar_listado(cita, campos)
+                # Valores anidados (paciente, horario, estado_info, ...) como JSON en la celda
+                writer.writerow({
+                    k: json.dumps(v, ensure_ascii=False, default=str) if isinstance(v, (dict, list)) else v
+                    for k, v in fila.items()
+                })
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+            if buffer.tell():
+                yield buffer.getvalue()
+
+        mimetype, generador = {
+            'ndjson': ('application/x-ndjson', generar_ndjson),
+            'csv': ('text/csv', generar_csv),
+        }[formato]
+
+        return Response(
+            stream_with_context(generador()),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f"attachment; filename=citas.{formato}"}
+        )
+
     @staticmethod
     def crear():
         """
@@ -169,7 +381,8 @@ class CitaController:
             "area_id": int (opcional, se obtiene del horario si no se envía),
             "dni_acompanante": string (opcional),
             "nombre_acompanante": string (opcional),
-            "telefono_acompanante": string (opcional)
+            "telefono_acompanante": string (opcional),
+            "lista_espera": bool (opcional, si no hay cupos agrega al paciente a la lista de espera)
         }
         """
         try:
@@ -201,20 +414,24 @@ class CitaController:
             if horario.fecha != fecha_cita:
                 return jsonify({"error": "La fecha no coincide con el horario seleccionado"}), 400
             
-            # Contar citas existentes para este horario en esta fecha
-            # Contar citas existentes usando relación de estado
-            citas_existentes = Cita.query.join(EstadoCita).filter(
-                Cita.horario_id == horario.id,
-                Cita.fecha == fecha_cita,
-                EstadoCita.nombre != 'cancelada'
-            ).count()
-            
-            # Validar cupos disponibles
-            if citas_existentes >= horario.cupos:
+            # Reservar el cupo y su hora con un UPDATE condicional sobre el horario
+            # (correcto aunque dos recepcionistas reserven el último cupo a la vez)
+            reserva = HorarioMedico.reservar_cupo(horario.id)
+            if reserva is None:
+                if data.get("lista_espera"):
+                    entrada, error, status = ListaEsperaController.agregar_entrada(data, horario)
+                    if error:
+                        db.session.rollback()
+                        return jsonify({"error": error}), status
+                    db.session.commit()
+                    return jsonify({
+                        "message": "No hay cupos disponibles; el paciente quedó en lista de espera",
+                        "lista_espera": entrada.to_dict()
+                    }), 202
                 return jsonify({
                     "error": "No hay cupos disponibles para este horario",
                     "cupos_totales": horario.cupos,
-                    "cupos_ocupados": citas_existentes
+                    "cupos_ocupados": horario.ocupados
                 }), 400
             
             # Determinar area_id (del payload o del horario)
@@ -224,34 +441,15 @@ class CitaController:
             area = Area.query.get(area_id)
             area_nombre = area.nombre if area else "Sin área"
             
-            # Gestionar Acompañante
+            # Gestionar Acompañante (crea la persona o actualiza los datos enviados)
             acompanante_persona_id = None
             dni_ac = data.get("dni_acompanante")
             if dni_ac:
-                acompanante = Persona.query.filter_by(dni=dni_ac).first()
-                if not acompanante:
-                    acompanante = Persona(
-                        dni=dni_ac,
-                        nombres=data.get("nombres_acompanante", "ACOMPAÑANTE"),
-                        apellido_paterno=data.get("apellido_paterno_acompanante", "."),
-                        apellido_materno=data.get("apellido_materno_acompanante", "."),
-                        telefono=data.get("telefono_acompanante")
-                    )
-                    db.session.add(acompanante)
-                    db.session.flush()
-                else:
-                    # Actualizar datos si existen nuevos valores
-                    if data.get("nombres_acompanante"):
-                        acompanante.nombres = data.get("nombres_acompanante")
-                    if data.get("apellido_paterno_acompanante"):
-                        acompanante.apellido_paterno = data.get("apellido_paterno_acompanante")
-                    if data.get("apellido_materno_acompanante"):
-                        acompanante.apellido_materno = data.get("apellido_materno_acompanante")
-                    # Actualizar teléfono si cambió
-                    if data.get("telefono_acompanante"):
-                        acompanante.telefono = data.get("telefono_acompanante")
-                
-                acompanante_persona_id = acompanante.id
+                acompanante_persona_id = PersonaService.upsert(
+                    dni_ac,
+                    {campo: data[clave] for campo, clave in CAMPOS_ACOMPANANTE if data.get(clave)},
+                    por_defecto=ACOMPANANTE_POR_DEFECTO
+                )
 
             # Crear la cita
             nueva_cita = Cita(
@@ -260,13 +458,14 @@ class CitaController:
                 doctor_id=horario.medico_id,
                 area_id=area_id,
                 fecha=fecha_cita,
+                hora=reserva.horas[0],
                 sintomas=data["sintomas"],
                 acompanante_persona_id=acompanante_persona_id,
                 datos_adicionales=data.get("datos_adicionales")
             )
             
             # Buscar estado pendiente
-            estado_pendiente = EstadoCita.query.filter_by(nombre="pendiente").first()
+            estado_pendiente = EstadoCita.catalogo().por_nombre("pendiente")
             if estado_pendiente:
                 nueva_cita.estado_id = estado_pendiente.id
             
@@ -274,7 +473,7 @@ class CitaController:
             db.session.commit()
             
             # Calcular cupos restantes para la respuesta
-            cupos_restantes = horario.cupos - (citas_existentes + 1)
+            cupos_restantes = horario.cupos - reserva.ocupados
             
             return jsonify({
                 "message": "Cita creada exitosamente",
@@ -286,6 +485,167 @@ class CitaController:
             db.session.rollback()
             return jsonify({"error": str(e)}), 500
 
+    @staticmethod
+    def _acompanantes_lote(items):
+        """
+        Obtiene o crea en bloque las personas acompañantes de `items` y
+        retorna {dni: persona_id}. Los datos enviados actualizan a las
+        personas existentes, como en crear().
+        """
+        filas = [
+            {"dni": item["dni_acompanante"],
+             **{campo: item[clave] for campo, clave in CAMPOS_ACOMPANANTE if item.get(clave)}}
+            for item in items if item.get("dni_acompanante")
+        ]
+        if not filas:
+            return {}
+        return PersonaService.upsert_lote(filas, por_defecto=ACOMPANANTE_POR_DEFECTO)
+
+    @staticmethod
+    def crear_lote():
+        """
+        Crear varias citas en una sola transacción (jornadas y campañas).
+
+        Payload esperado:
+        {
+            "citas": [ { mismo formato que POST /api/citas }, ... ]
+        }
+
+        - Valida cada cita por separado; las inválidas no impiden crear las demás.
+        - Bloquea cada horario distinto una sola vez y reparte sus cupos libres
+          en el orden de la lista.
+        - Crea o actualiza los acompañantes en bloque e inserta todas las citas
+          con un solo executemany.
+
+        Returns:
+            Resultado por cita, en el orden recibido: {indice, success, id} o {indice, success, error}
+        """
+        try:
+            data = request.get_json(silent=True) or {}
+            items = data.get("citas")
+
+            if not isinstance(items, list) or not items:
+                return jsonify({"error": "El campo 'citas' debe ser una lista no vacía"}), 400
+            if len(items) > CitaController.LIMITE_LOTE:
+                return jsonify({"error": f"Máximo {CitaController.LIMITE_LOTE} citas por lote"}), 400
+
+            resultados = [None] * len(items)
+            validos = []
+
+            # 1. Validación de cada item (sin consultas)
+            required_fields = ["paciente_id", "horario_id", "fecha", "sintomas"]
+            for indice, item in enumerate(items):
+                if not isinstance(item, dict):
+                    resultados[indice] = {"indice": indice, "success": False, "error": "Formato de cita inválido"}
+                    continue
+                faltante = next((f for f in required_fields if not item.get(f)), None)
+                if faltante:
+                    resultados[indice] = {"indice": indice, "success": False, "error": f"El campo '{faltante}' es obligatorio"}
+                    continue
+                try:
+                    item = {**item, "paciente_id": int(item["paciente_id"]), "horario_id": int(item["horario_id"])}
+                except (TypeError, ValueError):
+                    resultados[indice] = {"indice": indice, "success": False, "error": "paciente_id y horario_id deben ser enteros"}
+                    continue
+                try:
+                    fecha_cita = datetime.strptime(item["fecha"], "%Y-%m-%d").date()
+                except (TypeError, ValueError):
+                    resultados[indice] = {"indice": indice, "success": False, "error": "Formato de fecha inválido. Use YYYY-MM-DD"}
+                    continue
+                validos.append((indice, item, fecha_cita))
+
+            # 2. Pacientes y horarios referenciados (una consulta cada uno).
+            # Los horarios quedan bloqueados hasta el commit
+            paciente_ids = {item["paciente_id"] for _, item, _ in validos}
+            pacientes = {
+                pid for (pid,) in db.session.query(Paciente.id).filter(Paciente.id.in_(paciente_ids)).all()
+            } if paciente_ids else set()
+
+            horario_ids = {item["horario_id"] for _, item, _ in validos}
+            horarios = {
+                h.id: h for h in HorarioMedico.query.filter(HorarioMedico.id.in_(horario_ids))
+                .order_by(HorarioMedico.id).with_for_update().all()
+            } if horario_ids else {}
+
+            # 3. Cupos: los libres de cada horario se asignan en el orden de la lista
+            libres = {h.id: h.cupos - h.ocupados for h in horarios.values()}
+            aceptados = []
+            for indice, item, fecha_cita in validos:
+                horario = horarios.get(item["horario_id"])
+                error = None
+                if item["paciente_id"] not in pacientes:
+                    error = "Paciente no encontrado"
+                elif not horario:
+                    error = "Horario no encontrado"
+                elif horario.fecha != fecha_cita:
+                    error = "La fecha no coincide con el horario seleccionado"
+                elif libres[horario.id] <= 0:
+                    error = "No hay cupos disponibles para este horario"
+
+                if error:
+                    resultados[indice] = {"indice": indice, "success": False, "error": error}
+                    continue
+                libres[horario.id] -= 1
+                aceptados.append((indice, item, horario))
+
+            if aceptados:
+                # Cada horario se reserva una vez; sus horas se reparten en el orden de la lista
+                por_horario = Counter(horario.id for _, _, horario in aceptados)
+                horas = {}
+                for horario_id in sorted(por_horario):
+                    reserva = HorarioMedico.reservar_cupo(horario_id, por_horario[horario_id])
+                    horas[horario_id] = iter(reserva.horas if reserva else ())
+
+                # 4. Acompañantes en bloque
+                acompanantes = CitaController._acompanantes_lote([item for _, item, _ in aceptados])
+
+                # 5. Todas las citas en un solo executemany. fecha_registro crece con
+                # el orden de la lista para conservarlo en la numeración de impresión
+                estado_pendiente = EstadoCita.catalogo().por_nombre("pendiente")
+                ahora = datetime.utcnow()
+                filas = [
+                    {
+                        "paciente_id": item["paciente_id"],
+                        "horario_id": horario.id,
+                        "doctor_id": horario.medico_id,
+                        "area_id": item.get("area_id") or horario.area_id,
+                        "fecha": horario.fecha,
+                        "hora": next(horas[horario.id], None),
+                        "sintomas": item["sintomas"],
+                        "acompanante_persona_id": acompanantes.get(item.get("dni_acompanante")),
+                        "datos_adicionales": item.get("datos_adicionales"),
+                        "estado_id": estado_pendiente.id if estado_pendiente else None,
+                        "fecha_registro": ahora + timedelta(microseconds=posicion)
+                    }
+                    for posicion, (_, item, horario) in enumerate(aceptados)
+                ]
+
+                if db.engine.dialect.insert_executemany_returning_sort_by_parameter_order:
+                    ids = db.session.execute(
+                        insert(Cita).returning(Cita.id, sort_by_parameter_order=True), filas
+                    ).scalars().all()
+                else:
+                    db.session.execute(insert(Cita), filas)
+                    ids = [None] * len(filas)
+
+                for (indice, _, horario), cita_id in zip(aceptados, ids):
+                    resultados[indice] = {"indice": indice, "success": True, "id": cita_id, "horario_id": horario.id}
+
+            db.session.commit()
+
+            creadas = len(aceptados)
+            return jsonify({
+                "message": f"{creadas} de {len(items)} citas creadas",
+                "total": len(items),
+                "creadas": creadas,
+                "fallidas": len(items) - creadas,
+                "resultados": resultados
+            }), 201 if creadas else 400
+
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"error": str(e)}), 500
+
     @staticmethod
     def obtener(id):
         """
@@ -341,6 +701,7 @@ class CitaController:
             # Guardar estado anterior para el historial
             estado_anterior_id = cita.estado_id
             estado_nuevo_id = None
+            cupo_liberado = False
 
             if "doctor_id" in data:
                 cita.doctor_id = data["doctor_id"]
@@ -350,35 +711,35 @@ class CitaController:
                 cita.sintomas = data["sintomas"]
             if "estado" in data:
                 # Actualizar relación de estado
-                nuevo_estado_obj = EstadoCita.query.filter_by(nombre=data["estado"]).first()
+                nuevo_estado_obj = EstadoCita.catalogo().por_nombre(data["estado"])
                 if nuevo_estado_obj:
                     estado_nuevo_id = nuevo_estado_obj.id
+
+                    # Al cancelar se libera el cupo; al reactivar una cancelada se vuelve a reservar
+                    if cita.horario_id and estado_nuevo_id != estado_anterior_id:
+                        era_cancelada = cita.estado_nombre == 'cancelada'
+                        es_cancelada = nuevo_estado_obj.nombre == 'cancelada'
+                        if es_cancelada and not era_cancelada:
+                            HorarioMedico.liberar_cupo(cita.horario_id, horas=[cita.hora])
+                            cita.hora = None
+                            cupo_liberado = True
+                        elif era_cancelada and not es_cancelada:
+                            reserva = HorarioMedico.reservar_cupo(cita.horario_id)
+                            if reserva is None:
+                                db.session.rollback()
+                                return jsonify({"error": "No hay cupos disponibles para este horario"}), 400
+                            cita.hora = reserva.horas[0]
+
                     cita.estado_id = estado_nuevo_id
             
             if "dni_acompanante" in data:
                 dni_ac = data["dni_acompanante"]
                 if dni_ac:
-                    ac = Persona.query.filter_by(dni=dni_ac).first()
-                    if not ac:
-                        ac = Persona(
-                            dni=dni_ac,
-                            nombres=data.get("nombres_acompanante", "ACOMPAÑANTE"),
-                            apellido_paterno=data.get("apellido_paterno_acompanante", "."),
-                            apellido_materno=data.get("apellido_materno_acompanante", "."),
-                            telefono=data.get("telefono_acompanante")
-                        )
-                        db.session.add(ac)
-                        db.session.flush()
-                    else:
-                        if "nombres_acompanante" in data:
-                            ac.nombres = data["nombres_acompanante"]
-                        if "apellido_paterno_acompanante" in data:
-                            ac.apellido_paterno = data["apellido_paterno_acompanante"]
-                        if "apellido_materno_acompanante" in data:
-                            ac.apellido_materno = data["apellido_materno_acompanante"]
-                        if "telefono_acompanante" in data:
-                            ac.telefono = data["telefono_acompanante"]
-                    cita.acompanante_persona_id = ac.id
+                    cita.acompanante_persona_id = PersonaService.upsert(
+                        dni_ac,
+                        {campo: data[clave] for campo, clave in CAMPOS_ACOMPANANTE if clave in data},
+                        por_defecto=ACOMPANANTE_POR_DEFECTO
+                    )
                 else:
                     cita.acompanante_persona_id = None
 
@@ -410,12 +771,181 @@ class CitaController:
                     ip_address=ip_address
                 )
 
+            # El cupo liberado pasa al primero de la lista de espera
+            if cupo_liberado:
+                ListaEspera.promover(
+                    cita.horario_id,
+                    usuario_id=request.user.get('id') if hasattr(request, 'user') and request.user else None,
+                    ip_address=request.remote_addr
+                )
+
             db.session.commit()
             return jsonify(cita.to_dict()), 200
         except Exception as e:
             db.session.rollback()
             return jsonify({"error": str(e)}), 500
 
+    @staticmethod
+    def cambiar_estado_masivo():
+        """
+        Cambia el estado de varias citas en una sola transacción.
+
+        Body JSON:
+        - estado: Nombre del estado destino (requerido)
+        - ids: Lista de IDs de citas. Si no se envía, se usan los filtros del
+          listado recibidos como query params (fecha, area_id, estado, ...)
+        - comentario_cambio: Comentario para el historial (opcional)
+
+        Las citas se bloquean con un SELECT ... FOR UPDATE, el historial se
+        escribe con un INSERT ... SELECT y el estado con un UPDATE ... RETURNING.
+
+        Returns:
+            Resultado por cita: 'actualizada', 'sin_cambio' (ya estaba en el
+            estado destino), 'sin_cupo' (cancelada sin cupo para reactivarse)
+            o 'no_encontrada'.
+        """
+        try:
+            data = request.get_json(silent=True) or {}
+            nombre_estado = data.get("estado")
+            ids = data.get("ids")
+
+            if not nombre_estado:
+                return jsonify({"error": "El campo 'estado' es obligatorio"}), 400
+
+            estados = EstadoCita.catalogo()
+            estado_nuevo = estados.por_nombre(nombre_estado)
+            if not estado_nuevo:
+                return jsonify({"error": f"Estado '{nombre_estado}' no válido"}), 400
+
+            query = Cita.query
+            if ids is not None:
+                if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+                    return jsonify({"error": "El campo 'ids' debe ser una lista de enteros"}), 400
+                ids = list(dict.fromkeys(ids))
+                if len(ids) > CitaController.LIMITE_CAMBIO_ESTADO:
+                    return jsonify({"error": f"Máximo {CitaController.LIMITE_CAMBIO_ESTADO} citas por solicitud"}), 400
+                query = query.filter(Cita.id.in_(ids))
+            elif any(request.args.get(f) for f in CitaController.FILTROS_LISTADO):
+                query = CitaController._filtrar_listado(query)
+            else:
+                return jsonify({"error": "Debe enviar 'ids' o al menos un filtro"}), 400
+
+            # Bloquear las citas afectadas y leer su estado, horario y hora actuales
+            actuales = {
+                cita_id: (estado_id, horario_id, hora)
+                for cita_id, estado_id, horario_id, hora
+                in query.with_entities(Cita.id, Cita.estado_id, Cita.horario_id, Cita.hora)
+                .with_for_update(of=Cita)
+                .limit(CitaController.LIMITE_CAMBIO_ESTADO + 1)
+                .all()
+            }
+            if ids is None:
+                if len(actuales) > CitaController.LIMITE_CAMBIO_ESTADO:
+                    db.session.rollback()
+                    return jsonify({"error": f"El filtro abarca más de {CitaController.LIMITE_CAMBIO_ESTADO} citas"}), 400
+                ids = sorted(actuales)
+
+            a_cambiar = [i for i, (estado_id, _, _) in actuales.items() if estado_id != estado_nuevo.id]
+
+            # Cupos por horario: cancelar libera, reactivar una cancelada vuelve a reservar.
+            # Si un horario no tiene cupos para todas sus reactivaciones, esas citas no cambian
+            cancelada_id = estados.id('cancelada')
+            liberar, horas_liberadas, reservar = Counter(), defaultdict(list), defaultdict(list)
+            for cita_id in a_cambiar:
+                estado_id, horario_id, hora = actuales[cita_id]
+                if not horario_id or cancelada_id is None:
+                    continue
+                if estado_nuevo.id == cancelada_id:
+                    liberar[horario_id] += 1
+                    horas_liberadas[horario_id].append(hora)
+                elif estado_id == cancelada_id:
+                    reservar[horario_id].append(cita_id)
+
+            sin_cupo = set()
+            horas_asignadas = {}
+            for horario_id in sorted(reservar):
+                reserva = HorarioMedico.reservar_cupo(horario_id, len(reservar[horario_id]))
+                if reserva is None:
+                    sin_cupo.update(reservar[horario_id])
+                else:
+                    horas_asignadas.update(zip(reservar[horario_id], reserva.horas))
+            for horario_id in sorted(liberar):
+                HorarioMedico.liberar_cupo(horario_id, liberar[horario_id], horas_liberadas[horario_id])
+            a_cambiar = [i for i in a_cambiar if i not in sin_cupo]
+
+            usuario_id = None
+            if hasattr(request, 'user') and request.user:
+                usuario_id = request.user.get('id')
+
+            actualizadas = set()
+            if a_cambiar:
+                # El historial toma el estado anterior de la tabla, antes del UPDATE
+                HistorialEstadoCita.registrar_cambios(
+                    a_cambiar,
+                    estado_nuevo.id,
+                    usuario_id=usuario_id,
+                    comentario=data.get("comentario_cambio"),
+                    ip_address=request.remote_addr
+                )
+
+                valores = {"estado_id": estado_nuevo.id}
+                if estado_nuevo.id == cancelada_id:
+                    # Las canceladas dejan libre su hora
+                    valores["hora"] = None
+                sentencia = update(Cita).where(Cita.id.in_(a_cambiar)).values(**valores)
+                if db.engine.dialect.update_returning:
+                    actualizadas = set(db.session.execute(
+                        sentencia.returning(Cita.id),
+                        execution_options={"synchronize_session": False}
+                    ).scalars())
+                else:
+                    db.session.execute(sentencia, execution_options={"synchronize_session": False})
+                    actualizadas = set(a_cambiar)
+
+                # Las reactivadas reciben la hora de su nuevo cupo
+                if horas_asignadas:
+                    tabla = Cita.__table__
+                    db.session.execute(
+                        update(tabla).where(tabla.c.id == bindparam("b_id")).values(hora=bindparam("b_hora")),
+                        [{"b_id": cita_id, "b_hora": hora} for cita_id, hora in horas_asignadas.items()]
+                    )
+
+            # Los cupos liberados pasan a la lista de espera
+            for horario_id in sorted(liberar):
+                ListaEspera.promover(horario_id, liberar[horario_id],
+                                     usuario_id=usuario_id, ip_address=request.remote_addr)
+
+            db.session.commit()
+
+            resultados = []
+            for cita_id in ids:
+                if cita_id not in actuales:
+                    resultados.append({"id": cita_id, "resultado": "no_encontrada"})
+                    continue
+                if cita_id in actualizadas:
+                    resultado = "actualizada"
+                elif cita_id in sin_cupo:
+                    resultado = "sin_cupo"
+                else:
+                    resultado = "sin_cambio"
+                estado_anterior = estados.get(actuales[cita_id][0])
+                resultados.append({
+                    "id": cita_id,
+                    "resultado": resultado,
+                    "estado_anterior": estado_anterior.nombre if estado_anterior else "pendiente"
+                })
+
+            return jsonify({
+                "estado": nombre_estado,
+                "total": len(resultados),
+                "actualizadas": len(actualizadas),
+                "resultados": resultados
+            }), 200
+
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"error": str(e)}), 500
+
     @staticmethod
     def eliminar(id):
         try:
@@ -423,7 +953,22 @@ class CitaController:
             if not cita:
                 return jsonify({"error": "Cita no encontrada"}), 404
             
+            # Liberar el cupo que ocupaba la cita y asignarlo al primero de la lista de espera
+            horario_liberado = None
+            if cita.horario_id and cita.estado_nombre != 'cancelada':
+                horario_liberado = cita.horario_id
+                HorarioMedico.liberar_cupo(cita.horario_id, horas=[cita.hora])
+
+            # Historial y lista de espera explícitos: con citas particionadas no hay FK que los proteja
+            Cita.desvincular_dependientes([cita.id])
             db.session.delete(cita)
+            if horario_liberado:
+                db.session.flush()
+                ListaEspera.promover(
+                    horario_liberado,
+                    usuario_id=request.user.get('id') if hasattr(request, 'user') and request.user else None,
+                    ip_address=request.remote_addr
+                )
             db.session.commit()
             return jsonify({"message": "Cita eliminada correctamente"}), 200
         except Exception as e:
@@ -433,18 +978,22 @@ class CitaController:
     @staticmethod
     def obtener_historial(id):
         """
-        Obtiene el historial de cambios de estado de una cita.
+        Obtiene el historial de cambios de estado de una cita, también de
+        las citas archivadas.
         
         Returns:
             Lista de cambios de estado ordenados por fecha descendente
         """
         try:
-            cita = Cita.query.get(id)
-            if not cita:
-                return jsonify({"error": "Cita no encontrada"}), 404
-            
-            historial = HistorialEstadoCita.query.filter_by(cita_id=id)\
-                .order_by(HistorialEstadoCita.fecha_cambio.desc())\
+            modelo = HistorialEstadoCita
+            if not Cita.query.get(id):
+                # Cita antigua: su historial se movió al archivo
+                if not CitaArchivada.query.get(id):
+                    return jsonify({"error": "Cita no encontrada"}), 404
+                modelo = HistorialEstadoCitaArchivado
+
+            historial = modelo.query.filter_by(cita_id=id)\
+                .order_by(modelo.fecha_cambio.desc())\
                 .all()
             
             return jsonify({
@@ -508,18 +1057,20 @@ class CitaController:
             
             # Consultar citas confirmadas ordenadas por fecha de registro (orden de llegada)
             # Usamos JOIN con HorarioMedico para poder filtrar por médico si es necesario
-            query = Cita.query.join(HorarioMedico).join(EstadoCita).filter(
+            query = Cita.query.join(HorarioMedico).filter(
                 Cita.fecha == fecha_obj,
                 Cita.area_id == area_id,
-                EstadoCita.nombre == 'confirmada'
+                Cita.estado_id.in_(EstadoCita.catalogo().ids('confirmada'))
             )
             
             if medico_id:
                 query = query.filter(HorarioMedico.medico_id == medico_id)
             
-            citas = query.order_by(
+            # Lectura por columnas: solo los datos que se imprimen, sin hidratar el ORM
+            plan = plan_filas(Cita, CitaController.RUTAS_IMPRESION)
+            citas = [plan.construir(fila) for fila in plan.aplicar(query).order_by(
                 Cita.fecha_registro.asc()  # Ordenar por orden de registro (ascendente)
-            ).all()
+            ).all()]
             
             # Construir respuesta con numeración
             citas_data = []
@@ -527,6 +1078,7 @@ class CitaController:
                 cita_info = {
                     'numero': numero,  # Numeración automática por orden de registro
                     'id': cita.id,
+                    'hora': str(cita.hora) if cita.hora else None,
                     'paciente': {
                         'id': cita.paciente.id,
                         'nombres': cita.paciente.nombres,
@@ -632,10 +1184,10 @@ class CitaController:
                 # Validar que el médico exista es opcional aquí, pero útil
             
             # Construir consulta
-            query = Cita.query.join(HorarioMedico).join(EstadoCita).filter(
+            query = Cita.query.join(HorarioMedico).filter(
                 HorarioMedico.area_id == area_id,
                 HorarioMedico.fecha == fecha_obj,
-                EstadoCita.nombre == 'confirmada'
+                Cita.estado_id.in_(EstadoCita.catalogo().ids('confirmada'))
             )
             
             # Filtrar por médico si se proporciona
@@ -643,9 +1195,10 @@ class CitaController:
                 query = query.filter(HorarioMedico.medico_id == medico_id)
             
             # Ordenar por fecha de registro (orden de llegada)
-            citas = query.order_by(
+            plan = plan_filas(Cita, CitaController.RUTAS_IMPRESION)
+            citas = [plan.construir(fila) for fila in plan.aplicar(query).order_by(
                 Cita.fecha_registro.asc()
-            ).all()
+            ).all()]
             
             # Preparar datos para el servicio PDF
             citas_data = []
@@ -653,6 +1206,7 @@ class CitaController:
                 cita_info = {
                     'numero': numero, 
                     'id': cita.id,
+                    'hora': str(cita.hora) if cita.hora else None,
                     'paciente': {
                         'nombres': cita.paciente.nombres,
                         'apellido_paterno': cita.paciente.apellido_paterno,
@@ -7,6 +7,15 @@ from models.estado_cita_model import EstadoCita
 from models.horario_medico_model import HorarioMedico
 from datetime import date
 from sqlalchemy import func
+from utils.fields import plan_filas
+
+# Columnas que usa el listado de próximas citas
+RUTAS_PROXIMAS_CITAS = (
+    "id", "fecha", "horario.turno",
+    "paciente.persona.nombres", "paciente.persona.apellido_paterno", "paciente.persona.apellido_materno",
+    "doctor.persona.nombres", "doctor.persona.apellido_paterno", "doctor.persona.apellido_materno",
+    "area_rel.nombre", "estado_id",
+)
 
 def get_dashboard_stats():
     today = date.today()
@@ -15,11 +24,12 @@ def get_dashboard_stats():
     citas_hoy = Cita.query.filter(Cita.fecha == today).count()
     
     # Citas pendientes hoy usando relacion
-    citas_pendientes_hoy = Cita.query.join(EstadoCita).filter(Cita.fecha == today, EstadoCita.nombre == 'pendiente').count()
+    estados = EstadoCita.catalogo()
+    citas_pendientes_hoy = Cita.query.filter(Cita.fecha == today, Cita.estado_id.in_(estados.ids('pendiente'))).count()
     # Corregido: rol_id es 2 para medicos segun insert_medicos.py y usuario_controller.py
     medicos_activos = Usuario.query.filter(Usuario.rol_id == 2, Usuario.activo == True).count()
     # Citas pendientes total usando relacion
-    citas_pendientes_total = Cita.query.join(EstadoCita).filter(EstadoCita.nombre == 'pendiente').count()
+    citas_pendientes_total = Cita.query.filter(Cita.estado_id.in_(estados.ids('pendiente'))).count()
 
     return {
         "totalPacientes": total_pacientes,
@@ -35,17 +45,20 @@ def get_upcoming_appointments(user_rol_id=None, user_id=None):
     # Get upcoming appointments (today and future)
     query = Cita.query.filter(Cita.fecha >= today)
 
-    # Lógica de filtrado por rol (usando EstadoCita para normalizacion)
+    # Lógica de filtrado por rol (usando el catálogo de EstadoCita, sin JOIN)
     # 2 = Profesional: debe de verse solo las citas confirmadas para el
+    estados = EstadoCita.catalogo()
     if user_rol_id == 2:
-        query = query.join(EstadoCita).filter(Cita.doctor_id == user_id, EstadoCita.nombre == 'confirmada')
+        query = query.filter(Cita.doctor_id == user_id, Cita.estado_id.in_(estados.ids('confirmada')))
     # 3 = Tecnico/Asistente: debe de verse las citas pendientes por confirmar (todas)
     elif user_rol_id == 3:
-        query = query.join(EstadoCita).filter(EstadoCita.nombre == 'pendiente')
+        query = query.filter(Cita.estado_id.in_(estados.ids('pendiente')))
     
     # Ordenar por fecha y luego obtener las próximas 10 citas
-    citas = query.order_by(Cita.fecha.asc())\
-        .limit(10).all()
+    # Lectura por columnas: solo los datos mostrados, sin hidratar el ORM
+    plan = plan_filas(Cita, RUTAS_PROXIMAS_CITAS)
+    citas = [plan.construir(fila) for fila in plan.aplicar(query).order_by(Cita.fecha.asc())\
+        .limit(10).all()]
         
     proximas_citas = []
     for cita in citas:
@@ -61,7 +74,7 @@ def get_upcoming_appointments(user_rol_id=None, user_id=None):
             "paciente": f"{cita.paciente.nombres} {cita.paciente.apellido_paterno} {cita.paciente.apellido_materno}" if cita.paciente else "Desconocido",
             "doctor": f"{cita.doctor.nombres_completos}" if cita.doctor else "Sin asignar",
             "especialidad": cita.area_rel.nombre if cita.area_rel else "General",
-            "estado": cita.estado_rel.nombre.capitalize() if cita.estado_rel else "Pendiente"
+            "estado": cita.estado_info.nombre.capitalize() if cita.estado_info else "Pendiente"
         })
         
     return proximas_citas
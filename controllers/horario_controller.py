@@ -1,32 +1,61 @@
-from flask import request, jsonify
+from flask import request, jsonify, current_app, Response, stream_with_context
+from sqlalchemy.orm import joinedload
 from extensions.database import db
 from models.horario_medico_model import HorarioMedico
 from models.usuario_model import Usuario
 from models.area_model import Area
+from services.disponibilidad_service import publicador, leer_disponibilidad
+from services.cache_disponibilidad import matrices, resumenes
+from services.indice_disponibilidad import proximos
+from services.regla_horario_service import ReglaHorarioService
+from services.horario_service import HorarioService, CuposOcupadosError
+from utils.fields import parsear_campos, opciones_carga
 from datetime import datetime, date
 from calendar import monthrange
+from queue import Empty
+import json
+import time
 
 class HorarioController:
 
+    # Campos disponibles en el listado: los de HorarioMedico.to_dict() más cupos_disponibles
+    CAMPOS_LISTADO = {
+        **HorarioMedico.CAMPOS,
+        "cupos_disponibles": (None, "cupos", "ocupados"),
+    }
+
+    # Stream de disponibilidad: segundos sin eventos antes de releer la base
+    # (también sirve de latido), duración máxima de cada conexión y tamaño de
+    # la cola por suscriptor
+    INTERVALO_SINCRONIZACION = 15
+    DURACION_MAXIMA_STREAM = 300
+    TAMANO_COLA_STREAM = 50
+
     @staticmethod
     def create_horarios_mensuales():
         """
-        Crea horarios para todo un mes de forma OPTIMIZADA.
-        Reduce las consultas a BD de N a 1.
+        Crea o actualiza los horarios de un mes para uno o varios médicos
+        (medico_id o medico_ids) con un solo INSERT ... ON CONFLICT DO UPDATE.
         """
         try:
             data = request.json
             
-            medico_id = data.get("medico_id")
+            medico_ids = data.get("medico_ids") or ([data["medico_id"]] if data.get("medico_id") else [])
             area_id = data.get("area_id")
             mes_str = data.get("mes")
             dias_seleccionados = data.get("dias_seleccionados", [])
             turnos = data.get("turnos", {})
             
             # --- Validaciones Básicas ---
-            if not all([medico_id, area_id, mes_str]):
+            if not all([medico_ids, area_id, mes_str]):
                 return jsonify({"error": "Faltan datos obligatorios"}), 400
             
+            try:
+                medico_ids = [int(m) for m in medico_ids]
+                area_id = int(area_id)
+            except (TypeError, ValueError):
+                return jsonify({"error": "medico_id y area_id deben ser números enteros"}), 400
+            
             if not dias_seleccionados:
                 return jsonify({"error": "Debe seleccionar al menos un día"}), 400
             
@@ -42,9 +71,9 @@ class HorarioController:
             except ValueError:
                 return jsonify({"error": "Formato de mes inválido"}), 400
 
-            # --- Preparación de Datos (Bulk Processing) ---
+            # --- Preparación de Datos ---
             
-            # 1. Convertir strings a objetos date y filtrar fechas inválidas
+            # Convertir strings a objetos date y filtrar fechas inválidas
             fechas_validas = []
             errores_fechas = []
             
@@ -61,74 +90,44 @@ class HorarioController:
             if not fechas_validas:
                 return jsonify({"error": "No hay fechas válidas para procesar", "detalles": errores_fechas}), 400
 
-            # 2. OPTIMIZACIÓN: Traer TODOS los horarios existentes para estas fechas en UNA sola consulta
-            # Esto evita el problema N+1 (hacer una query por cada día)
-            existing_records = HorarioMedico.query.filter(
-                HorarioMedico.medico_id == medico_id,
-                HorarioMedico.fecha.in_(fechas_validas)
-            ).all()
-
-            # 3. Crear mapa de búsqueda rápida: {(fecha, turno): objeto_horario}
-            mapa_existentes = {
-                (h.fecha, h.turno): h for h in existing_records
-            }
+            # duracion_cupo (minutos por cupo) es opcional: por defecto el turno se reparte entre los cupos.
+            # Todos los cupos deben caber en el turno
+            turnos_a_procesar = []
+            for codigo_turno, turno in (('M', turno_manana), ('T', turno_tarde)):
+                if turno.get("activo"):
+                    cupos = turno.get("cupos", 7)
+                    try:
+                        duracion = HorarioMedico.validar_cupos(cupos, turno.get("duracion_cupo"))
+                    except ValueError as e:
+                        return jsonify({"error": str(e)}), 400
+                    turnos_a_procesar.append((codigo_turno, cupos, duracion))
 
-            contadores = {"creados": 0, "actualizados": 0}
-            nuevos_objetos = []
-
-            # 4. Procesar en memoria
-            for fecha in fechas_validas:
-                dia_semana = fecha.weekday() # 0=Lun, 6=Dom
-                
-                # Definir qué turnos vamos a procesar
-                turnos_a_procesar = []
-                if turno_manana.get("activo"):
-                    turnos_a_procesar.append(('M', turno_manana.get("cupos", 7)))
-                if turno_tarde.get("activo"):
-                    turnos_a_procesar.append(('T', turno_tarde.get("cupos", 7)))
-                
-                for codigo_turno, cupos in turnos_a_procesar:
-                    clave = (fecha, codigo_turno)
-                    horario = mapa_existentes.get(clave)
-                    
-                    if horario:
-                        # Actualizar existente
-                        cambio = False
-                        if horario.area_id != area_id:
-                            horario.area_id = area_id
-                            cambio = True
-                        if horario.cupos != cupos:
-                            horario.cupos = cupos
-                            cambio = True
-                        
-                        if cambio:
-                            contadores["actualizados"] += 1
-                        # Si no hubo cambios, no contamos pero tampoco hacemos nada (SQLAlchemy lo ignora)
-                    else:
-                        # Crear nuevo
-                        nuevo = HorarioMedico(
-                            medico_id=medico_id,
-                            area_id=area_id,
-                            fecha=fecha,
-                            dia_semana=dia_semana,
-                            turno=codigo_turno,
-                            cupos=cupos
-                        )
-                        nuevos_objetos.append(nuevo)
-                        contadores["creados"] += 1
-
-            # 5. Guardar todo en bloque
-            if nuevos_objetos:
-                db.session.add_all(nuevos_objetos)
+            # Una sola sentencia para todos los médicos, fechas y turnos
+            try:
+                resultado = HorarioService.upsert_lote([
+                    {
+                        "medico_id": medico_id, "area_id": area_id, "fecha": fecha,
+                        "turno": turno, "cupos": cupos, "duracion_cupo": duracion
+                    }
+                    for medico_id in medico_ids
+                    for fecha in fechas_validas
+                    for turno, cupos, duracion in turnos_a_procesar
+                ])
+            except CuposOcupadosError as e:
+                db.session.rollback()
+                return jsonify({"error": str(e), "conflictos": e.conflictos}), 409
+            except ValueError as e:
+                db.session.rollback()
+                return jsonify({"error": str(e)}), 400
             
             db.session.commit()
             
             response = {
                 "message": "Horarios procesados correctamente",
-                "creados": contadores["creados"],
-                "actualizados": contadores["actualizados"],
+                "creados": resultado["creados"],
+                "actualizados": resultado["actualizados"],
                 # Retornamos solo un resumen numérico para no sobrecargar la respuesta JSON con 60+ objetos
-                "total_procesados": contadores["creados"] + contadores["actualizados"]
+                "total_procesados": resultado["creados"] + resultado["actualizados"]
             }
             
             if errores_fechas:
@@ -141,66 +140,58 @@ class HorarioController:
             print(f"Error al crear horarios: {str(e)}") # Log para debug
             return jsonify({"error": "Error interno del servidor", "detalle": str(e)}), 500
 
-    @staticmethod
-    def _crear_o_actualizar_horario(medico_id, area_id, fecha, dia_semana, turno, cupos):
-        """
-        [DEPRECADO para cargas masivas] Mantenido solo para compatibilidad de llamadas individuales legacy.
-        """
-        horario_existente = HorarioMedico.query.filter_by(
-            medico_id=medico_id,
-            fecha=fecha,
-            turno=turno
-        ).first()
-        
-        if horario_existente:
-            horario_existente.area_id = area_id
-            horario_existente.cupos = cupos
-            return {"horario": horario_existente, "is_new": False}
-        else:
-            nuevo_horario = HorarioMedico(
-                medico_id=medico_id,
-                area_id=area_id,
-                fecha=fecha,
-                dia_semana=dia_semana,
-                turno=turno,
-                cupos=cupos
-            )
-            db.session.add(nuevo_horario)
-            return {"horario": nuevo_horario, "is_new": True}
-
     @staticmethod
     def create_or_update_horario():
         """
-        Crea o actualiza horarios individuales (compatibilidad con estructura anterior).
+        Crea o actualiza horarios individuales o una lista de ellos
+        (compatibilidad con estructura anterior), con un solo upsert.
         También acepta el nuevo formato con turnos.
         """
         try:
             data = request.json
             
             # Si es el nuevo formato mensual, redirigir
-            if "turnos" in data:
+            if isinstance(data, dict) and "turnos" in data:
                 return HorarioController.create_horarios_mensuales()
             
+            items = data if isinstance(data, list) else [data]
+            try:
+                horarios = [HorarioController._process_single_horario(item) for item in items]
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            try:
+                resultado = HorarioService.upsert_lote(horarios)
+            except CuposOcupadosError as e:
+                db.session.rollback()
+                return jsonify({"error": str(e), "conflictos": e.conflictos}), 409
+            except ValueError as e:
+                db.session.rollback()
+                return jsonify({"error": str(e)}), 400
+            db.session.commit()
+
+            por_id = {
+                h.id: h for h in HorarioMedico.query.options(
+                    joinedload(HorarioMedico.area), joinedload(HorarioMedico.medico).joinedload(Usuario.persona)
+                ).filter(HorarioMedico.id.in_(resultado["ids"]))
+            }
+            # Mismo orden que la petición; una clave repetida devuelve el mismo horario
+            claves = sorted({(h["medico_id"], h["fecha"], h["turno"]) for h in horarios})
+            id_por_clave = dict(zip(claves, resultado["ids"]))
+            results = [por_id[id_por_clave[(h["medico_id"], h["fecha"], h["turno"])]] for h in horarios]
+
+            contadores = {"creados": resultado["creados"], "actualizados": resultado["actualizados"]}
             if isinstance(data, list):
-                # Procesamiento masivo (formato legacy)
-                results = []
-                for item in data:
-                    res = HorarioController._process_single_horario(item)
-                    results.append(res)
-                
-                db.session.commit()
                 return jsonify({
                     "message": f"{len(results)} horarios procesados correctamente", 
-                    "horarios": [r.to_dict() for r in results]
-                }), 201
-            else:
-                # Procesamiento individual
-                res = HorarioController._process_single_horario(data)
-                db.session.commit()
-                return jsonify({
-                    "message": "Horario procesado correctamente", 
-                    "horario": res.to_dict()
+                    "horarios": [r.to_dict() for r in results],
+                    **contadores
                 }), 201
+            return jsonify({
+                "message": "Horario procesado correctamente", 
+                "horario": results[0].to_dict(),
+                **contadores
+            }), 201
 
         except Exception as e:
             db.session.rollback()
@@ -208,59 +199,104 @@ class HorarioController:
 
     @staticmethod
     def _process_single_horario(data):
-        """Procesa un horario individual con el nuevo formato"""
+        """Valida un horario del formato individual y lo retorna listo para HorarioService.upsert_lote"""
         medico_id = data.get("medico_id")
         area_id = data.get("area_id")
         fecha_str = data.get("fecha")  # Formato "YYYY-MM-DD"
         turno = data.get("turno", "M")  # 'M' o 'T'
         cupos = data.get("cupos", 5)
-        
-        # Soporte legacy: si no hay fecha pero hay dia_semana
-        dia_semana = data.get("dia_semana")
+        duracion = data.get("duracion_cupo")  # Minutos por cupo (opcional)
         
         if fecha_str:
             try:
                 fecha = datetime.strptime(fecha_str, "%Y-%m-%d").date()
-                dia_semana = fecha.weekday()
             except ValueError:
-                raise Exception("Formato de fecha inválido. Use YYYY-MM-DD")
-        else:
-            raise Exception("Se requiere el campo 'fecha' en formato YYYY-MM-DD")
-
-        if not all([medico_id, area_id, dia_semana is not None, cupos]):
-            raise Exception("Faltan datos obligatorios")
-
-        # Buscamos si ya existe horario para este medico en esta fecha y turno
-        horario_existente = HorarioMedico.query.filter_by(
-            medico_id=medico_id, 
-            fecha=fecha,
-            turno=turno
-        ).first()
-
-        if horario_existente:
-            # Actualizar
-            horario_existente.area_id = area_id
-            horario_existente.cupos = cupos
-            return horario_existente
+                raise ValueError("Formato de fecha inválido. Use YYYY-MM-DD")
         else:
-            # Crear nuevo
-            nuevo_horario = HorarioMedico(
-                medico_id=medico_id,
-                area_id=area_id,
-                fecha=fecha,
-                dia_semana=dia_semana,
-                turno=turno,
-                cupos=cupos
+            raise ValueError("Se requiere el campo 'fecha' en formato YYYY-MM-DD")
+
+        if not all([medico_id, area_id, cupos]):
+            raise ValueError("Faltan datos obligatorios")
+
+        if turno not in ("M", "T"):
+            raise ValueError("Turno inválido. Use 'M' o 'T'")
+
+        try:
+            horario = {
+                "medico_id": int(medico_id), "area_id": int(area_id),
+                "fecha": fecha, "turno": turno, "cupos": int(cupos), "duracion_cupo": duracion
+            }
+        except (TypeError, ValueError):
+            raise ValueError("medico_id, area_id y cupos deben ser números enteros")
+
+        # Todos los cupos deben tener hora dentro del turno
+        horario["duracion_cupo"] = HorarioMedico.validar_cupos(horario["cupos"], duracion)
+        return horario
+
+    @staticmethod
+    def clonar_horarios_mes():
+        """
+        Copia los horarios de un mes a otro en el servidor, alineando los días
+        de la semana (el 2do lunes del origen pasa al 2do lunes del destino).
+        Los horarios que ya existen en el destino se conservan.
+
+        Body:
+        - origen, destino: (requeridos) meses en formato YYYY-MM
+        - medico_id / area_id: (opcional) limita a un médico o a un área
+        - feriados: (opcional) fechas YYYY-MM-DD del destino que no se crean
+        - simular: (opcional) true para ver lo que se crearía sin guardar
+        """
+        try:
+            data = request.json or {}
+
+            try:
+                origen = tuple(map(int, data.get("origen", "").split("-")))
+                destino = tuple(map(int, data.get("destino", "").split("-")))
+                date(*origen, 1)
+                date(*destino, 1)
+            except (TypeError, ValueError):
+                return jsonify({"error": "origen y destino son requeridos en formato YYYY-MM"}), 400
+
+            if origen == destino:
+                return jsonify({"error": "El mes destino debe ser distinto del origen"}), 400
+
+            try:
+                feriados = [datetime.strptime(f, "%Y-%m-%d").date() for f in data.get("feriados", [])]
+            except (TypeError, ValueError):
+                return jsonify({"error": "Formato de feriado inválido. Use YYYY-MM-DD"}), 400
+
+            resultado = HorarioService.clonar_mes(
+                origen, destino,
+                medico_id=data.get("medico_id"),
+                area_id=data.get("area_id"),
+                feriados=feriados,
+                simular=bool(data.get("simular"))
             )
-            db.session.add(nuevo_horario)
-            return nuevo_horario
+
+            if data.get("simular"):
+                return jsonify({
+                    "simulacion": True,
+                    "total_crear": len(resultado["crear"]),
+                    "total_conservados": len(resultado["conservados"]),
+                    **resultado
+                }), 200
+
+            db.session.commit()
+            return jsonify({
+                "message": "Horarios clonados correctamente",
+                **resultado
+            }), 201
+
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"error": str(e)}), 500
 
     @staticmethod
     def get_horarios():
         """
         Obtiene horarios con filtros opcionales.
-        Incluye cupos_disponibles calculado en base a citas activas.
-        OPTIMIZADO: Una sola consulta con LEFT JOIN para calcular cupos.
+        Incluye cupos_disponibles (cupos - ocupados) sin consultar la tabla citas.
+        OPTIMIZADO: Una sola consulta; los cupos ocupados se leen del contador del horario.
         
         Query params:
         - medico_id: Filtrar por médico
@@ -268,34 +304,23 @@ class HorarioController:
         - mes: Filtrar por mes (formato YYYY-MM)
         - fecha: Filtrar por fecha específica (formato YYYY-MM-DD)
         - turno: Filtrar por turno ('M' o 'T')
+        - fields: Campos a retornar separados por coma (ej: id,fecha,turno,cupos_disponibles)
         """
         try:
-            from models.cita_model import Cita
-            from sqlalchemy import func, case
-            
+            try:
+                campos = parsear_campos(request.args.get('fields'), HorarioController.CAMPOS_LISTADO)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
             medico_id = request.args.get('medico_id')
             area_id = request.args.get('area_id')
             mes = request.args.get('mes')  # Formato YYYY-MM
             fecha = request.args.get('fecha')  # Formato YYYY-MM-DD
             turno = request.args.get('turno')  # 'M' o 'T'
             
-            # Subconsulta para contar citas activas por horario_id
-            # Cuenta solo citas no canceladas usando EstadoCita
-            from models.estado_cita_model import EstadoCita
-            citas_count_subq = db.session.query(
-                Cita.horario_id,
-                func.count(Cita.id).label('citas_activas')
-            ).join(EstadoCita).filter(
-                EstadoCita.nombre != 'cancelada'
-            ).group_by(Cita.horario_id).subquery()
-            
-            # Query principal con LEFT JOIN a la subconsulta
-            query = db.session.query(
-                HorarioMedico,
-                func.coalesce(citas_count_subq.c.citas_activas, 0).label('citas_activas')
-            ).outerjoin(
-                citas_count_subq,
-                HorarioMedico.id == citas_count_subq.c.horario_id
+            # Los cupos ocupados salen del contador del horario, sin agregar citas
+            query = HorarioMedico.query.options(
+                *opciones_carga(HorarioMedico, HorarioController.CAMPOS_LISTADO, campos)
             )
             
             # Aplicar filtros
@@ -308,10 +333,12 @@ class HorarioController:
             if turno:
                 query = query.filter(HorarioMedico.turno == turno)
             
+            rango = None
             if fecha:
                 try:
                     fecha_obj = datetime.strptime(fecha, "%Y-%m-%d").date()
                     query = query.filter(HorarioMedico.fecha == fecha_obj)
+                    rango = (fecha_obj, fecha_obj)
                 except ValueError:
                     return jsonify({"error": "Formato de fecha inválido. Use YYYY-MM-DD"}), 400
             elif mes:
@@ -324,9 +351,14 @@ class HorarioController:
                         HorarioMedico.fecha >= fecha_inicio,
                         HorarioMedico.fecha <= fecha_fin
                     )
+                    rango = (fecha_inicio, fecha_fin)
                 except ValueError:
                     return jsonify({"error": "Formato de mes inválido. Use YYYY-MM"}), 400
             
+            # La primera consulta de una fecha crea los horarios de las reglas recurrentes
+            if rango:
+                ReglaHorarioService.materializar_aparte(*rango, medico_id=medico_id, area_id=area_id)
+            
             # Ordenar por fecha y turno
             query = query.order_by(HorarioMedico.fecha, HorarioMedico.turno)
             
@@ -335,27 +367,230 @@ class HorarioController:
             
             # Construir respuesta
             resultado = []
-            for horario, citas_activas in resultados:
-                horario_dict = horario.to_dict()
-                horario_dict['cupos_disponibles'] = horario.cupos - citas_activas
+            for horario in resultados:
+                horario_dict = horario.to_dict(campos)
+                if campos is None or 'cupos_disponibles' in campos:
+                    horario_dict['cupos_disponibles'] = horario.cupos - horario.ocupados
                 resultado.append(horario_dict)
             
             return jsonify(resultado), 200
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
+    @staticmethod
+    def get_disponibilidad_mes():
+        """
+        Cupos libres de un área en un mes, para el calendario de reservas.
+        Se calcula con una sola consulta agrupada y se guarda en memoria por
+        (área, mes) hasta que se reserva, libera o modifica un horario de ese
+        mes (o vence DISPONIBILIDAD_CACHE_SEGUNDOS).
+
+        Query params:
+        - area_id: (requerido) ID del área
+        - mes: (requerido) Mes en formato YYYY-MM
+
+        Respuesta: {"area_id", "mes", "medicos": [{"id", "nombre"}],
+                    "dias": {"YYYY-MM-DD": {"M": {"<medico_id>": libres}, "T": {...}}}}
+        """
+        try:
+            area_id = request.args.get('area_id', type=int)
+            mes = request.args.get('mes')
+
+            if not area_id or not mes:
+                return jsonify({"error": "Se requiere area_id y mes"}), 400
+
+            try:
+                year, month = map(int, mes.split("-"))
+                date(year, month, 1)
+            except ValueError:
+                return jsonify({"error": "Formato de mes inválido. Use YYYY-MM"}), 400
+
+            matriz = matrices.obtener(area_id, year, month, current_app.config["DISPONIBILIDAD_CACHE_SEGUNDOS"])
+            if not matriz["dias"] and not Area.query.get(area_id):
+                return jsonify({"error": "Área no encontrada"}), 404
+
+            return jsonify(matriz), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @staticmethod
+    def get_proximo_disponible():
+        """
+        Primer horario con cupos libres de un área desde una fecha, entre
+        todos los médicos, para el buscador de "próximo cupo" de la
+        recepción. Se responde desde el índice en memoria del proceso
+        (IndiceDisponibilidad), sin consultar la base en cada búsqueda.
+
+        Query params:
+        - area_id: (requerido) ID del área
+        - desde: (opcional) YYYY-MM-DD, por defecto hoy (las fechas pasadas se toman como hoy)
+        - turno: (opcional) M o T
+
+        Respuesta: {"area_id", "desde", "turno", "horario": {"id", "fecha", "turno",
+                    "medico_id", "medico_nombre", "cupos", "ocupados", "cupos_disponibles"} o null}
+        """
+        try:
+            area_id = request.args.get('area_id', type=int)
+            desde = request.args.get('desde')
+            turno = request.args.get('turno')
+
+            if not area_id:
+                return jsonify({"error": "Se requiere area_id"}), 400
+            if turno and turno not in ('M', 'T'):
+                return jsonify({"error": "turno debe ser 'M' (Mañana) o 'T' (Tarde)"}), 400
+            hoy = date.today()
+            try:
+                desde = max(datetime.strptime(desde, "%Y-%m-%d").date(), hoy) if desde else hoy
+            except ValueError:
+                return jsonify({"error": "Formato de fecha inválido. Use YYYY-MM-DD"}), 400
+
+            ttl = current_app.config["PROXIMO_DISPONIBLE_SEGUNDOS"]
+            encontrados = proximos.proximo(area_id, desde, turno, ttl)
+            if encontrados and encontrados[0][1]["id"] is None:
+                # Día de una regla recurrente: se crea su fila para que se pueda reservar
+                fecha, datos = encontrados[0]
+                ReglaHorarioService.materializar_aparte(fecha, fecha, medico_id=datos["medico_id"])
+                horario_id = db.session.query(HorarioMedico.id).filter_by(
+                    medico_id=datos["medico_id"], fecha=fecha, turno=datos["turno"]
+                ).scalar()
+                # La fila se creó fuera de la sesión: el índice toma su id directamente
+                proximos.aplicar({
+                    (h_area, h_fecha): [h_datos]
+                    for h_area, h_fecha, h_datos in leer_disponibilidad(horario_ids=[horario_id]).values()
+                })
+                encontrados = proximos.proximo(area_id, desde, turno, ttl)
+
+            horario = None
+            if encontrados:
+                fecha, horario = encontrados[0]
+                horario.update(
+                    fecha=str(fecha),
+                    turno_nombre="Mañana" if horario["turno"] == 'M' else "Tarde",
+                    medico_nombre=proximos.nombres_medicos([horario["medico_id"]])[horario["medico_id"]]
+                )
+
+            return jsonify({
+                "area_id": area_id,
+                "desde": str(desde),
+                "turno": turno,
+                "horario": horario
+            }), 200
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"error": str(e)}), 500
+
+    @staticmethod
+    def stream_disponibilidad():
+        """
+        Server-Sent Events con la disponibilidad de cupos de un área en una fecha.
+
+        Query params:
+        - area_id: (requerido) ID del área
+        - fecha: (requerido) YYYY-MM-DD
+
+        Eventos:
+        - snapshot: todos los horarios del área y fecha al conectarse
+        - delta: horarios que cambiaron ({"id", ..., "cupos_disponibles"} o {"id", "eliminado": true})
+
+        Las escrituras del mismo proceso llegan al confirmarse. Sin eventos
+        durante INTERVALO_SINCRONIZACION segundos se relee la base (cubre las
+        escrituras de otros workers). La conexión se cierra tras
+        DURACION_MAXIMA_STREAM segundos y el navegador se reconecta solo.
+        """
+        area_id = request.args.get('area_id', type=int)
+        fecha = request.args.get('fecha')
+        if not area_id or not fecha:
+            return jsonify({"error": "Se requiere area_id y fecha"}), 400
+        try:
+            fecha = datetime.strptime(fecha, "%Y-%m-%d").date()
+        except ValueError:
+            return jsonify({"error": "Formato de fecha inválido. Use YYYY-MM-DD"}), 400
+
+        # Los horarios de las reglas recurrentes necesitan fila (id) para publicarse
+        try:
+            ReglaHorarioService.materializar_aparte(fecha, fecha, area_id=area_id)
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"error": str(e)}), 500
+
+        suscripcion = publicador.suscribir(
+            area_id, fecha,
+            current_app.config.get("SSE_MAX_SUSCRIPTORES", 2),
+            HorarioController.TAMANO_COLA_STREAM
+        )
+        if suscripcion is None:
+            respuesta = jsonify({"error": "Demasiadas conexiones en vivo; use GET /api/horarios"})
+            respuesta.headers["Retry-After"] = str(HorarioController.INTERVALO_SINCRONIZACION)
+            return respuesta, 503
+
+        def leer():
+            try:
+                return {h_id: datos for h_id, (_, _, datos) in leer_disponibilidad(area_id, fecha).items()}
+            finally:
+                # No retener una conexión del pool mientras el stream espera
+                db.session.close()
+
+        def evento(nombre, datos):
+            return f"event: {nombre}\ndata: {json.dumps(datos)}\n\n"
+
+        def generar():
+            try:
+                actual = leer()
+                yield f"retry: {HorarioController.INTERVALO_SINCRONIZACION * 1000}\n\n"
+                yield evento("snapshot", list(actual.values()))
+
+                fin = time.monotonic() + HorarioController.DURACION_MAXIMA_STREAM
+                while time.monotonic() < fin:
+                    try:
+                        cambios = suscripcion.cola.get(timeout=HorarioController.INTERVALO_SINCRONIZACION)
+                    except Empty:
+                        cambios = None
+
+                    if cambios is None or suscripcion.desbordada:
+                        # Releer y enviar solo lo que cambió respecto de lo último enviado
+                        suscripcion.descartar_pendientes()
+                        nuevo = leer()
+                        cambios = [datos for h_id, datos in nuevo.items() if actual.get(h_id) != datos]
+                        cambios += [{"id": h_id, "eliminado": True} for h_id in actual if h_id not in nuevo]
+                    else:
+                        cambios = [
+                            c for c in cambios
+                            if (c["id"] in actual if c.get("eliminado") else actual.get(c["id"]) != c)
+                        ]
+                        nuevo = dict(actual)
+                        for c in cambios:
+                            if c.get("eliminado"):
+                                nuevo.pop(c["id"], None)
+                            else:
+                                nuevo[c["id"]] = c
+
+                    actual = nuevo
+                    yield evento("delta", cambios) if cambios else ": ping\n\n"
+            finally:
+                publicador.cancelar(suscripcion)
+
+        respuesta = Response(stream_with_context(generar()), mimetype="text/event-stream")
+        # Si el cliente se desconecta antes de recibir el primer evento el generador no llega a ejecutarse
+        respuesta.call_on_close(lambda: publicador.cancelar(suscripcion))
+        respuesta.headers["Cache-Control"] = "no-cache"
+        respuesta.headers["X-Accel-Buffering"] = "no"
+        return respuesta
+
     @staticmethod
     def get_horarios_resumen_mes():
         """
-        Obtiene un resumen de horarios agrupado por día para un mes específico.
-        Útil para mostrar en el calendario del frontend.
+        Obtiene un resumen de horarios agrupado por día para un mes específico,
+        con cupos ocupados y libres por turno.
+        Útil para mostrar en el calendario del frontend. Se guarda en memoria
+        por (médico, mes) hasta que cambia un horario o una cita de ese médico
+        en ese mes (o vence DISPONIBILIDAD_CACHE_SEGUNDOS).
         
         Query params:
         - medico_id: (requerido) ID del médico
         - mes: (requerido) Mes en formato YYYY-MM
         """
         try:
-            medico_id = request.args.get('medico_id')
+            medico_id = request.args.get('medico_id', type=int)
             mes = request.args.get('mes')
             
             if not medico_id or not mes:
@@ -363,46 +598,15 @@ class HorarioController:
             
             try:
                 year, month = map(int, mes.split("-"))
-                fecha_inicio = date(year, month, 1)
-                _, dias_en_mes = monthrange(year, month)
-                fecha_fin = date(year, month, dias_en_mes)
+                date(year, month, 1)
             except ValueError:
                 return jsonify({"error": "Formato de mes inválido. Use YYYY-MM"}), 400
             
-            horarios = HorarioMedico.query.filter(
-                HorarioMedico.medico_id == medico_id,
-                HorarioMedico.fecha >= fecha_inicio,
-                HorarioMedico.fecha <= fecha_fin
-            ).order_by(HorarioMedico.fecha, HorarioMedico.turno).all()
-            
-            # Agrupar por fecha
-            resumen = {}
-            for h in horarios:
-                fecha_str = str(h.fecha)
-                if fecha_str not in resumen:
-                    resumen[fecha_str] = {
-                        "fecha": fecha_str,
-                        "dia_semana": h.dia_semana,
-                        "turnos": {}
-                    }
-                resumen[fecha_str]["turnos"][h.turno] = {
-                    "id": h.id,
-                    "turno": h.turno,
-                    "turno_nombre": h.turno_nombre,
-                    "hora_inicio": str(h.hora_inicio),
-                    "hora_fin": str(h.hora_fin),
-                    "cupos": h.cupos,
-                    "area_id": h.area_id,
-                    "area_nombre": h.area_nombre
-                }
-            
-            return jsonify({
-                "medico_id": int(medico_id),
-                "mes": mes,
-                "dias": list(resumen.values())
-            }), 200
+            resumen = resumenes.obtener(medico_id, year, month, current_app.config["DISPONIBILIDAD_CACHE_SEGUNDOS"])
+            return jsonify(resumen), 200
             
         except Exception as e:
+            db.session.rollback()
             return jsonify({"error": str(e)}), 500
 
     @staticmethod
@@ -424,27 +628,66 @@ class HorarioController:
     def update_horario(id):
         """
         Actualiza un horario específico por ID.
-        Permite modificar cupos y area_id.
+        Permite modificar cupos, area_id y duracion_cupo.
         
         Body JSON:
         - cupos: Número de cupos
         - area_id: ID del área (opcional)
+        - duracion_cupo: Minutos por cupo (opcional). Solo se puede cambiar si
+          el horario no tiene citas; sin citas, cambiar los cupos vuelve a
+          repartir el turno entre ellos
+
+        Los cupos no pueden quedar por debajo de las citas que ya ocupan el
+        horario (409) y cupos * duracion_cupo debe caber en el turno, con a
+        lo sumo MAX_SLOTS cupos (400).
         """
         try:
-            horario = HorarioMedico.query.get(id)
+            # Bloquea el horario: una reserva simultánea no puede cambiar ocupados mientras se valida
+            horario = db.session.get(HorarioMedico, id, with_for_update=True)
             if not horario:
                 return jsonify({"error": "Horario no encontrado"}), 404
             
             data = request.json
-            
+            cupos = data.get('cupos', horario.cupos)
+            duracion = horario.duracion_cupo
+
             if 'cupos' in data:
-                cupos = data['cupos']
-                if not isinstance(cupos, int) or cupos < 0:
-                    return jsonify({"error": "Cupos debe ser un número entero positivo"}), 400
-                horario.cupos = cupos
-            
+                try:
+                    HorarioMedico.validar_cupos(cupos)
+                except ValueError as e:
+                    db.session.rollback()
+                    return jsonify({"error": str(e)}), 400
+                if cupos < horario.ocupados:
+                    db.session.rollback()
+                    return jsonify({
+                        "error": f"El horario ya tiene {horario.ocupados} citas; no se puede reducir a {cupos} cupos"
+                    }), 409
+                if horario.ocupados == 0:
+                    duracion = HorarioMedico.duracion_repartida(cupos)
+
+            if 'duracion_cupo' in data and data['duracion_cupo'] != horario.duracion_cupo:
+                if horario.ocupados > 0:
+                    db.session.rollback()
+                    return jsonify({"error": "El horario ya tiene citas con hora asignada; no se puede cambiar la duración de los cupos"}), 409
+                duracion = data['duracion_cupo']
+            elif 'duracion_cupo' in data:
+                duracion = horario.duracion_cupo
+
+            # Con citas la duración no cambia: más cupos solo si aún caben en el turno
+            try:
+                HorarioMedico.validar_cupos(cupos, duracion)
+            except ValueError as e:
+                db.session.rollback()
+                return jsonify({"error": str(e)}), 400
+
             if 'area_id' in data:
+                if not Area.query.get(data['area_id']):
+                    db.session.rollback()
+                    return jsonify({"error": "Área no encontrada"}), 404
                 horario.area_id = data['area_id']
+
+            horario.cupos = cupos
+            horario.duracion_cupo = duracion
             
             db.session.commit()
             
@@ -492,6 +735,12 @@ class HorarioController:
             if turno:
                 query = query.filter_by(turno=turno)
             
+            # El DELETE masivo no dispara eventos del ORM: anotar los horarios para el stream
+            HorarioMedico.marcar_eliminados(
+                query.with_entities(
+                    HorarioMedico.id, HorarioMedico.area_id, HorarioMedico.fecha, HorarioMedico.medico_id
+                ).all()
+            )
             deleted_count = query.delete()
             db.session.commit()
             
@@ -71,11 +71,14 @@ class IndicadorController:
             
             cupos_totales = cupos_query.scalar() or 0
             
+            # Ids de estados desde el catálogo en memoria: los filtros no necesitan JOIN
+            estados = EstadoCita.catalogo()
+
             # Query para citas no canceladas
-            citas_query = db.session.query(func.count(Cita.id)).join(EstadoCita).filter(
+            citas_query = db.session.query(func.count(Cita.id)).filter(
                 Cita.fecha >= fecha_inicio,
                 Cita.fecha <= fecha_fin,
-                EstadoCita.nombre != 'cancelada'
+                Cita.estado_id.in_(estados.ids_excepto('cancelada'))
             )
             if area_id:
                 citas_query = citas_query.filter(Cita.area_id == area_id)
@@ -88,10 +91,10 @@ class IndicadorController:
             # Fórmula: (Citas No Asistió / Citas Confirmadas Totales) * 100
             
             # Citas con estado final (confirmadas que llegaron a resolución)
-            citas_confirmadas_query = db.session.query(func.count(Cita.id)).join(EstadoCita).filter(
+            citas_confirmadas_query = db.session.query(func.count(Cita.id)).filter(
                 Cita.fecha >= fecha_inicio,
                 Cita.fecha <= fecha_fin,
-                EstadoCita.nombre.in_(['confirmada', 'atendida', 'no_asistio'])
+                Cita.estado_id.in_(estados.ids('confirmada', 'atendida', 'no_asistio'))
             )
             if area_id:
                 citas_confirmadas_query = citas_confirmadas_query.filter(Cita.area_id == area_id)
@@ -99,10 +102,10 @@ class IndicadorController:
             citas_confirmadas_total = citas_confirmadas_query.scalar() or 0
             
             # No shows
-            no_shows_query = db.session.query(func.count(Cita.id)).join(EstadoCita).filter(
+            no_shows_query = db.session.query(func.count(Cita.id)).filter(
                 Cita.fecha >= fecha_inicio,
                 Cita.fecha <= fecha_fin,
-                EstadoCita.nombre == 'no_asistio'
+                Cita.estado_id.in_(estados.ids('no_asistio'))
             )
             if area_id:
                 no_shows_query = no_shows_query.filter(Cita.area_id == area_id)
@@ -119,10 +122,10 @@ class IndicadorController:
                 func.avg(
                     func.cast(Cita.fecha, db.Date) - func.cast(Cita.fecha_registro, db.Date)
                 )
-            ).join(EstadoCita).filter(
+            ).filter(
                 Cita.fecha >= fecha_inicio,
                 Cita.fecha <= fecha_fin,
-                EstadoCita.nombre != 'cancelada',
+                Cita.estado_id.in_(estados.ids_excepto('cancelada')),
                 Cita.fecha.isnot(None)
             )
             if area_id:
@@ -134,10 +137,10 @@ class IndicadorController:
             # ==================== ESTADÍSTICAS ADICIONALES ====================
             
             # Citas atendidas
-            citas_atendidas_query = db.session.query(func.count(Cita.id)).join(EstadoCita).filter(
+            citas_atendidas_query = db.session.query(func.count(Cita.id)).filter(
                 Cita.fecha >= fecha_inicio,
                 Cita.fecha <= fecha_fin,
-                EstadoCita.nombre == 'atendida'
+                Cita.estado_id.in_(estados.ids('atendida'))
             )
             if area_id:
                 citas_atendidas_query = citas_atendidas_query.filter(Cita.area_id == area_id)
@@ -145,10 +148,10 @@ class IndicadorController:
             citas_atendidas = citas_atendidas_query.scalar() or 0
             
             # Citas canceladas
-            citas_canceladas_query = db.session.query(func.count(Cita.id)).join(EstadoCita).filter(
+            citas_canceladas_query = db.session.query(func.count(Cita.id)).filter(
                 Cita.fecha >= fecha_inicio,
                 Cita.fecha <= fecha_fin,
-                EstadoCita.nombre == 'cancelada'
+                Cita.estado_id.in_(estados.ids('cancelada'))
             )
             if area_id:
                 citas_canceladas_query = citas_canceladas_query.filter(Cita.area_id == area_id)
@@ -256,20 +259,22 @@ class IndicadorController:
                 group_func_horario = func.date_trunc('month', HorarioMedico.fecha)
             
             # Obtener datos de citas agrupados
+            # Ids de estados desde el catálogo en memoria (sin JOIN a estados_cita)
+            estados = EstadoCita.catalogo()
             citas_query = db.session.query(
                 group_func.label('periodo'),
                 func.count(Cita.id).label('total_citas'),
-                # Usar EstadoCita para filtros
-                func.count(case((EstadoCita.nombre != 'cancelada', 1))).label('citas_no_canceladas'),
-                func.count(case((EstadoCita.nombre == 'no_asistio', 1))).label('no_shows'),
-                func.count(case((EstadoCita.nombre == 'atendida', 1))).label('atendidas'),
-                func.count(case((EstadoCita.nombre.in_(['confirmada', 'atendida', 'no_asistio']), 1))).label('confirmadas_total'),
+                func.count(case((Cita.estado_id.in_(estados.ids_excepto('cancelada')), 1))).label('citas_no_canceladas'),
+                func.count(case((Cita.estado_id.in_(estados.ids('no_asistio')), 1))).label('no_shows'),
+                func.count(case((Cita.estado_id.in_(estados.ids('atendida')), 1))).label('atendidas'),
+                func.count(case((Cita.estado_id.in_(estados.ids('confirmada', 'atendida', 'no_asistio')), 1))).label('confirmadas_total'),
                 func.avg(
                     func.cast(Cita.fecha, db.Date) - func.cast(Cita.fecha_registro, db.Date)
                 ).label('lead_time_promedio')
-            ).join(EstadoCita).filter(
+            ).filter(
                 Cita.fecha >= fecha_inicio,
-                Cita.fecha <= fecha_fin
+                Cita.fecha <= fecha_fin,
+                Cita.estado_id.isnot(None)
             )
             
             if area_id:
@@ -364,20 +369,23 @@ class IndicadorController:
                 }), 400
             
             # Query principal agrupado por área
+            # Ids de estados desde el catálogo en memoria (sin JOIN a estados_cita)
+            estados = EstadoCita.catalogo()
             citas_por_area = db.session.query(
                 Area.id.label('area_id'),
                 Area.nombre.label('area_nombre'),
                 func.count(Cita.id).label('total_citas'),
-                func.count(case((EstadoCita.nombre != 'cancelada', 1))).label('citas_no_canceladas'),
-                func.count(case((EstadoCita.nombre == 'no_asistio', 1))).label('no_shows'),
-                func.count(case((EstadoCita.nombre == 'atendida', 1))).label('atendidas'),
-                func.count(case((EstadoCita.nombre.in_(['confirmada', 'atendida', 'no_asistio']), 1))).label('confirmadas_total'),
+                func.count(case((Cita.estado_id.in_(estados.ids_excepto('cancelada')), 1))).label('citas_no_canceladas'),
+                func.count(case((Cita.estado_id.in_(estados.ids('no_asistio')), 1))).label('no_shows'),
+                func.count(case((Cita.estado_id.in_(estados.ids('atendida')), 1))).label('atendidas'),
+                func.count(case((Cita.estado_id.in_(estados.ids('confirmada', 'atendida', 'no_asistio')), 1))).label('confirmadas_total'),
                 func.avg(
                     func.cast(Cita.fecha, db.Date) - func.cast(Cita.fecha_registro, db.Date)
                 ).label('lead_time_promedio')
-            ).join(Area, Cita.area_id == Area.id).join(EstadoCita).filter(
+            ).join(Area, Cita.area_id == Area.id).filter(
                 Cita.fecha >= fecha_inicio,
-                Cita.fecha <= fecha_fin
+                Cita.fecha <= fecha_fin,
+                Cita.estado_id.isnot(None)
             ).group_by(Area.id, Area.nombre).all()
             
             # Cupos por área
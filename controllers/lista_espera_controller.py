@@ -0,0 +1,201 @@
+from flask import jsonify, request
+from extensions.database import db
+from models.lista_espera_model import ListaEspera
+from models.paciente_model import Paciente
+from models.horario_medico_model import HorarioMedico
+from models.area_model import Area
+from sqlalchemy.orm import joinedload
+from datetime import datetime
+
+
+def _usuario_actual():
+    if hasattr(request, 'user') and request.user:
+        return request.user.get('id')
+    return None
+
+
+class ListaEsperaController:
+
+    @staticmethod
+    def agregar_entrada(data, horario=None):
+        """
+        Registra al paciente en la lista de espera y, si ya hay cupos libres,
+        los asigna de inmediato a los primeros de la fila. No confirma la
+        transacción.
+
+        `data` trae paciente_id, sintomas y, si no se pasa `horario`,
+        area_id y fecha (YYYY-MM-DD).
+        Retorna (entrada, error, status).
+        """
+        if horario is not None:
+            area_id, fecha = horario.area_id, horario.fecha
+        else:
+            if not data.get("area_id") or not data.get("fecha"):
+                return None, "Debe enviar 'horario_id' o 'area_id' y 'fecha'", 400
+            try:
+                fecha = datetime.strptime(data["fecha"], "%Y-%m-%d").date()
+            except (TypeError, ValueError):
+                return None, "Formato de fecha inválido. Use YYYY-MM-DD", 400
+            if not Area.query.get(data["area_id"]):
+                return None, "Área no encontrada", 404
+            area_id = data["area_id"]
+
+        horario_id = horario.id if horario is not None else None
+        duplicada = ListaEspera.query.filter_by(
+            paciente_id=data["paciente_id"], area_id=area_id, fecha=fecha,
+            horario_id=horario_id, estado=ListaEspera.ESPERANDO
+        ).first()
+        if duplicada:
+            return None, "El paciente ya está en la lista de espera", 409
+
+        entrada = ListaEspera(
+            paciente_id=data["paciente_id"],
+            horario_id=horario_id,
+            area_id=area_id,
+            fecha=fecha,
+            sintomas=data["sintomas"],
+            usuario_id=_usuario_actual()
+        )
+        db.session.add(entrada)
+        db.session.flush()
+
+        # Cupos que quedaron libres sin que nadie los tomara
+        libres = [horario] if horario is not None else HorarioMedico.query.filter(
+            HorarioMedico.area_id == area_id,
+            HorarioMedico.fecha == fecha
+        ).order_by(HorarioMedico.turno, HorarioMedico.id).all()
+        for h in libres:
+            if entrada.estado != ListaEspera.ESPERANDO:
+                break
+            if h.cupos > h.ocupados:
+                ListaEspera.promover(h.id, h.cupos - h.ocupados,
+                                     usuario_id=entrada.usuario_id, ip_address=request.remote_addr)
+
+        return entrada, None, 201
+
+    @staticmethod
+    def _posicion(entrada):
+        """Lugar de la entrada en la fila de su área y fecha (1 = siguiente)."""
+        if entrada.estado != ListaEspera.ESPERANDO:
+            return None
+        return ListaEspera.query.filter(
+            ListaEspera.area_id == entrada.area_id,
+            ListaEspera.fecha == entrada.fecha,
+            ListaEspera.estado == ListaEspera.ESPERANDO,
+            db.or_(
+                ListaEspera.fecha_registro < entrada.fecha_registro,
+                db.and_(ListaEspera.fecha_registro == entrada.fecha_registro, ListaEspera.id < entrada.id)
+            )
+        ).count() + 1
+
+    @staticmethod
+    def agregar():
+        """
+        Agregar un paciente a la lista de espera.
+
+        Payload esperado:
+        {
+            "paciente_id": int (requerido),
+            "sintomas": string (requerido),
+            "horario_id": int (para esperar un horario concreto),
+            "area_id": int, "fecha": "YYYY-MM-DD" (para cualquier horario del área ese día)
+        }
+        """
+        try:
+            data = request.get_json(silent=True) or {}
+
+            for field in ("paciente_id", "sintomas"):
+                if not data.get(field):
+                    return jsonify({"error": f"El campo '{field}' es obligatorio"}), 400
+
+            if not Paciente.query.get(data["paciente_id"]):
+                return jsonify({"error": "Paciente no encontrado"}), 404
+
+            horario = None
+            if data.get("horario_id"):
+                horario = HorarioMedico.query.get(data["horario_id"])
+                if not horario:
+                    return jsonify({"error": "Horario no encontrado"}), 404
+
+            entrada, error, status = ListaEsperaController.agregar_entrada(data, horario)
+            if error:
+                db.session.rollback()
+                return jsonify({"error": error}), status
+
+            db.session.commit()
+            return jsonify({
+                "message": "Cupo asignado" if entrada.cita_id else "Paciente agregado a la lista de espera",
+                "data": entrada.to_dict(),
+                "posicion": ListaEsperaController._posicion(entrada)
+            }), 201
+
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"error": str(e)}), 500
+
+    @staticmethod
+    def listar():
+        """
+        Lista de espera de un horario o de un área en una fecha, en orden de llegada.
+
+        Query params:
+        - horario_id, o area_id y fecha (YYYY-MM-DD)
+        - estado: esperando (default), promovida, retirada
+        """
+        try:
+            horario_id = request.args.get("horario_id", type=int)
+            area_id = request.args.get("area_id", type=int)
+            fecha = request.args.get("fecha")
+            estado = request.args.get("estado", ListaEspera.ESPERANDO)
+
+            query = ListaEspera.query.options(
+                joinedload(ListaEspera.paciente).joinedload(Paciente.persona),
+                joinedload(ListaEspera.area)
+            ).filter(ListaEspera.estado == estado)
+
+            if horario_id:
+                horario = HorarioMedico.query.get(horario_id)
+                if not horario:
+                    return jsonify({"error": "Horario no encontrado"}), 404
+                if estado == ListaEspera.ESPERANDO:
+                    query = query.filter(ListaEspera.filtro_horario(horario))
+                else:
+                    query = query.filter(ListaEspera.horario_id == horario_id)
+            elif area_id and fecha:
+                try:
+                    fecha = datetime.strptime(fecha, "%Y-%m-%d").date()
+                except ValueError:
+                    return jsonify({"error": "Formato de fecha inválido. Use YYYY-MM-DD"}), 400
+                query = query.filter(ListaEspera.area_id == area_id, ListaEspera.fecha == fecha)
+            else:
+                return jsonify({"error": "Debe enviar 'horario_id' o 'area_id' y 'fecha'"}), 400
+
+            entradas = query.order_by(ListaEspera.fecha_registro.asc(), ListaEspera.id.asc()).all()
+            data = []
+            for posicion, entrada in enumerate(entradas, start=1):
+                item = entrada.to_dict()
+                item["posicion"] = posicion if estado == ListaEspera.ESPERANDO else None
+                data.append(item)
+
+            return jsonify({"total": len(data), "data": data}), 200
+
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @staticmethod
+    def retirar(id):
+        """Saca una entrada de la lista de espera."""
+        try:
+            entrada = ListaEspera.query.get(id)
+            if not entrada:
+                return jsonify({"error": "Entrada no encontrada"}), 404
+            if entrada.estado != ListaEspera.ESPERANDO:
+                return jsonify({"error": f"La entrada ya está {entrada.estado}"}), 400
+
+            entrada.estado = ListaEspera.RETIRADA
+            db.session.commit()
+            return jsonify({"message": "Paciente retirado de la lista de espera"}), 200
+
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"error": str(e)}), 500
@@ -2,8 +2,17 @@ from flask import jsonify
 from extensions.database import db
 from models.paciente_model import Paciente
 from models.cita_model import Cita
+from models.cita_archivada_model import CitaArchivada
 from models.persona_model import Persona
+from models.estado_cita_model import EstadoCita
+from utils.pagination import Pagina, paginar, paginar_por_cursor
+from utils.fields import parsear_campos, plan_campos
+from services.persona_service import PersonaService
 from datetime import datetime
+import math
+
+# Prefijo de los cursores que ya recorren las citas archivadas
+CURSOR_ARCHIVO = "a."
 
 class PacienteController:
 
@@ -45,12 +54,33 @@ class PacienteController:
 
     @staticmethod
     def listar():
+        """
+        Listar pacientes con búsqueda y paginación.
+
+        Query params:
+        - page, per_page: Paginación (default: 1, 10)
+        - search: Búsqueda por DNI, nombres o apellidos
+        - fields: Campos a retornar separados por coma (ej: id,dni,nombres,telefono)
+        - cursor: Activa la paginación por cursor
+        """
         try:
             from flask import request
             page = request.args.get('page', 1, type=int)
             per_page = request.args.get('per_page', 10, type=int)
             search = request.args.get('search', '', type=str)
 
+            try:
+                campos = parsear_campos(request.args.get('fields'), Paciente.CAMPOS)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            # En modo cursor también se carga la columna de la clave de ordenamiento
+            campos_carga = campos
+            if campos is not None and 'cursor' in request.args:
+                campos_carga = campos | {"fecha_registro"}
+
+            # Lectura por columnas (tuplas), sin hidratar objetos del ORM
+            plan = plan_campos(Paciente, Paciente.CAMPOS, campos_carga)
             query = Paciente.query
 
             if search:
@@ -63,17 +93,37 @@ class PacienteController:
                     (Persona.apellido_materno.ilike(search_term))
                 )
 
+            query = plan.aplicar(query)
+
+            if 'cursor' in request.args:
+                # Paginación por cursor sobre (fecha_registro DESC, id DESC)
+                try:
+                    filas, next_cursor = paginar_por_cursor(
+                        query,
+                        [(Paciente.fecha_registro, True), (Paciente.id, False)],
+                        request.args.get('cursor'),
+                        per_page
+                    )
+                except ValueError as e:
+                    return jsonify({"error": str(e)}), 400
+
+                return jsonify({
+                    "per_page": per_page,
+                    "next_cursor": next_cursor,
+                    "data": [plan.construir(f).to_dict(campos) for f in filas]
+                }), 200
+
             # Ordenar por fecha de registro descendente (más recientes primero)
             query = query.order_by(Paciente.fecha_registro.desc())
 
-            pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+            pagination = paginar(query, page, per_page)
 
             return jsonify({
                 "total": pagination.total,
                 "pages": pagination.pages,
                 "current_page": pagination.page,
                 "per_page": pagination.per_page,
-                "data": [p.to_dict() for p in pagination.items]
+                "data": [plan.construir(f).to_dict(campos) for f in pagination.items]
             }), 200
 
         except Exception as e:
@@ -100,46 +150,25 @@ class PacienteController:
                 if field not in data or not data[field]:
                     return jsonify({"error": f"El campo '{field}' es obligatorio"}), 400
 
-            # 1. Gestionar la Persona (Centralizada)
-            persona = Persona.query.filter_by(dni=data["dni"]).first()
-            fecha_nac = datetime.strptime(data["fecha_nacimiento"], "%Y-%m-%d")
-            
-            if not persona:
-                persona = Persona(
-                    dni=data["dni"],
-                    nombres=data["nombres"],
-                    apellido_paterno=data["apellido_paterno"],
-                    apellido_materno=data["apellido_materno"],
-                    fecha_nacimiento=fecha_nac,
-                    sexo=data["sexo"],
-                    telefono=data.get("telefono"),
-                    email=data.get("email"),
-                    direccion=data["direccion"]
-                )
-                db.session.add(persona)
-            else:
-                # Actualizar datos de la persona
-                persona.nombres = data["nombres"]
-                persona.apellido_paterno = data["apellido_paterno"]
-                persona.apellido_materno = data["apellido_materno"]
-                persona.fecha_nacimiento = fecha_nac
-                persona.sexo = data["sexo"]
-                persona.telefono = data.get("telefono")
-                persona.email = data.get("email")
-                persona.direccion = data["direccion"]
-            
-            db.session.flush() # Asegurar tener persona.id
+            # 1. Gestionar la Persona (Centralizada): se crea o se actualizan sus datos
+            fecha_nac = datetime.strptime(data["fecha_nacimiento"], "%Y-%m-%d").date()
+            persona_id = PersonaService.upsert(data["dni"], {
+                "nombres": data["nombres"],
+                "apellido_paterno": data["apellido_paterno"],
+                "apellido_materno": data["apellido_materno"],
+                "fecha_nacimiento": fecha_nac,
+                "sexo": data["sexo"],
+                "telefono": data.get("telefono"),
+                "email": data.get("email"),
+                "direccion": data["direccion"]
+            })
 
             # 2. Gestionar el Paciente (Rol específico)
-            paciente = Paciente.query.join(Persona).filter(Persona.dni == data["dni"]).first()
+            paciente = Paciente.query.filter_by(persona_id=persona_id).first()
             is_new = paciente is None
 
-            if persona.id and not is_new and not paciente.persona_id:
-                paciente.persona_id = persona.id
-
             if paciente:
-                # Actualizar datos propios del paciente y vínculo
-                paciente.persona_id = persona.id
+                # Actualizar datos propios del paciente
                 paciente.estado_civil = data["estado_civil"]
                 paciente.grado_instruccion = data.get("grado_instruccion")
                 paciente.religion = data.get("religion")
@@ -153,7 +182,7 @@ class PacienteController:
             else:
                 # Crear nuevo paciente vinculado a la persona
                 paciente = Paciente(
-                    persona_id=persona.id,
+                    persona_id=persona_id,
                     estado_civil=data["estado_civil"],
                     grado_instruccion=data.get("grado_instruccion"),
                     religion=data.get("religion"),
@@ -276,8 +305,15 @@ class PacienteController:
         - page: Página actual (default: 1)
         - per_page: Items por página (default: 10)
         - estado: Filtrar por estado (pendiente, confirmada, atendida, cancelada, referido)
+        - total: 'true' para calcular `total` y `pages` en todas las páginas.
+          Sin él solo se calculan en las páginas que llegan al archivo; en
+          las demás son null y `has_next` indica si hay otra página.
+        - cursor: Activa la paginación por cursor (vacío para la primera página,
+          luego el `next_cursor` recibido). No calcula `total` ni `pages`.
         
-        Retorna lista de citas ordenadas por fecha descendente.
+        Retorna lista de citas ordenadas por fecha descendente. Las citas
+        archivadas (services/archivo_service.py) se listan al final, después
+        de las vigentes.
         """
         try:
             from flask import request
@@ -292,21 +328,73 @@ class PacienteController:
             per_page = request.args.get('per_page', 10, type=int)
             estado = request.args.get('estado', '', type=str)
 
-            # Construir query
+            # Construir query (citas vigentes y archivadas del paciente)
             query = Cita.query.filter_by(paciente_id=paciente_id)
+            query_archivo = CitaArchivada.query.filter_by(paciente_id=paciente_id)
 
-            # Filtro por estado
+            # Filtro por estado (id desde el catálogo; Cita.estado es una propiedad, no una columna)
             if estado:
-                query = query.filter(Cita.estado == estado)
-
-            # Ordenar por fecha de cita descendente (más recientes primero)
-            query = query.order_by(Cita.fecha.desc(), Cita.fecha_registro.desc())
-
-            pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+                ids_estado = EstadoCita.catalogo().ids(estado)
+                query = query.filter(Cita.estado_id.in_(ids_estado))
+                query_archivo = query_archivo.filter(CitaArchivada.estado_id.in_(ids_estado))
+
+            # Las citas archivadas son anteriores a todas las vigentes: el historial
+            # continúa en el archivo cuando se terminan las citas vigentes
+            if 'cursor' in request.args:
+                # Misma clave que el listado general de citas
+                cursor = request.args.get('cursor')
+                claves_archivo = [(CitaArchivada.fecha, True), (CitaArchivada.fecha_registro, True),
+                                  (CitaArchivada.id, False)]
+                try:
+                    if cursor.startswith(CURSOR_ARCHIVO):
+                        citas, next_cursor = paginar_por_cursor(
+                            query_archivo, claves_archivo, cursor[len(CURSOR_ARCHIVO):], per_page
+                        )
+                        next_cursor = CURSOR_ARCHIVO + next_cursor if next_cursor else None
+                    else:
+                        citas, next_cursor = paginar_por_cursor(
+                            query,
+                            [(Cita.fecha, True), (Cita.fecha_registro, True), (Cita.id, False)],
+                            cursor,
+                            per_page
+                        )
+                        faltan = max(1, per_page) - len(citas)
+                        if next_cursor is None and faltan > 0:
+                            archivadas, siguiente = paginar_por_cursor(query_archivo, claves_archivo, None, faltan)
+                            citas += archivadas
+                            next_cursor = CURSOR_ARCHIVO + siguiente if siguiente else None
+                        elif next_cursor is None and query_archivo.first() is not None:
+                            next_cursor = CURSOR_ARCHIVO
+                except ValueError as e:
+                    return jsonify({"error": str(e)}), 400
+            else:
+                # Ordenar por fecha de cita descendente (más recientes primero)
+                query = query.order_by(Cita.fecha.desc(), Cita.fecha_registro.desc())
+
+                pagination = paginar(query, page, per_page)
+                citas = list(pagination.items)
+                inicio = (pagination.page - 1) * pagination.per_page
+
+                # El archivo solo se cuenta si se pide el total o la página llega al final de las vigentes
+                total_pedido = request.args.get('total', '').lower() == 'true'
+                if total_pedido or inicio + pagination.per_page >= pagination.total:
+                    total_archivo = query_archivo.order_by(None).count()
+                    # Las filas que faltan en la página salen del archivo
+                    faltan = pagination.per_page - len(citas)
+                    if total_archivo and faltan > 0:
+                        citas += query_archivo.order_by(
+                            CitaArchivada.fecha.desc(), CitaArchivada.fecha_registro.desc()
+                        ).offset(max(0, inicio - pagination.total)).limit(faltan).all()
+                    total = pagination.total + total_archivo
+                    pagination = Pagina(citas, total, math.ceil(total / pagination.per_page),
+                                        pagination.page, pagination.per_page)
+                else:
+                    # Quedan citas vigentes después de esta página
+                    pagination = Pagina(citas, None, None, pagination.page, pagination.per_page)
 
             # Construir respuesta con datos enriquecidos
             citas_data = []
-            for cita in pagination.items:
+            for cita in citas:
                 cita_dict = cita.to_dict()
                 
                 # Agregar información del horario si existe
@@ -321,16 +409,27 @@ class PacienteController:
                 
                 citas_data.append(cita_dict)
 
+            paciente_data = {
+                "id": paciente.id,
+                "dni": paciente.dni,
+                "nombre_completo": f"{paciente.apellido_paterno} {paciente.apellido_materno}, {paciente.nombres}"
+            }
+
+            if 'cursor' in request.args:
+                return jsonify({
+                    "paciente": paciente_data,
+                    "per_page": per_page,
+                    "next_cursor": next_cursor,
+                    "data": citas_data
+                }), 200
+
             return jsonify({
-                "paciente": {
-                    "id": paciente.id,
-                    "dni": paciente.dni,
-                    "nombre_completo": f"{paciente.apellido_paterno} {paciente.apellido_materno}, {paciente.nombres}"
-                },
+                "paciente": paciente_data,
                 "total": pagination.total,
                 "pages": pagination.pages,
                 "current_page": pagination.page,
                 "per_page": pagination.per_page,
+                "has_next": pagination.total is None or pagination.page < pagination.pages,
                 "data": citas_data
             }), 200
 
@@ -0,0 +1,371 @@
+from flask import jsonify, request
+from extensions.database import db
+from models.regla_horario_model import ReglaHorario, ExcepcionHorario
+from models.horario_medico_model import HorarioMedico
+from models.usuario_model import Usuario
+from models.area_model import Area
+from services.regla_horario_service import ReglaHorarioService
+from services.disponibilidad_service import invalidar_vistas
+from datetime import datetime, date
+from calendar import monthrange
+
+TURNOS = {"manana": "M", "tarde": "T"}
+
+
+def _fecha(valor, campo):
+    """Convierte YYYY-MM-DD; lanza ValueError con el mensaje para el cliente."""
+    try:
+        return datetime.strptime(valor, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        raise ValueError(f"Formato inválido en '{campo}'. Use YYYY-MM-DD")
+
+
+def _cupos(valor):
+    """Cupos de una regla o excepción: entero entre 1 y MAX_SLOTS; lanza ValueError."""
+    if isinstance(valor, bool) or not isinstance(valor, int) or not 0 < valor <= HorarioMedico.MAX_SLOTS:
+        raise ValueError(f"'cupos' debe ser un número entero entre 1 y {HorarioMedico.MAX_SLOTS}")
+    return valor
+
+
+def _mascara(dias):
+    if not isinstance(dias, list) or not dias or any(not isinstance(d, int) or not 0 <= d <= 6 for d in dias):
+        raise ValueError("'dias_semana' debe ser una lista de días entre 0 (lunes) y 6 (domingo)")
+    return ReglaHorario.mascara(dias)
+
+
+class ReglaHorarioController:
+    """
+    Horarios recurrentes de los médicos. Cada cambio cuesta O(reglas): los
+    horarios de cada fecha se crean recién cuando se consultan
+    (ver services/regla_horario_service.py).
+    """
+
+    @staticmethod
+    def _superpuesta(regla):
+        """Otra regla del médico y turno que coincide en algún día y fecha."""
+        query = ReglaHorario.query.filter(
+            ReglaHorario.medico_id == regla.medico_id,
+            ReglaHorario.turno == regla.turno,
+            ReglaHorario.dias_semana.op('&')(regla.dias_semana) != 0,
+            db.or_(ReglaHorario.fecha_fin.is_(None), ReglaHorario.fecha_fin >= regla.fecha_inicio)
+        )
+        if regla.fecha_fin is not None:
+            query = query.filter(ReglaHorario.fecha_inicio <= regla.fecha_fin)
+        if regla.id is not None:
+            query = query.filter(ReglaHorario.id != regla.id)
+        return query.first()
+
+    @staticmethod
+    def _conservados(regla_id, desde):
+        """Horarios de la regla con citas desde `desde`: no cambian con la regla."""
+        return HorarioMedico.query.filter(
+            HorarioMedico.regla_id == regla_id,
+            HorarioMedico.fecha >= desde,
+            HorarioMedico.ocupados > 0
+        ).count()
+
+    @staticmethod
+    def crear():
+        """
+        Crea las reglas de un médico (una por turno activo).
+
+        Payload esperado:
+        {
+            "medico_id": int, "area_id": int,
+            "dias_semana": [0, 2, 4],          (0=Lunes ... 6=Domingo)
+            "turnos": {"manana": {"activo": true, "cupos": 7}, "tarde": {"activo": false}},
+            "fecha_inicio": "YYYY-MM-DD",       (opcional, hoy por defecto)
+            "fecha_fin": "YYYY-MM-DD"           (opcional, sin fin)
+        }
+        """
+        try:
+            data = request.get_json(silent=True) or {}
+            medico_id = data.get("medico_id")
+            area_id = data.get("area_id")
+            turnos = data.get("turnos") or {}
+
+            if not medico_id or not area_id:
+                return jsonify({"error": "Se requiere medico_id y area_id"}), 400
+            activos = [(codigo, turnos[nombre]) for nombre, codigo in TURNOS.items()
+                       if (turnos.get(nombre) or {}).get("activo")]
+            try:
+                mascara = _mascara(data.get("dias_semana"))
+                fecha_inicio = _fecha(data["fecha_inicio"], "fecha_inicio") if data.get("fecha_inicio") else date.today()
+                fecha_fin = _fecha(data["fecha_fin"], "fecha_fin") if data.get("fecha_fin") else None
+                cupos = {turno: _cupos(datos.get("cupos", 7)) for turno, datos in activos}
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            if fecha_fin and fecha_fin < fecha_inicio:
+                return jsonify({"error": "fecha_fin no puede ser anterior a fecha_inicio"}), 400
+
+            if not activos:
+                return jsonify({"error": "Debe activar al menos un turno"}), 400
+            if not Usuario.query.get(medico_id):
+                return jsonify({"error": "Médico no encontrado"}), 404
+            if not Area.query.get(area_id):
+                return jsonify({"error": "Área no encontrada"}), 404
+
+            reglas = []
+            for turno, _ in activos:
+                regla = ReglaHorario(
+                    medico_id=medico_id,
+                    area_id=area_id,
+                    dias_semana=mascara,
+                    turno=turno,
+                    cupos=cupos[turno],
+                    fecha_inicio=fecha_inicio,
+                    fecha_fin=fecha_fin
+                )
+                existente = ReglaHorarioController._superpuesta(regla)
+                if existente:
+                    db.session.rollback()
+                    return jsonify({
+                        "error": "El médico ya tiene una regla para ese turno en alguno de esos días",
+                        "regla": existente.to_dict()
+                    }), 409
+                db.session.add(regla)
+                reglas.append(regla)
+
+            db.session.commit()
+            invalidar_vistas()
+            return jsonify({
+                "message": "Reglas de horario creadas",
+                "data": [r.to_dict() for r in reglas]
+            }), 201
+
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"error": str(e)}), 500
+
+    @staticmethod
+    def listar():
+        """
+        Reglas vigentes (sin fin o con fin desde hoy).
+
+        Query params:
+        - medico_id, area_id: filtros opcionales
+        - todas: 'true' para incluir las que ya terminaron
+        """
+        try:
+            query = ReglaHorario.query
+            if request.args.get('medico_id'):
+                query = query.filter(ReglaHorario.medico_id == request.args.get('medico_id', type=int))
+            if request.args.get('area_id'):
+                query = query.filter(ReglaHorario.area_id == request.args.get('area_id', type=int))
+            if request.args.get('todas', '').lower() != 'true':
+                query = query.filter(db.or_(ReglaHorario.fecha_fin.is_(None), ReglaHorario.fecha_fin >= date.today()))
+
+            reglas = query.order_by(ReglaHorario.medico_id, ReglaHorario.turno, ReglaHorario.fecha_inicio).all()
+            return jsonify([r.to_dict() for r in reglas]), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @staticmethod
+    def actualizar(id):
+        """
+        Modifica una regla: area_id, cupos, dias_semana, fecha_inicio, fecha_fin.
+
+        Los horarios ya creados por la regla desde hoy y sin citas se
+        descartan y se vuelven a generar con los valores nuevos; los que
+        tienen citas se conservan sin cambios (se informa cuántos).
+        """
+        try:
+            regla = ReglaHorario.query.get(id)
+            if not regla:
+                return jsonify({"error": "Regla no encontrada"}), 404
+
+            data = request.get_json(silent=True) or {}
+            try:
+                if "dias_semana" in data:
+                    regla.dias_semana = _mascara(data["dias_semana"])
+                if "fecha_inicio" in data:
+                    regla.fecha_inicio = _fecha(data["fecha_inicio"], "fecha_inicio")
+                if "fecha_fin" in data:
+                    regla.fecha_fin = _fecha(data["fecha_fin"], "fecha_fin") if data["fecha_fin"] else None
+                if "cupos" in data:
+                    regla.cupos = _cupos(data["cupos"])
+            except ValueError as e:
+                db.session.rollback()
+                return jsonify({"error": str(e)}), 400
+            if "area_id" in data:
+                if not Area.query.get(data["area_id"]):
+                    db.session.rollback()
+                    return jsonify({"error": "Área no encontrada"}), 404
+                regla.area_id = data["area_id"]
+
+            if regla.fecha_fin and regla.fecha_fin < regla.fecha_inicio:
+                db.session.rollback()
+                return jsonify({"error": "fecha_fin no puede ser anterior a fecha_inicio"}), 400
+            with db.session.no_autoflush:
+                existente = ReglaHorarioController._superpuesta(regla)
+            if existente:
+                db.session.rollback()
+                return jsonify({
+                    "error": "El médico ya tiene una regla para ese turno en alguno de esos días",
+                    "regla": existente.to_dict()
+                }), 409
+
+            hoy = date.today()
+            ReglaHorarioService.descartar_materializados(hoy, regla.medico_id, regla_id=regla.id)
+            conservados = ReglaHorarioController._conservados(regla.id, hoy)
+            db.session.commit()
+            invalidar_vistas()
+            return jsonify({
+                "message": "Regla actualizada",
+                "data": regla.to_dict(),
+                "horarios_con_citas_conservados": conservados
+            }), 200
+
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"error": str(e)}), 500
+
+    @staticmethod
+    def eliminar(id):
+        """
+        Elimina una regla. Sus horarios desde hoy sin citas se eliminan; los
+        que tienen citas (y los pasados) quedan como horarios sueltos.
+        """
+        try:
+            regla = ReglaHorario.query.get(id)
+            if not regla:
+                return jsonify({"error": "Regla no encontrada"}), 404
+
+            hoy = date.today()
+            ReglaHorarioService.descartar_materializados(hoy, regla.medico_id, regla_id=regla.id)
+            conservados = ReglaHorarioController._conservados(regla.id, hoy)
+            HorarioMedico.query.filter(HorarioMedico.regla_id == regla.id).update(
+                {HorarioMedico.regla_id: None}, synchronize_session=False
+            )
+            db.session.delete(regla)
+            db.session.commit()
+            invalidar_vistas()
+            return jsonify({
+                "message": "Regla eliminada",
+                "horarios_con_citas_conservados": conservados
+            }), 200
+
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"error": str(e)}), 500
+
+    @staticmethod
+    def crear_excepcion():
+        """
+        Registra o reemplaza la excepción de un médico para una fecha.
+
+        Payload esperado:
+        {
+            "medico_id": int, "fecha": "YYYY-MM-DD",
+            "turno": "M" | "T" (opcional, ambos por defecto),
+            "sin_atencion": bool,               (no atiende ese día)
+            "cupos": int, "area_id": int,       (o cambia cupos y/o área)
+            "motivo": string
+        }
+
+        Si la fecha ya tiene un horario con citas o creado directamente,
+        responde 409: ese horario se modifica con PUT /api/horarios/<id>.
+        """
+        try:
+            data = request.get_json(silent=True) or {}
+            medico_id = data.get("medico_id")
+            turno = data.get("turno") or None
+            sin_atencion = bool(data.get("sin_atencion"))
+
+            if not medico_id:
+                return jsonify({"error": "Se requiere medico_id"}), 400
+            try:
+                fecha = _fecha(data.get("fecha"), "fecha")
+                if not sin_atencion and data.get("cupos") is not None:
+                    _cupos(data["cupos"])
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            if turno not in (None, "M", "T"):
+                return jsonify({"error": "turno debe ser 'M' o 'T'"}), 400
+            if not sin_atencion and data.get("cupos") is None and not data.get("area_id"):
+                return jsonify({"error": "Indique sin_atencion o los cupos y/o el área de ese día"}), 400
+            if data.get("area_id") and not Area.query.get(data["area_id"]):
+                return jsonify({"error": "Área no encontrada"}), 404
+
+            # Horarios de esa fecha que la excepción no puede reemplazar
+            fijos = HorarioMedico.query.filter(
+                HorarioMedico.medico_id == medico_id,
+                HorarioMedico.fecha == fecha,
+                db.or_(HorarioMedico.regla_id.is_(None), HorarioMedico.ocupados > 0)
+            )
+            if turno:
+                fijos = fijos.filter(HorarioMedico.turno == turno)
+            fijo = fijos.first()
+            if fijo:
+                return jsonify({
+                    "error": "Ese día ya tiene un horario con citas o creado directamente; modifíquelo con PUT /api/horarios/<id>",
+                    "horario_id": fijo.id
+                }), 409
+
+            excepcion = ExcepcionHorario.query.filter_by(medico_id=medico_id, fecha=fecha, turno=turno).first()
+            if not excepcion:
+                excepcion = ExcepcionHorario(medico_id=medico_id, fecha=fecha, turno=turno)
+                db.session.add(excepcion)
+            excepcion.sin_atencion = sin_atencion
+            excepcion.cupos = None if sin_atencion else data.get("cupos")
+            excepcion.area_id = None if sin_atencion else data.get("area_id")
+            excepcion.motivo = data.get("motivo")
+
+            ReglaHorarioService.descartar_materializados(None, medico_id, fecha=fecha, turno=turno)
+            db.session.commit()
+            invalidar_vistas()
+            return jsonify({"message": "Excepción registrada", "data": excepcion.to_dict()}), 201
+
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"error": str(e)}), 500
+
+    @staticmethod
+    def listar_excepciones():
+        """
+        Excepciones de un médico en un mes.
+
+        Query params:
+        - medico_id: (requerido)
+        - mes: (requerido) YYYY-MM
+        """
+        try:
+            medico_id = request.args.get('medico_id', type=int)
+            mes = request.args.get('mes')
+            if not medico_id or not mes:
+                return jsonify({"error": "Se requiere medico_id y mes"}), 400
+            try:
+                year, month = map(int, mes.split("-"))
+                fecha_inicio = date(year, month, 1)
+                fecha_fin = date(year, month, monthrange(year, month)[1])
+            except ValueError:
+                return jsonify({"error": "Formato de mes inválido. Use YYYY-MM"}), 400
+
+            excepciones = ExcepcionHorario.query.filter(
+                ExcepcionHorario.medico_id == medico_id,
+                ExcepcionHorario.fecha >= fecha_inicio,
+                ExcepcionHorario.fecha <= fecha_fin
+            ).order_by(ExcepcionHorario.fecha, ExcepcionHorario.turno).all()
+            return jsonify([e.to_dict() for e in excepciones]), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @staticmethod
+    def eliminar_excepcion(id):
+        """Elimina una excepción; la fecha vuelve a seguir las reglas."""
+        try:
+            excepcion = ExcepcionHorario.query.get(id)
+            if not excepcion:
+                return jsonify({"error": "Excepción no encontrada"}), 404
+
+            ReglaHorarioService.descartar_materializados(
+                None, excepcion.medico_id, fecha=excepcion.fecha, turno=excepcion.turno
+            )
+            db.session.delete(excepcion)
+            db.session.commit()
+            invalidar_vistas()
+            return jsonify({"message": "Excepción eliminada"}), 200
+
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"error": str(e)}), 500
@@ -3,6 +3,7 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from extensions.database import db
 from models.usuario_model import Usuario
 from models.persona_model import Persona
+from services.persona_service import PersonaService
 from models.horario_medico_model import HorarioMedico
 from models.especialidad_model import Especialidad
 from flask_jwt_extended import create_access_token, create_refresh_token, decode_token
@@ -23,22 +24,16 @@ class UsuarioController:
             if Usuario.query.join(Persona).filter(Persona.dni == data["dni"]).first():
                 return jsonify({"error": "El DNI ya está registrado como usuario"}), 409
 
-            # 1. Gestionar Persona
-            persona = Persona.query.filter_by(dni=data["dni"]).first()
-            if not persona:
-                nombres = data.get("nombres_completos", "Usuario")
-                persona = Persona(
-                    dni=data["dni"],
-                    nombres=nombres,
-                    apellido_paterno="",
-                    apellido_materno=""
-                )
-                db.session.add(persona)
-                db.session.flush()
+            # 1. Gestionar Persona (si ya existe se conservan sus datos)
+            persona_id = PersonaService.upsert(data["dni"], {
+                "nombres": data.get("nombres_completos", "Usuario"),
+                "apellido_paterno": "",
+                "apellido_materno": ""
+            }, actualizar=())
 
             # 2. Gestionar Usuario
             usuario = Usuario(
-                persona_id=persona.id,
+                persona_id=persona_id,
                 dni=data["dni"],
                 password=generate_password_hash(data["password"]),
                 rol_id=data["rol_id"],
@@ -135,8 +130,6 @@ class UsuarioController:
         """
         try:
             from models.area_model import Area
-            from models.cita_model import Cita
-            from models.estado_cita_model import EstadoCita
             from sqlalchemy import func, desc
             from datetime import date
             
@@ -172,11 +165,13 @@ class UsuarioController:
             # 4. Subconsultas para DISPONIBILIDAD futura
             today = date.today()
 
-            # A. Capacidad total (Horarios futuros)
+            # A. Capacidad total y cupos ocupados (Horarios futuros)
+            # Los ocupados salen del contador de cada horario, sin agregar citas
             capacity_query = db.session.query(
                 HorarioMedico.medico_id,
                 func.count(HorarioMedico.id).label('total_turnos'),
-                func.sum(HorarioMedico.cupos).label('total_cupos')
+                func.sum(HorarioMedico.cupos).label('total_cupos'),
+                func.sum(HorarioMedico.ocupados).label('occupied_count')
             ).filter(
                 HorarioMedico.fecha >= today
             )
@@ -185,24 +180,6 @@ class UsuarioController:
                 capacity_query = capacity_query.filter(HorarioMedico.area_id == area_id_filter)
             
             capacity_subquery = capacity_query.group_by(HorarioMedico.medico_id).subquery()
-
-            # B. Citas ocupadas (Citas en horarios futuros activos)
-            occupied_query = db.session.query(
-                HorarioMedico.medico_id,
-                func.count(Cita.id).label('occupied_count')
-            ).join(
-                Cita, Cita.horario_id == HorarioMedico.id
-            ).join(
-                EstadoCita, Cita.estado_id == EstadoCita.id
-            ).filter(
-                HorarioMedico.fecha >= today,
-                EstadoCita.nombre != 'cancelada'
-            )
-
-            if area_id_filter:
-                occupied_query = occupied_query.filter(HorarioMedico.area_id == area_id_filter)
-
-            occupied_subquery = occupied_query.group_by(HorarioMedico.medico_id).subquery()
             
             # 5. Query principal
             query = db.session.query(
@@ -211,16 +188,13 @@ class UsuarioController:
                 areas_principales.c.area_nombre,
                 func.coalesce(capacity_subquery.c.total_turnos, 0).label('turnos'),
                 func.coalesce(capacity_subquery.c.total_cupos, 0).label('total_cupos'),
-                func.coalesce(occupied_subquery.c.occupied_count, 0).label('occupied')
+                func.coalesce(capacity_subquery.c.occupied_count, 0).label('occupied')
             ).outerjoin(
                 areas_principales,
                 Usuario.id == areas_principales.c.medico_id
             ).outerjoin(
                 capacity_subquery,
                 Usuario.id == capacity_subquery.c.medico_id
-            ).outerjoin(
-                occupied_subquery,
-                Usuario.id == occupied_subquery.c.medico_id
             ).filter(Usuario.rol_id == 2)
 
             # Filtros adicionales
@@ -541,35 +515,31 @@ class UsuarioController:
                 return jsonify({"error": "El DNI ya está registrado como usuario"}), 409
             
             # 1. Gestionar Persona
-            persona = Persona.query.filter_by(dni=dni).first()
-            if not persona:
-                # Obtener nombres del nuevo formato o del legacy
-                p_nombres = data.get("nombres")
-                p_ap1 = data.get("apellido_paterno")
-                p_ap2 = data.get("apellido_materno")
-
-                # Si no vienen divididos, intentar split del 'name' (formato legacy)
-                if not p_nombres and "name" in data:
-                    parts = data["name"].split(' ')
-                    p_nombres = parts[0]
-                    p_ap1 = parts[1] if len(parts) > 1 else ""
-                    p_ap2 = " ".join(parts[2:]) if len(parts) > 2 else ""
-
-                persona = Persona(
-                    dni=dni,
-                    nombres=p_nombres or "Usuario",
-                    apellido_paterno=p_ap1 or "",
-                    apellido_materno=p_ap2 or "",
-                    email=data.get("email"),
-                    telefono=data.get("telefono"),
-                    direccion=data.get("direccion")
-                )
-                db.session.add(persona)
-                db.session.flush()
+            # Obtener nombres del nuevo formato o del legacy
+            p_nombres = data.get("nombres")
+            p_ap1 = data.get("apellido_paterno")
+            p_ap2 = data.get("apellido_materno")
+
+            # Si no vienen divididos, intentar split del 'name' (formato legacy)
+            if not p_nombres and "name" in data:
+                parts = data["name"].split(' ')
+                p_nombres = parts[0]
+                p_ap1 = parts[1] if len(parts) > 1 else ""
+                p_ap2 = " ".join(parts[2:]) if len(parts) > 2 else ""
+
+            # Si la persona ya existe se conservan sus datos
+            persona_id = PersonaService.upsert(dni, {
+                "nombres": p_nombres or "Usuario",
+                "apellido_paterno": p_ap1 or "",
+                "apellido_materno": p_ap2 or "",
+                "email": data.get("email"),
+                "telefono": data.get("telefono"),
+                "direccion": data.get("direccion")
+            }, actualizar=())
 
             # 2. Gestionar Usuario
             usuario = Usuario(
-                persona_id=persona.id,
+                persona_id=persona_id,
                 password=generate_password_hash(data["password"]),
                 rol_id=role_mapping.get(data["role"], data["role"]),
                 activo=True
@@ -8,6 +8,8 @@ load_dotenv()
 from extensions.database import db
 from extensions.jwt_manager import jwt
 from config import config
+from models.estado_cita_model import EstadoCita
+from services.indice_disponibilidad import proximos
 
 # Import Routes
 from routes.paciente_route import paciente_bp
@@ -57,7 +59,8 @@ def create_app(config_name=None):
     CORS(app,
          origins=allowed_origins,
          supports_credentials=True,
-         allow_headers=["Content-Type", "Authorization", "X-CSRF-TOKEN"],
+         allow_headers=["Content-Type", "Authorization", "X-CSRF-TOKEN", "Idempotency-Key"],
+         expose_headers=["Idempotent-Replayed"],
          methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"]
     )
     
@@ -74,6 +77,22 @@ def create_app(config_name=None):
     app.register_blueprint(catalogo_bp, url_prefix="/api/catalogos")
     app.register_blueprint(especialidad_bp, url_prefix="/api/especialidades")
     app.register_blueprint(manual_bp, url_prefix="/api/manuales")
+
+    # Catálogo de estados de cita en memoria (ver EstadoCita.catalogo)
+    with app.app_context():
+        try:
+            EstadoCita.catalogo()
+        except Exception:
+            # La tabla aún no existe (instalación nueva, migraciones); se carga en la primera consulta
+            db.session.rollback()
+
+    # Índice de cupos libres por área del proceso (ver IndiceDisponibilidad)
+    with app.app_context():
+        try:
+            proximos.reconstruir(app.config["PROXIMO_DISPONIBLE_SEGUNDOS"])
+        except Exception:
+            # Sin tablas todavía: se construye en la primera búsqueda
+            db.session.rollback()
     
     # Global Health Check
     @app.route('/api/health', methods=['GET'])
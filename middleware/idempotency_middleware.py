@@ -0,0 +1,173 @@
+import hashlib
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import request, jsonify, make_response, current_app, Response
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from extensions.database import db
+from models.clave_idempotencia_model import ClaveIdempotencia
+
+CABECERA = "Idempotency-Key"
+LONGITUD_MAXIMA_CLAVE = 255
+TTL_POR_DEFECTO = timedelta(hours=24)
+PLAZO_RECLAMO_POR_DEFECTO = timedelta(seconds=120)
+# Cada cuánto se eliminan las claves vencidas (como mucho una vez por proceso en este periodo)
+PERIODO_PURGA = timedelta(minutes=10)
+
+_ultima_purga = None
+
+
+def _sha256(datos):
+    return hashlib.sha256(datos).hexdigest()
+
+
+def _usuario_actual():
+    """Id del usuario autenticado, o cadena vacía en endpoints públicos sin token."""
+    usuario = getattr(request, "user", None)
+    if usuario:
+        return str(usuario.get("id"))
+    try:
+        verify_jwt_in_request(optional=True)
+        identidad = get_jwt_identity()
+    except Exception:
+        return ""
+    return "" if identidad is None else str(identidad)
+
+
+def _purgar_si_corresponde(ahora):
+    global _ultima_purga
+    if _ultima_purga is None or ahora - _ultima_purga >= PERIODO_PURGA:
+        _ultima_purga = ahora
+        ClaveIdempotencia.purgar_expiradas()
+
+
+def _reclamar(clave_id, huella):
+    """
+    Registra la clave como "en proceso" y confirma de inmediato, para que un
+    reintento simultáneo choque con la llave primaria.
+    Una clave en proceso cuyo reclamo venció (IDEMPOTENCY_LEASE) se vuelve
+    a reclamar para el mismo cuerpo.
+    Retorna None si la clave quedó reclamada, o el registro existente.
+    """
+    ahora = datetime.utcnow()
+    ttl = current_app.config.get("IDEMPOTENCY_KEY_TTL", TTL_POR_DEFECTO)
+    plazo = current_app.config.get("IDEMPOTENCY_LEASE", PLAZO_RECLAMO_POR_DEFECTO)
+
+    for _ in range(2):
+        try:
+            _purgar_si_corresponde(ahora)
+            db.session.add(ClaveIdempotencia(id=clave_id, huella=huella, reclamada_en=ahora, expira_en=ahora + ttl))
+            db.session.commit()
+            return None
+        except IntegrityError:
+            db.session.rollback()
+
+        existente = db.session.get(ClaveIdempotencia, clave_id)
+        if existente is None:
+            continue
+        if existente.huella == huella and existente.reclamo_vencido(plazo):
+            # El proceso que la reclamó no respondió (murió o perdió la conexión): se toma el relevo
+            # con un UPDATE condicional, para que dos reintentos simultáneos no la reclamen a la vez
+            relevo = db.session.execute(
+                update(ClaveIdempotencia).where(
+                    ClaveIdempotencia.id == clave_id,
+                    ClaveIdempotencia.status_code.is_(None),
+                    ClaveIdempotencia.reclamada_en == existente.reclamada_en
+                ).values(reclamada_en=ahora, expira_en=ahora + ttl),
+                execution_options={"synchronize_session": False}
+            ).rowcount
+            db.session.commit()
+            if relevo:
+                return None
+            db.session.expire(existente)
+            return existente
+        if not existente.expirada:
+            return existente
+        # Clave vencida aún no purgada: se descarta y se vuelve a reclamar
+        db.session.delete(existente)
+        db.session.commit()
+
+    raise RuntimeError(f"No se pudo reservar la cabecera {CABECERA}")
+
+
+def _liberar(clave_id):
+    """Descarta la clave para que el cliente pueda reintentar."""
+    db.session.rollback()
+    db.session.query(ClaveIdempotencia).filter(ClaveIdempotencia.id == clave_id)\
+        .delete(synchronize_session=False)
+    db.session.commit()
+
+
+def _guardar(clave_id, respuesta):
+    # Descartar lo que el endpoint haya dejado sin confirmar
+    db.session.rollback()
+    db.session.execute(
+        update(ClaveIdempotencia).where(ClaveIdempotencia.id == clave_id).values(
+            status_code=respuesta.status_code,
+            mimetype=respuesta.mimetype,
+            cuerpo=respuesta.get_data(as_text=True)
+        ),
+        execution_options={"synchronize_session": False}
+    )
+    db.session.commit()
+
+
+def idempotente(f):
+    """
+    Hace que un endpoint de escritura se pueda reintentar sin efectos
+    duplicados enviando la cabecera Idempotency-Key.
+
+    - Primera petición con la clave: se ejecuta el endpoint y se guarda la respuesta.
+    - Reintento con la misma clave y el mismo cuerpo: se devuelve la respuesta
+      guardada (cabecera Idempotent-Replayed: true) sin ejecutar el endpoint.
+    - Misma clave con otro cuerpo: 422. Petición original aún en curso: 409.
+      Si la original no respondió dentro de IDEMPOTENCY_LEASE (el proceso
+      murió o perdió la conexión), el reintento la vuelve a ejecutar.
+
+    Las claves son por usuario: la misma clave de otro usuario no devuelve
+    su respuesta.
+
+    Las respuestas 5xx no se guardan, para permitir el reintento.
+    Sin la cabecera el endpoint se comporta como siempre.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        clave = request.headers.get(CABECERA)
+        if clave is None:
+            return f(*args, **kwargs)
+
+        clave = clave.strip()
+        if not clave or len(clave) > LONGITUD_MAXIMA_CLAVE:
+            return jsonify({"error": f"La cabecera {CABECERA} debe tener entre 1 y {LONGITUD_MAXIMA_CLAVE} caracteres"}), 400
+
+        clave_id = _sha256(f"{_usuario_actual()}\n{request.method} {request.path}\n{clave}".encode("utf-8"))
+        huella = _sha256(request.get_data())
+
+        try:
+            existente = _reclamar(clave_id, huella)
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"error": str(e)}), 500
+
+        if existente is not None:
+            if existente.huella != huella:
+                return jsonify({"error": f"La cabecera {CABECERA} ya se usó con otro contenido"}), 422
+            if existente.en_proceso:
+                return jsonify({"error": "La petición original con esta clave aún se está procesando"}), 409
+            respuesta = Response(existente.cuerpo, status=existente.status_code, mimetype=existente.mimetype)
+            respuesta.headers["Idempotent-Replayed"] = "true"
+            return respuesta
+
+        try:
+            respuesta = make_response(f(*args, **kwargs))
+        except Exception:
+            _liberar(clave_id)
+            raise
+
+        if respuesta.status_code >= 500 or respuesta.is_streamed:
+            _liberar(clave_id)
+        else:
+            _guardar(clave_id, respuesta)
+        return respuesta
+    return decorated
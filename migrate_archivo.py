@@ -0,0 +1,42 @@
+"""
+Script de migración para el archivo de citas antiguas.
+
+Crea las tablas citas_archivo e historial_estado_citas_archivo con sus
+índices. El traslado de las citas lo hace archivar_citas.py.
+
+Ejecutar:
+    python migrate_archivo.py
+"""
+
+from app import app
+from extensions.database import db
+from models.cita_archivada_model import CitaArchivada, HistorialEstadoCitaArchivado
+
+
+def run_migration():
+    print("=" * 60)
+    print("  MIGRACIÓN: Archivo de citas antiguas")
+    print("=" * 60)
+
+    with app.app_context():
+        try:
+            for modelo in (CitaArchivada, HistorialEstadoCitaArchivado):
+                modelo.__table__.create(bind=db.engine, checkfirst=True)
+                print(f"  ✓ Tabla {modelo.__tablename__} lista")
+
+                for index in modelo.__table__.indexes:
+                    index.create(bind=db.engine, checkfirst=True)
+                    print(f"  ✓ {index.name}")
+
+            print("\n" + "=" * 60)
+            print("  ✓ MIGRACIÓN COMPLETADA EXITOSAMENTE")
+            print("=" * 60)
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"\n✗ Error en migración: {e}")
+            raise
+
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,124 @@
+"""
+Script de migración para la asignación de hora por cupo.
+
+Agrega horarios_medicos.duracion_cupo (minutos por cupo, por defecto el
+turno repartido entre los cupos), horarios_medicos.slots_ocupados (mapa de
+bits de los cupos con hora) y citas.hora (también en citas_archivo si
+existe).
+
+Las citas no canceladas desde hoy reciben la hora de un cupo libre de su
+horario, en el orden en que se registraron. Las citas pasadas quedan sin
+hora. Luego se recalcula slots_ocupados de esos horarios.
+
+Ejecutar:
+    python migrate_horas_cupos.py
+"""
+
+from collections import defaultdict
+from datetime import date
+
+from sqlalchemy import bindparam, inspect, text, update
+
+from app import app
+from extensions.database import db
+from models.cita_model import Cita
+from models.estado_cita_model import EstadoCita
+from models.horario_medico_model import HorarioMedico
+
+
+def _agregar_columna(tabla, columna, definicion):
+    columnas = [c["name"] for c in inspect(db.engine).get_columns(tabla)]
+    if columna in columnas:
+        print(f"  - La columna {tabla}.{columna} ya existe")
+        return False
+    db.session.execute(text(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}"))
+    db.session.commit()
+    print(f"  ✓ Columna {tabla}.{columna} agregada")
+    return True
+
+
+def asignar_horas(desde):
+    """Asigna hora a las citas no canceladas sin hora desde `desde`. Retorna cuántas."""
+    canceladas = EstadoCita.catalogo().ids('cancelada')
+    pendientes = db.session.query(Cita.id, Cita.horario_id).filter(
+        Cita.fecha >= desde,
+        Cita.horario_id.isnot(None),
+        Cita.hora.is_(None),
+        db.or_(Cita.estado_id.is_(None), Cita.estado_id.not_in(canceladas))
+    ).order_by(Cita.horario_id, Cita.fecha_registro, Cita.id).all()
+
+    por_horario = defaultdict(list)
+    for cita_id, horario_id in pendientes:
+        por_horario[horario_id].append(cita_id)
+    if not por_horario:
+        return 0
+
+    # Los horarios se recalculan primero por si ya tenían citas con hora
+    HorarioMedico.recalcular_slots(list(por_horario))
+    horarios = {
+        horario_id: (cupos, turno, duracion, mascara)
+        for horario_id, cupos, turno, duracion, mascara in db.session.query(
+            HorarioMedico.id, HorarioMedico.cupos, HorarioMedico.turno,
+            HorarioMedico.duracion_cupo, HorarioMedico.slots_ocupados
+        ).filter(HorarioMedico.id.in_(list(por_horario)))
+    }
+
+    horas = []
+    for horario_id, cita_ids in por_horario.items():
+        cupos, turno, duracion, mascara = horarios[horario_id]
+        # Si hay más citas que cupos con hora, las últimas quedan sin hora
+        slots, _ = HorarioMedico.siguientes_slots(mascara, min(cupos, HorarioMedico.MAX_SLOTS), len(cita_ids))
+        horas.extend(
+            {"b_id": cita_id, "b_hora": HorarioMedico.hora_slot(turno, duracion, slot)}
+            for cita_id, slot in zip(cita_ids, slots)
+        )
+
+    if horas:
+        tabla = Cita.__table__
+        db.session.execute(
+            update(tabla).where(tabla.c.id == bindparam("b_id")).values(hora=bindparam("b_hora")),
+            horas
+        )
+    HorarioMedico.recalcular_slots(list(por_horario))
+    return len(horas)
+
+
+def run_migration():
+    print("=" * 60)
+    print("  MIGRACIÓN: Hora por cupo y mapa de cupos ocupados")
+    print("=" * 60)
+
+    with app.app_context():
+        try:
+            if _agregar_columna("horarios_medicos", "duracion_cupo", "INTEGER"):
+                # Turno de 6 horas repartido entre los cupos (mínimo 1 minuto)
+                db.session.execute(text(
+                    "UPDATE horarios_medicos SET duracion_cupo = CASE "
+                    f"WHEN cupos <= 0 THEN {HorarioMedico.MINUTOS_TURNO} "
+                    f"WHEN cupos > {HorarioMedico.MINUTOS_TURNO} THEN 1 "
+                    f"ELSE {HorarioMedico.MINUTOS_TURNO} / cupos END"
+                ))
+                db.session.commit()
+                print("  ✓ duracion_cupo calculada para los horarios existentes")
+
+            _agregar_columna("horarios_medicos", "slots_ocupados", "BIGINT NOT NULL DEFAULT 0")
+            _agregar_columna("citas", "hora", "TIME")
+            if inspect(db.engine).has_table("citas_archivo"):
+                _agregar_columna("citas_archivo", "hora", "TIME")
+
+            asignadas = asignar_horas(date.today())
+            db.session.commit()
+            print(f"  ✓ {asignadas} citas desde hoy con hora asignada")
+
+            print("\n" + "=" * 60)
+            print("  ✓ MIGRACIÓN COMPLETADA EXITOSAMENTE")
+            print("=" * 60)
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"\n✗ Error en migración: {e}")
+            raise
+
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,56 @@
+"""
+Script de migración para la tabla de claves de idempotencia.
+
+Crea la tabla claves_idempotencia, donde se guardan las respuestas de las
+peticiones de escritura enviadas con la cabecera Idempotency-Key
+(POST/PUT/PATCH/DELETE de citas y pacientes). Las claves vencen después de
+IDEMPOTENCY_KEY_TTL_HOURS (24 por defecto) y se eliminan solas; este script
+también purga las vencidas, por lo que se puede ejecutar periódicamente.
+
+En una tabla ya creada agrega la columna reclamada_en (inicio del plazo de
+reclamo de las claves en proceso), tomando created_at para las existentes.
+
+Ejecutar:
+    python migrate_idempotencia.py
+"""
+
+from sqlalchemy import inspect, text
+
+from app import app
+from extensions.database import db
+from models.clave_idempotencia_model import ClaveIdempotencia
+
+
+def run_migration():
+    print("=" * 60)
+    print("  MIGRACIÓN: Claves de idempotencia")
+    print("=" * 60)
+
+    with app.app_context():
+        try:
+            ClaveIdempotencia.__table__.create(bind=db.engine, checkfirst=True)
+            print("  ✓ Tabla claves_idempotencia lista")
+
+            columnas = [c["name"] for c in inspect(db.engine).get_columns("claves_idempotencia")]
+            if "reclamada_en" not in columnas:
+                db.session.execute(text("ALTER TABLE claves_idempotencia ADD COLUMN reclamada_en TIMESTAMP"))
+                db.session.execute(text("UPDATE claves_idempotencia SET reclamada_en = created_at"))
+                db.session.commit()
+                print("  ✓ Columna claves_idempotencia.reclamada_en agregada")
+
+            eliminadas = ClaveIdempotencia.purgar_expiradas()
+            db.session.commit()
+            print(f"  ✓ {eliminadas} claves vencidas eliminadas")
+
+            print("\n" + "=" * 60)
+            print("  ✓ MIGRACIÓN COMPLETADA EXITOSAMENTE")
+            print("=" * 60)
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"\n✗ Error en migración: {e}")
+            raise
+
+
+if __name__ == "__main__":
+    run_migration()
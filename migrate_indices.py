@@ -0,0 +1,62 @@
+"""
+Script de migración para crear los índices compuestos de las consultas frecuentes.
+
+Índices:
+- citas(fecha, area_id, estado_id): listados por fecha/área/estado e indicadores
+- citas(horario_id, estado_id): conteo de cupos ocupados por horario
+- citas(doctor_id, fecha): agenda del profesional
+- citas(fecha_registro): filtro por fecha de registro y orden del listado
+- horarios_medicos(area_id, fecha): disponibilidad por área e indicadores
+- historial_estado_citas(cita_id, fecha_cambio): historial de una cita
+
+Los índices se crean solo si no existen, por lo que el script se puede
+ejecutar varias veces.
+
+Ejecutar:
+    python migrate_indices.py
+"""
+
+from app import app
+from extensions.database import db
+from models.cita_model import Cita
+from models.horario_medico_model import HorarioMedico
+from models.historial_estado_cita_model import HistorialEstadoCita
+
+INDICES = [
+    *Cita.__table__.indexes,
+    *HorarioMedico.__table__.indexes,
+    *HistorialEstadoCita.__table__.indexes,
+]
+
+
+def run_migration():
+    print("=" * 60)
+    print("  MIGRACIÓN: Índices para consultas frecuentes")
+    print("=" * 60)
+
+    with app.app_context():
+        try:
+            for index in sorted(INDICES, key=lambda i: i.name):
+                columnas = ", ".join(c.name for c in index.columns)
+                index.create(bind=db.engine, checkfirst=True)
+                print(f"  ✓ {index.name} ON {index.table.name} ({columnas})")
+
+            # Actualizar estadísticas para que el planificador use los nuevos índices
+            if db.engine.dialect.name == "postgresql":
+                for tabla in ("citas", "horarios_medicos", "historial_estado_citas"):
+                    db.session.execute(db.text(f"ANALYZE {tabla}"))
+                db.session.commit()
+                print("  ✓ ANALYZE ejecutado")
+
+            print("\n" + "=" * 60)
+            print("  ✓ MIGRACIÓN COMPLETADA EXITOSAMENTE")
+            print("=" * 60)
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"\n✗ Error en migración: {e}")
+            raise
+
+
+if __name__ == "__main__":
+    run_migration()
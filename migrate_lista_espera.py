@@ -0,0 +1,42 @@
+"""
+Script de migración para la lista de espera de citas.
+
+Crea la tabla lista_espera y su índice (area_id, fecha, estado,
+fecha_registro). Cuando una cita se cancela o se elimina, el cupo liberado
+se asigna al primer paciente en espera del horario o del área en esa fecha.
+
+Ejecutar:
+    python migrate_lista_espera.py
+"""
+
+from app import app
+from extensions.database import db
+from models.lista_espera_model import ListaEspera
+
+
+def run_migration():
+    print("=" * 60)
+    print("  MIGRACIÓN: Lista de espera de citas")
+    print("=" * 60)
+
+    with app.app_context():
+        try:
+            ListaEspera.__table__.create(bind=db.engine, checkfirst=True)
+            print("  ✓ Tabla lista_espera lista")
+
+            for index in ListaEspera.__table__.indexes:
+                index.create(bind=db.engine, checkfirst=True)
+                print(f"  ✓ {index.name}")
+
+            print("\n" + "=" * 60)
+            print("  ✓ MIGRACIÓN COMPLETADA EXITOSAMENTE")
+            print("=" * 60)
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"\n✗ Error en migración: {e}")
+            raise
+
+
+if __name__ == "__main__":
+    run_migration()
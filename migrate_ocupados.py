@@ -0,0 +1,54 @@
+"""
+Script de migración para el contador de cupos ocupados de horarios_medicos.
+
+Agrega la columna horarios_medicos.ocupados y la llena con la cantidad de
+citas no canceladas de cada horario. A partir de aquí el contador se
+mantiene al crear, cancelar, reactivar y eliminar citas.
+
+El recálculo se puede volver a ejecutar en cualquier momento para corregir
+los contadores.
+
+Ejecutar:
+    python migrate_ocupados.py
+"""
+
+from sqlalchemy import inspect, text
+
+from app import app
+from extensions.database import db
+from models.horario_medico_model import HorarioMedico
+
+
+def run_migration():
+    print("=" * 60)
+    print("  MIGRACIÓN: Contador de cupos ocupados por horario")
+    print("=" * 60)
+
+    with app.app_context():
+        try:
+            columnas = [c["name"] for c in inspect(db.engine).get_columns("horarios_medicos")]
+            if "ocupados" not in columnas:
+                db.session.execute(text(
+                    "ALTER TABLE horarios_medicos ADD COLUMN ocupados INTEGER NOT NULL DEFAULT 0"
+                ))
+                db.session.commit()
+                print("  ✓ Columna ocupados agregada")
+            else:
+                print("  - La columna ocupados ya existe")
+
+            HorarioMedico.recalcular_ocupados()
+            db.session.commit()
+            print("  ✓ Contadores recalculados desde las citas no canceladas")
+
+            print("\n" + "=" * 60)
+            print("  ✓ MIGRACIÓN COMPLETADA EXITOSAMENTE")
+            print("=" * 60)
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"\n✗ Error en migración: {e}")
+            raise
+
+
+if __name__ == "__main__":
+    run_migration()
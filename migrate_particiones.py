@@ -0,0 +1,198 @@
+"""
+Script de particionamiento mensual (solo PostgreSQL) de las tablas que
+crecen sin límite:
+
+- citas, por citas.fecha
+- historial_estado_citas, por historial_estado_citas.fecha_cambio
+
+La primera ejecución convierte cada tabla en una tabla particionada por
+rango (PARTITION BY RANGE) dentro de una sola transacción: renombra la
+tabla, crea la particionada con las mismas columnas, crea una partición por
+mes con datos más una partición DEFAULT (filas con fecha NULL o fuera de
+rango), copia las filas, verifica la cantidad y elimina la tabla anterior.
+Los índices y las llaves foráneas salientes se vuelven a crear desde los
+modelos.
+
+Limitaciones de PostgreSQL sobre tablas particionadas:
+- La llave primaria debe incluir la columna de partición y citas.fecha
+  admite NULL, por eso cada partición tiene su propia PRIMARY KEY (id) y la
+  secuencia garantiza ids únicos entre particiones.
+- Ninguna llave foránea puede apuntar a una tabla particionada sin una
+  restricción única en el padre: se eliminan las FK que apuntan a citas
+  (historial_estado_citas.cita_id, lista_espera.cita_id). Todo lo que
+  elimina citas (CitaController.eliminar, ArchivoService.archivar_lote)
+  borra antes su historial y desvincula la lista de espera con
+  Cita.desvincular_dependientes; tests/verify_particiones.py comprueba que
+  no queden filas huérfanas.
+
+Las ejecuciones siguientes solo crean las particiones de los próximos
+meses, por lo que el script se debe programar (por ejemplo con cron una vez
+al mes) para que las filas nuevas nunca caigan en la partición DEFAULT.
+Si la DEFAULT ya tiene filas del mes a crear, se mueven a la nueva partición.
+
+Haga un respaldo (pg_dump) antes de la primera ejecución y ejecute antes
+las migraciones que crean tablas con FK hacia citas (migrate_lista_espera.py).
+
+Ejecutar:
+    python migrate_particiones.py [--meses N]   (N meses futuros, 3 por defecto)
+"""
+
+import argparse
+from datetime import date, datetime
+
+from sqlalchemy import text
+from sqlalchemy.schema import AddConstraint
+
+from app import app
+from extensions.database import db
+from models.cita_model import Cita
+from models.historial_estado_cita_model import HistorialEstadoCita
+
+# tabla -> (modelo, columna de partición)
+TABLAS = {
+    "citas": (Cita, "fecha"),
+    "historial_estado_citas": (HistorialEstadoCita, "fecha_cambio"),
+}
+
+
+def _mes_siguiente(mes):
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def _meses(desde, hasta):
+    if isinstance(hasta, datetime):
+        hasta = hasta.date()
+    mes = date(desde.year, desde.month, 1)
+    while mes <= hasta:
+        yield mes
+        mes = _mes_siguiente(mes)
+
+
+def esta_particionada(conn, tabla):
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:tabla))"
+    ), {"tabla": tabla}).scalar()
+
+
+def crear_particion(conn, tabla, columna, mes):
+    """
+    Crea la partición de `tabla` para el mes que empieza en `mes`, si no existe.
+    Retorna True si la creó.
+    """
+    nombre = f"{tabla}_{mes:%Y_%m}"
+    if conn.execute(text("SELECT to_regclass(:nombre)"), {"nombre": nombre}).scalar():
+        return False
+
+    fin = _mes_siguiente(mes)
+    rango = {"inicio": mes, "fin": fin}
+    default = f"{tabla}_default"
+
+    # Filas del mes que cayeron en la DEFAULT: se apartan para poder crear la partición
+    tiene_default = conn.execute(text("SELECT to_regclass(:nombre)"), {"nombre": default}).scalar()
+    movidas = 0
+    if tiene_default:
+        movidas = conn.execute(text(
+            f"CREATE TEMP TABLE _movidas ON COMMIT DROP AS "
+            f"SELECT * FROM {default} WHERE {columna} >= :inicio AND {columna} < :fin"
+        ), rango).rowcount
+        if movidas:
+            conn.execute(text(f"DELETE FROM {default} WHERE {columna} >= :inicio AND {columna} < :fin"), rango)
+
+    conn.execute(text(
+        f"CREATE TABLE {nombre} PARTITION OF {tabla} FOR VALUES FROM ('{mes}') TO ('{fin}')"
+    ))
+    conn.execute(text(f"ALTER TABLE {nombre} ADD PRIMARY KEY (id)"))
+
+    if tiene_default:
+        if movidas:
+            conn.execute(text(f"INSERT INTO {tabla} SELECT * FROM _movidas"))
+            print(f"    {movidas} filas movidas desde {default}")
+        conn.execute(text("DROP TABLE _movidas"))
+    return True
+
+
+def convertir_tabla(conn, tabla, modelo, columna):
+    """Convierte `tabla` en una tabla particionada por mes sobre `columna`."""
+    anterior = f"{tabla}_sin_particionar"
+    conn.execute(text(f"LOCK TABLE {tabla} IN ACCESS EXCLUSIVE MODE"))
+
+    # FK de otras tablas que apuntan a esta (no se permiten hacia una tabla particionada)
+    referencias = conn.execute(text(
+        "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+        "WHERE contype = 'f' AND confrelid = to_regclass(:tabla)"
+    ), {"tabla": tabla}).all()
+    for origen, restriccion in referencias:
+        conn.execute(text(f'ALTER TABLE {origen} DROP CONSTRAINT "{restriccion}"'))
+        print(f"    - FK {restriccion} de {origen} eliminada")
+
+    secuencia = conn.execute(text("SELECT pg_get_serial_sequence(:tabla, 'id')"), {"tabla": tabla}).scalar()
+    conn.execute(text(f"ALTER TABLE {tabla} RENAME TO {anterior}"))
+    conn.execute(text(
+        f"CREATE TABLE {tabla} (LIKE {anterior} INCLUDING DEFAULTS) PARTITION BY RANGE ({columna})"
+    ))
+    if secuencia:
+        conn.execute(text(f"ALTER SEQUENCE {secuencia} OWNED BY {tabla}.id"))
+
+    # Una partición por cada mes con datos, más la DEFAULT
+    minimo, maximo = conn.execute(text(f"SELECT min({columna}), max({columna}) FROM {anterior}")).one()
+    if minimo is not None:
+        for mes in _meses(minimo, maximo):
+            crear_particion(conn, tabla, columna, mes)
+    conn.execute(text(f"CREATE TABLE {tabla}_default PARTITION OF {tabla} DEFAULT"))
+    conn.execute(text(f"ALTER TABLE {tabla}_default ADD PRIMARY KEY (id)"))
+
+    total = conn.execute(text(f"SELECT count(*) FROM {anterior}")).scalar()
+    copiadas = conn.execute(text(f"INSERT INTO {tabla} SELECT * FROM {anterior}")).rowcount
+    if copiadas != total:
+        raise RuntimeError(f"{tabla}: se copiaron {copiadas} de {total} filas")
+    conn.execute(text(f"DROP TABLE {anterior}"))
+    print(f"  ✓ {tabla}: {copiadas} filas copiadas a la tabla particionada por {columna}")
+
+    # Índices (se propagan a cada partición) y FK salientes desde el modelo,
+    # salvo las que apuntan a otra tabla particionada
+    for index in modelo.__table__.indexes:
+        index.create(bind=conn)
+    for fk in modelo.__table__.foreign_key_constraints:
+        if fk.referred_table.name not in TABLAS:
+            conn.execute(AddConstraint(fk))
+    conn.execute(text(f"ANALYZE {tabla}"))
+
+
+def run_migration(meses_futuros=3):
+    print("=" * 60)
+    print("  MIGRACIÓN: Particionamiento mensual de citas e historial")
+    print("=" * 60)
+
+    with app.app_context():
+        if db.engine.dialect.name != "postgresql":
+            print("  - El particionamiento solo aplica a PostgreSQL; no se hizo ningún cambio")
+            return
+
+        try:
+            with db.engine.begin() as conn:
+                for tabla, (modelo, columna) in TABLAS.items():
+                    if not esta_particionada(conn, tabla):
+                        convertir_tabla(conn, tabla, modelo, columna)
+                    else:
+                        print(f"  - {tabla} ya está particionada")
+
+                    hoy = datetime.utcnow().date()
+                    hasta = date(hoy.year + (hoy.month - 1 + meses_futuros) // 12,
+                                 (hoy.month - 1 + meses_futuros) % 12 + 1, 1)
+                    creadas = [mes for mes in _meses(hoy, hasta) if crear_particion(conn, tabla, columna, mes)]
+                    for mes in creadas:
+                        print(f"  ✓ Partición {tabla}_{mes:%Y_%m}")
+
+            print("\n" + "=" * 60)
+            print("  ✓ MIGRACIÓN COMPLETADA EXITOSAMENTE")
+            print("=" * 60)
+
+        except Exception as e:
+            print(f"\n✗ Error en migración: {e}")
+            raise
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Particiona citas e historial por mes (PostgreSQL)")
+    parser.add_argument("--meses", type=int, default=3, help="Meses futuros a crear por adelantado")
+    run_migration(parser.parse_args().meses)
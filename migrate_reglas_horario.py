@@ -0,0 +1,56 @@
+"""
+Script de migración para los horarios recurrentes.
+
+Crea las tablas reglas_horario y excepciones_horario y agrega la columna
+horarios_medicos.regla_id. Los horarios existentes no cambian y siguen
+teniendo prioridad sobre las reglas.
+
+Ejecutar:
+    python migrate_reglas_horario.py
+"""
+
+from sqlalchemy import inspect, text
+
+from app import app
+from extensions.database import db
+from models.regla_horario_model import ReglaHorario, ExcepcionHorario
+
+
+def run_migration():
+    print("=" * 60)
+    print("  MIGRACIÓN: Reglas de horario recurrentes")
+    print("=" * 60)
+
+    with app.app_context():
+        try:
+            for modelo in (ReglaHorario, ExcepcionHorario):
+                modelo.__table__.create(bind=db.engine, checkfirst=True)
+                print(f"  ✓ Tabla {modelo.__tablename__} lista")
+
+                for index in modelo.__table__.indexes:
+                    index.create(bind=db.engine, checkfirst=True)
+                    print(f"  ✓ {index.name}")
+
+            columnas = [c["name"] for c in inspect(db.engine).get_columns("horarios_medicos")]
+            if "regla_id" not in columnas:
+                db.session.execute(text(
+                    "ALTER TABLE horarios_medicos ADD COLUMN regla_id INTEGER "
+                    "REFERENCES reglas_horario(id) ON DELETE SET NULL"
+                ))
+                db.session.commit()
+                print("  ✓ Columna regla_id agregada")
+            else:
+                print("  - La columna regla_id ya existe")
+
+            print("\n" + "=" * 60)
+            print("  ✓ MIGRACIÓN COMPLETADA EXITOSAMENTE")
+            print("=" * 60)
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"\n✗ Error en migración: {e}")
+            raise
+
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,98 @@
+from extensions.database import db
+from models.cita_model import Cita
+from models.historial_estado_cita_model import HistorialEstadoCita
+
+
+class CitaArchivada(db.Model):
+    """
+    Citas con fecha anterior al horizonte de archivo (ArchivoService.archivar).
+
+    Mismas columnas e id que en citas, sin llaves foráneas: los horarios y
+    usuarios de una cita archivada se pueden eliminar después. Se serializa
+    igual que Cita, por lo que el historial de un paciente las devuelve sin
+    distinguirlas.
+    """
+    __tablename__ = "citas_archivo"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    paciente_id = db.Column(db.Integer, nullable=False)
+    horario_id = db.Column(db.Integer, nullable=True)
+    doctor_id = db.Column(db.Integer, nullable=True)
+    area_id = db.Column(db.Integer, nullable=True)
+    fecha = db.Column(db.Date, nullable=True)
+    hora = db.Column(db.Time, nullable=True)
+    sintomas = db.Column(db.Text, nullable=False)
+    datos_adicionales = db.Column(db.JSON)
+    fecha_registro = db.Column(db.DateTime)
+    estado_id = db.Column(db.Integer, nullable=True)
+    acompanante_persona_id = db.Column(db.Integer, nullable=True)
+    fecha_archivo = db.Column(db.DateTime, nullable=True)
+
+    # Historial de un paciente, en el mismo orden que el de citas
+    __table_args__ = (
+        db.Index('ix_citas_archivo_paciente_fecha', 'paciente_id', 'fecha', 'fecha_registro'),
+    )
+
+    # Relaciones de solo lectura (sin FK en la tabla)
+    paciente = db.relationship('Paciente', primaryjoin='foreign(CitaArchivada.paciente_id) == Paciente.id',
+                               viewonly=True)
+    horario = db.relationship('HorarioMedico', primaryjoin='foreign(CitaArchivada.horario_id) == HorarioMedico.id',
+                              viewonly=True)
+    doctor = db.relationship('Usuario', primaryjoin='foreign(CitaArchivada.doctor_id) == Usuario.id',
+                             viewonly=True)
+    area_rel = db.relationship('Area', primaryjoin='foreign(CitaArchivada.area_id) == Area.id', viewonly=True)
+    acompanante = db.relationship('Persona',
+                                  primaryjoin='foreign(CitaArchivada.acompanante_persona_id) == Persona.id',
+                                  viewonly=True)
+
+    # Columnas que se copian desde citas
+    COLUMNAS = ("id", "paciente_id", "horario_id", "doctor_id", "area_id", "fecha", "hora", "sintomas",
+                "datos_adicionales", "fecha_registro", "estado_id", "acompanante_persona_id")
+
+    # Mismas propiedades y serialización que Cita
+    estado_info = Cita.estado_info
+    estado_nombre = Cita.estado_nombre
+    area = Cita.area
+    estado = Cita.estado
+    dni_acompanante = Cita.dni_acompanante
+    nombre_acompanante = Cita.nombre_acompanante
+    nombres_acompanante_only = Cita.nombres_acompanante_only
+    telefono_acompanante = Cita.telefono_acompanante
+    apellido_paterno_acompanante = Cita.apellido_paterno_acompanante
+    apellido_materno_acompanante = Cita.apellido_materno_acompanante
+    CAMPOS = Cita.CAMPOS
+    to_dict = Cita.to_dict
+
+
+class HistorialEstadoCitaArchivado(db.Model):
+    """Historial de estados de las citas archivadas."""
+    __tablename__ = "historial_estado_citas_archivo"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    cita_id = db.Column(db.Integer, nullable=False)
+    estado_anterior_id = db.Column(db.Integer, nullable=True)
+    estado_nuevo_id = db.Column(db.Integer, nullable=False)
+    usuario_id = db.Column(db.Integer, nullable=True)
+    fecha_cambio = db.Column(db.DateTime)
+    comentario = db.Column(db.Text, nullable=True)
+    ip_address = db.Column(db.String(45), nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_historial_estado_citas_archivo_cita_fecha', 'cita_id', 'fecha_cambio'),
+    )
+
+    usuario = db.relationship('Usuario', primaryjoin='foreign(HistorialEstadoCitaArchivado.usuario_id) == Usuario.id',
+                              viewonly=True)
+    estado_anterior = db.relationship(
+        'EstadoCita', primaryjoin='foreign(HistorialEstadoCitaArchivado.estado_anterior_id) == EstadoCita.id',
+        viewonly=True
+    )
+    estado_nuevo = db.relationship(
+        'EstadoCita', primaryjoin='foreign(HistorialEstadoCitaArchivado.estado_nuevo_id) == EstadoCita.id',
+        viewonly=True
+    )
+
+    COLUMNAS = ("id", "cita_id", "estado_anterior_id", "estado_nuevo_id", "usuario_id",
+                "fecha_cambio", "comentario", "ip_address")
+
+    to_dict = HistorialEstadoCita.to_dict
@@ -1,6 +1,7 @@
 from extensions.database import db
 from datetime import datetime
 from models.estado_cita_model import EstadoCita
+from utils.fields import serializar
 
 class Cita(db.Model):
     __tablename__ = "citas"
@@ -11,10 +12,21 @@ class Cita(db.Model):
     doctor_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=True)
     area_id = db.Column(db.Integer, db.ForeignKey('areas.id'), nullable=True)
     fecha = db.Column(db.Date, nullable=True)  # Fecha de la cita
+    # Hora del cupo asignado al reservar (HorarioMedico.reservar_cupo). NULL en
+    # las citas canceladas y en las anteriores a la asignación por horas
+    hora = db.Column(db.Time, nullable=True)
     sintomas = db.Column(db.Text, nullable=False)
     
     datos_adicionales = db.Column(db.JSON)
     fecha_registro = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Índices para las consultas frecuentes (listados, cupos, agenda del médico, indicadores)
+    __table_args__ = (
+        db.Index('ix_citas_fecha_area_estado', 'fecha', 'area_id', 'estado_id'),
+        db.Index('ix_citas_horario_estado', 'horario_id', 'estado_id'),
+        db.Index('ix_citas_doctor_fecha', 'doctor_id', 'fecha'),
+        db.Index('ix_citas_fecha_registro', 'fecha_registro'),
+    )
     
     # Normalización: Estado de la cita
     estado_id = db.Column(db.Integer, db.ForeignKey('estados_cita.id'), nullable=True)
@@ -30,9 +42,15 @@ class Cita(db.Model):
     doctor = db.relationship('Usuario', backref=db.backref('citas_asignadas', lazy=True))
     area_rel = db.relationship('Area', backref=db.backref('citas', lazy=True))
 
+    @property
+    def estado_info(self):
+        """Estado desde el catálogo en memoria (sin cargar estado_rel)."""
+        return EstadoCita.catalogo().get(self.estado_id)
+
     @property
     def estado_nombre(self):
-        return self.estado_rel.nombre if self.estado_rel else "pendiente"
+        estado = self.estado_info
+        return estado.nombre if estado else "pendiente"
 
     @property
     def area(self):
@@ -68,33 +86,62 @@ class Cita(db.Model):
     def apellido_materno_acompanante(self):
         return self.acompanante.apellido_materno if self.acompanante else None
 
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "paciente_id": self.paciente_id,
-            "horario_id": self.horario_id,
-            "doctor_id": self.doctor_id,
-            "area_id": self.area_id,
-            "area": self.area,
-            "fecha": str(self.fecha) if self.fecha else None,
-            "sintomas": self.sintomas,
-            "dni_acompanante": self.dni_acompanante,
-            "nombre_acompanante": self.nombre_acompanante, # Nombre completo para backward compatibility
-            "nombres_acompanante": self.nombres_acompanante_only,
-            "apellido_paterno_acompanante": self.apellido_paterno_acompanante,
-            "apellido_materno_acompanante": self.apellido_materno_acompanante,
-            "telefono_acompanante": self.telefono_acompanante,
-            "datos_adicionales": self.datos_adicionales,
-            "fecha_registro": str(self.fecha_registro),
-            
-            # Estado normalizado
-            "estado": self.estado_nombre,
-            "estado_info": self.estado_rel.to_dict() if self.estado_rel else None,
-            "color_estado": self.estado_rel.color if self.estado_rel else "blue",
-            
-            # Datos adicionales de relaciones
-            "doctor_nombre": self.doctor.nombres_completos if self.doctor else None,
-            "area_nombre": self.area_rel.nombre if self.area_rel else self.area,
-            "horario_turno": self.horario.turno if self.horario else None,
-            "horario_turno_nombre": self.horario.turno_nombre if self.horario else None,
-        }
+    # Campo de to_dict -> (serializador, atributos que necesita cargar)
+    # Permite serializar y cargar solo los campos pedidos con `fields=` (ver utils/fields.py)
+    CAMPOS = {
+        "id": (lambda c: c.id, "id"),
+        "paciente_id": (lambda c: c.paciente_id, "paciente_id"),
+        "horario_id": (lambda c: c.horario_id, "horario_id"),
+        "doctor_id": (lambda c: c.doctor_id, "doctor_id"),
+        "area_id": (lambda c: c.area_id, "area_id"),
+        "area": (lambda c: c.area, "area_rel.nombre"),
+        "fecha": (lambda c: str(c.fecha) if c.fecha else None, "fecha"),
+        "hora": (lambda c: str(c.hora) if c.hora else None, "hora"),
+        "sintomas": (lambda c: c.sintomas, "sintomas"),
+        "dni_acompanante": (lambda c: c.dni_acompanante, "acompanante.dni"),
+        # Nombre completo para backward compatibility
+        "nombre_acompanante": (lambda c: c.nombre_acompanante,
+                               "acompanante.nombres", "acompanante.apellido_paterno", "acompanante.apellido_materno"),
+        "nombres_acompanante": (lambda c: c.nombres_acompanante_only, "acompanante.nombres"),
+        "apellido_paterno_acompanante": (lambda c: c.apellido_paterno_acompanante, "acompanante.apellido_paterno"),
+        "apellido_materno_acompanante": (lambda c: c.apellido_materno_acompanante, "acompanante.apellido_materno"),
+        "telefono_acompanante": (lambda c: c.telefono_acompanante, "acompanante.telefono"),
+        "datos_adicionales": (lambda c: c.datos_adicionales, "datos_adicionales"),
+        "fecha_registro": (lambda c: str(c.fecha_registro), "fecha_registro"),
+
+        # Estado normalizado (desde el catálogo en memoria de EstadoCita)
+        "estado": (lambda c: c.estado_nombre, "estado_id"),
+        "estado_info": (lambda c: c.estado_info._asdict() if c.estado_info else None, "estado_id"),
+        "color_estado": (lambda c: c.estado_info.color if c.estado_info else "blue", "estado_id"),
+
+        # Datos adicionales de relaciones
+        "doctor_nombre": (lambda c: c.doctor.nombres_completos if c.doctor else None,
+                          "doctor.persona.nombres", "doctor.persona.apellido_paterno", "doctor.persona.apellido_materno"),
+        "area_nombre": (lambda c: c.area_rel.nombre if c.area_rel else c.area, "area_rel.nombre"),
+        "horario_turno": (lambda c: c.horario.turno if c.horario else None, "horario.turno"),
+        "horario_turno_nombre": (lambda c: c.horario.turno_nombre if c.horario else None, "horario.turno"),
+    }
+
+    def to_dict(self, campos=None):
+        """Serializa la cita; `campos` limita las claves (None = todas)."""
+        return serializar(self, self.CAMPOS, campos)
+
+    @staticmethod
+    def desvincular_dependientes(cita_ids):
+        """
+        Antes de eliminar las citas `cita_ids`: borra su historial de estados
+        y deja sin cita sus entradas de la lista de espera (conservan su
+        estado). No depende de las FK hacia citas, que no existen cuando la
+        tabla está particionada (migrate_particiones.py).
+        """
+        from models.historial_estado_cita_model import HistorialEstadoCita
+        from models.lista_espera_model import ListaEspera
+
+        db.session.execute(
+            db.update(ListaEspera).where(ListaEspera.cita_id.in_(cita_ids)).values(cita_id=None),
+            execution_options={"synchronize_session": False}
+        )
+        db.session.execute(
+            db.delete(HistorialEstadoCita).where(HistorialEstadoCita.cita_id.in_(cita_ids)),
+            execution_options={"synchronize_session": False}
+        )
@@ -0,0 +1,47 @@
+from extensions.database import db
+from datetime import datetime
+from sqlalchemy import delete
+
+class ClaveIdempotencia(db.Model):
+    """
+    Respuesta guardada de una petición de escritura enviada con la cabecera
+    Idempotency-Key. Si el cliente reintenta con la misma clave se devuelve
+    esta respuesta sin volver a ejecutar el endpoint.
+
+    Mientras la petición original se procesa, status_code es NULL. Si el
+    proceso que la reclamó muere sin responder, la clave queda libre cuando
+    pasa el plazo de reclamo (reclamada_en + IDEMPOTENCY_LEASE_SEGUNDOS).
+    """
+    __tablename__ = "claves_idempotencia"
+
+    # sha256 de usuario + método + ruta + clave enviada por el cliente
+    id = db.Column(db.String(64), primary_key=True)
+    # sha256 del cuerpo de la petición, para detectar claves reutilizadas
+    huella = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.SmallInteger, nullable=True)
+    mimetype = db.Column(db.String(100), nullable=True)
+    cuerpo = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Última vez que una petición reclamó la clave para procesarla
+    reclamada_en = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expira_en = db.Column(db.DateTime, nullable=False, index=True)
+
+    @property
+    def en_proceso(self):
+        return self.status_code is None
+
+    def reclamo_vencido(self, plazo):
+        """En proceso pero reclamada hace más de `plazo` (timedelta): se considera abandonada."""
+        return self.en_proceso and self.reclamada_en + plazo <= datetime.utcnow()
+
+    @property
+    def expirada(self):
+        return self.expira_en <= datetime.utcnow()
+
+    @staticmethod
+    def purgar_expiradas():
+        """Elimina las claves vencidas. Retorna la cantidad eliminada."""
+        return db.session.execute(
+            delete(ClaveIdempotencia).where(ClaveIdempotencia.expira_en <= datetime.utcnow()),
+            execution_options={"synchronize_session": False}
+        ).rowcount
@@ -1,5 +1,55 @@
 from extensions.database import db
+import time
 from datetime import datetime
+from collections import namedtuple
+from threading import Lock
+from types import MappingProxyType
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+# Datos de un estado en el catálogo en memoria (mismo orden que EstadoCita.to_dict)
+EstadoInfo = namedtuple("EstadoInfo", ["id", "nombre", "descripcion", "color", "activo"])
+
+
+class CatalogoEstados:
+    """
+    Instantánea inmutable de la tabla estados_cita (nombre <-> id <-> color).
+    Permite filtrar citas por estado_id sin JOIN y serializar el estado sin
+    cargar la relación.
+    """
+
+    def __init__(self, estados):
+        self._por_id = MappingProxyType({e.id: e for e in estados})
+        self._por_nombre = MappingProxyType({e.nombre: e for e in estados})
+
+    def __iter__(self):
+        return iter(sorted(self._por_id.values()))
+
+    def get(self, estado_id):
+        """EstadoInfo por id, o None."""
+        return self._por_id.get(estado_id)
+
+    def por_nombre(self, nombre):
+        """EstadoInfo por nombre, o None."""
+        return self._por_nombre.get(nombre)
+
+    def id(self, nombre):
+        estado = self._por_nombre.get(nombre)
+        return estado.id if estado else None
+
+    def ids(self, *nombres):
+        """Ids de los estados `nombres` que existen (para Cita.estado_id.in_)."""
+        return [self._por_nombre[n].id for n in nombres if n in self._por_nombre]
+
+    def ids_excepto(self, *nombres):
+        """Ids de todos los estados salvo `nombres`."""
+        return [e.id for e in self._por_id.values() if e.nombre not in nombres]
+
+
+# (CatalogoEstados, instante monotónico en que vence) o None
+_catalogo = None
+_catalogo_lock = Lock()
+
 
 class EstadoCita(db.Model):
     __tablename__ = "estados_cita"
@@ -19,3 +69,58 @@ class EstadoCita(db.Model):
             "color": self.color,
             "activo": self.activo
         }
+
+    # Segundos que se reutiliza el catálogo: los cambios de otros workers o
+    # de migraciones con SQL directo se ven a lo sumo tras este tiempo
+    CATALOGO_SEGUNDOS = 60
+
+    @staticmethod
+    def catalogo():
+        """
+        Catálogo de estados compartido por todo el proceso.
+        Se carga con la primera consulta (o al iniciar la app), se vuelve a
+        cargar después de cualquier escritura sobre estados_cita de este
+        proceso y vence a los CATALOGO_SEGUNDOS. Un catálogo vacío (tabla
+        aún sin estados) no se guarda.
+        """
+        global _catalogo
+        entrada = _catalogo
+        if entrada is None or entrada[1] <= time.monotonic():
+            with _catalogo_lock:
+                entrada = _catalogo
+                if entrada is None or entrada[1] <= time.monotonic():
+                    filas = db.session.query(
+                        EstadoCita.id, EstadoCita.nombre, EstadoCita.descripcion,
+                        EstadoCita.color, EstadoCita.activo
+                    ).all()
+                    entrada = (
+                        CatalogoEstados([EstadoInfo(*fila) for fila in filas]),
+                        time.monotonic() + EstadoCita.CATALOGO_SEGUNDOS
+                    )
+                    _catalogo = entrada if filas else None
+        return entrada[0]
+
+    @staticmethod
+    def invalidar_catalogo():
+        """Descarta el catálogo; la próxima consulta lo vuelve a cargar."""
+        global _catalogo
+        _catalogo = None
+
+
+@event.listens_for(EstadoCita, "after_insert")
+@event.listens_for(EstadoCita, "after_update")
+@event.listens_for(EstadoCita, "after_delete")
+def _estado_modificado(mapper, connection, target):
+    EstadoCita.invalidar_catalogo()
+    # Marcar la sesión para invalidar de nuevo al confirmar o revertir,
+    # por si el catálogo se recargó con datos aún no confirmados
+    sesion = object_session(target)
+    if sesion is not None:
+        sesion.info["estados_cita_modificados"] = True
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_soft_rollback")
+def _fin_transaccion(session, *args):
+    if session.info.pop("estados_cita_modificados", False):
+        EstadoCita.invalidar_catalogo()
@@ -1,5 +1,6 @@
 from extensions.database import db
 from datetime import datetime
+from sqlalchemy import insert, literal, select
 
 class HistorialEstadoCita(db.Model):
     """
@@ -24,6 +25,11 @@ class HistorialEstadoCita(db.Model):
     comentario = db.Column(db.Text, nullable=True)
     ip_address = db.Column(db.String(45), nullable=True)
 
+    # Índice para consultar el historial de una cita ordenado por fecha
+    __table_args__ = (
+        db.Index('ix_historial_estado_citas_cita_fecha', 'cita_id', 'fecha_cambio'),
+    )
+
     # Relaciones
     cita = db.relationship('Cita', backref=db.backref('historial_estados', lazy='dynamic', order_by='HistorialEstadoCita.fecha_cambio.desc()'))
     usuario = db.relationship('Usuario', backref=db.backref('cambios_estado_citas', lazy=True))
@@ -61,3 +67,30 @@ class HistorialEstadoCita(db.Model):
         )
         db.session.add(historial)
         return historial
+
+    @staticmethod
+    def registrar_cambios(cita_ids, estado_nuevo_id, usuario_id=None, comentario=None, ip_address=None):
+        """
+        Registra el cambio de estado de varias citas con un solo INSERT ... SELECT.
+        El estado anterior se toma de la propia tabla citas, por lo que debe
+        llamarse antes de actualizar el estado de las citas.
+        """
+        from models.cita_model import Cita
+
+        origen = select(
+            Cita.id,
+            Cita.estado_id,
+            literal(estado_nuevo_id, db.Integer),
+            literal(usuario_id, db.Integer),
+            literal(datetime.utcnow(), db.DateTime),
+            literal(comentario, db.Text),
+            literal(ip_address, db.String(45))
+        ).where(Cita.id.in_(cita_ids))
+
+        db.session.execute(
+            insert(HistorialEstadoCita).from_select(
+                ["cita_id", "estado_anterior_id", "estado_nuevo_id", "usuario_id",
+                 "fecha_cambio", "comentario", "ip_address"],
+                origen
+            )
+        )
@@ -1,5 +1,18 @@
 from extensions.database import db
+from collections import namedtuple
 from datetime import time, date
+from sqlalchemy import bindparam, case, update, event, inspect
+from sqlalchemy.orm import object_session
+from utils.fields import serializar
+
+# Resultado de HorarioMedico.reservar_cupo: nuevo valor de ocupados y la hora
+# asignada a cada cupo reservado (None si el cupo no tiene hora)
+Reserva = namedtuple("Reserva", ["ocupados", "horas"])
+
+
+def _duracion_por_defecto(contexto):
+    return HorarioMedico.duracion_repartida(contexto.get_current_parameters().get("cupos"))
+
 
 class HorarioMedico(db.Model):
     __tablename__ = "horarios_medicos"
@@ -19,10 +32,27 @@ class HorarioMedico(db.Model):
     
     # Cupos para este turno específico
     cupos = db.Column(db.Integer, nullable=False, default=0)
+
+    # Citas no canceladas que ocupan este turno. Se reserva con un UPDATE
+    # condicional (ocupados < cupos) y se libera al cancelar o eliminar la cita
+    ocupados = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Minutos de cada cupo: el cupo i empieza en hora_inicio + i * duracion_cupo.
+    # Por defecto el turno se reparte entre los cupos
+    duracion_cupo = db.Column(db.Integer, nullable=False, default=_duracion_por_defecto)
+
+    # Mapa de bits de los cupos con hora asignada (bit i = cupo i ocupado),
+    # para encontrar el siguiente libre sin consultar las citas
+    slots_ocupados = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+
+    # Regla recurrente que generó este horario (NULL = creado directamente)
+    regla_id = db.Column(db.Integer, db.ForeignKey('reglas_horario.id', ondelete='SET NULL'), nullable=True)
     
     # Constraint único: un médico solo puede tener un horario por fecha y turno
+    # Índice por área y fecha: búsqueda de disponibilidad e indicadores por área
     __table_args__ = (
         db.UniqueConstraint('medico_id', 'fecha', 'turno', name='unique_medico_fecha_turno'),
+        db.Index('ix_horarios_medicos_area_fecha', 'area_id', 'fecha'),
     )
 
     medico = db.relationship('Usuario', backref=db.backref('horarios', lazy=True))
@@ -33,6 +63,10 @@ class HorarioMedico(db.Model):
     HORARIO_MANANA_FIN = time(13, 30)
     HORARIO_TARDE_INICIO = time(13, 30)
     HORARIO_TARDE_FIN = time(19, 30)
+    MINUTOS_TURNO = 360
+
+    # Cupos con hora por turno: los bits de slots_ocupados (BIGINT con signo)
+    MAX_SLOTS = 63
 
     @property
     def hora_inicio(self):
@@ -44,23 +78,280 @@ class HorarioMedico(db.Model):
         """Retorna la hora de fin según el turno"""
         return self.HORARIO_MANANA_FIN if self.turno == 'M' else self.HORARIO_TARDE_FIN
 
+    @staticmethod
+    def duracion_repartida(cupos):
+        """Minutos por cupo al repartir el turno entre `cupos`."""
+        if not cupos or cupos <= 0:
+            return HorarioMedico.MINUTOS_TURNO
+        return max(HorarioMedico.MINUTOS_TURNO // cupos, 1)
+
+    @staticmethod
+    def validar_cupos(cupos, duracion_cupo=None):
+        """
+        Comprueba que todos los cupos tengan hora dentro del turno: entre 0 y
+        MAX_SLOTS cupos y cupos * duracion_cupo <= MINUTOS_TURNO (sin
+        duración, la repartida). Lanza ValueError con el mensaje para el
+        cliente; retorna la duración.
+        """
+        if isinstance(cupos, bool) or not isinstance(cupos, int) or cupos < 0:
+            raise ValueError("Cupos debe ser un número entero positivo")
+        if cupos > HorarioMedico.MAX_SLOTS:
+            raise ValueError(f"Un turno admite a lo sumo {HorarioMedico.MAX_SLOTS} cupos")
+        if duracion_cupo is None:
+            return HorarioMedico.duracion_repartida(cupos)
+        if isinstance(duracion_cupo, bool) or not isinstance(duracion_cupo, int) or duracion_cupo <= 0:
+            raise ValueError("duracion_cupo debe ser un número entero positivo de minutos")
+        if cupos * duracion_cupo > HorarioMedico.MINUTOS_TURNO:
+            raise ValueError(
+                f"{cupos} cupos de {duracion_cupo} minutos no caben en el turno de "
+                f"{HorarioMedico.MINUTOS_TURNO} minutos"
+            )
+        return duracion_cupo
+
+    @staticmethod
+    def hora_slot(turno, duracion_cupo, slot):
+        """Hora de inicio del cupo `slot` de un turno (validar_cupos asegura que cae dentro del turno)."""
+        inicio = HorarioMedico.HORARIO_MANANA_INICIO if turno == 'M' else HorarioMedico.HORARIO_TARDE_INICIO
+        minutos = inicio.hour * 60 + inicio.minute + slot * duracion_cupo
+        return time(minutos // 60, minutos % 60)
+
+    @staticmethod
+    def slot_de_hora(turno, duracion_cupo, hora):
+        """Cupo que empieza a `hora` (None si no corresponde a ningún cupo del turno)."""
+        inicio = HorarioMedico.HORARIO_MANANA_INICIO if turno == 'M' else HorarioMedico.HORARIO_TARDE_INICIO
+        minutos = (hora.hour * 60 + hora.minute) - (inicio.hour * 60 + inicio.minute)
+        if minutos < 0 or minutos % duracion_cupo:
+            return None
+        slot = minutos // duracion_cupo
+        return slot if slot < HorarioMedico.MAX_SLOTS else None
+
+    @staticmethod
+    def siguientes_slots(mascara, limite, cantidad):
+        """
+        Los `cantidad` cupos libres más bajos por debajo de `limite` y la
+        máscara con ellos ocupados. Cada uno se obtiene en tiempo constante:
+        ~m & (m + 1) es el bit del primer cero de m.
+        """
+        slots = []
+        for _ in range(cantidad):
+            libre = ~mascara & (mascara + 1)
+            slot = libre.bit_length() - 1
+            if slot >= limite:
+                break
+            slots.append(slot)
+            mascara |= libre
+        return slots, mascara
+
     @property
     def turno_nombre(self):
         """Retorna el nombre del turno"""
         return "Mañana" if self.turno == 'M' else "Tarde"
 
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "medico_id": self.medico_id,
-            "area_id": self.area_id,
-            "fecha": str(self.fecha) if self.fecha else None,
-            "dia_semana": self.dia_semana,
-            "turno": self.turno,
-            "turno_nombre": self.turno_nombre,
-            "hora_inicio": str(self.hora_inicio),
-            "hora_fin": str(self.hora_fin),
-            "cupos": self.cupos,
-            "medico_nombre": self.medico.nombres_completos if self.medico and self.medico.nombres_completos else (self.medico.username if self.medico else None),
-            "area_nombre": self.area.nombre if self.area else None
+    @property
+    def medico_nombre(self):
+        if not self.medico:
+            return None
+        return self.medico.nombres_completos or self.medico.username
+
+    # Campo de to_dict -> (serializador, atributos que necesita cargar)
+    CAMPOS = {
+        "id": (lambda h: h.id, "id"),
+        "medico_id": (lambda h: h.medico_id, "medico_id"),
+        "area_id": (lambda h: h.area_id, "area_id"),
+        "fecha": (lambda h: str(h.fecha) if h.fecha else None, "fecha"),
+        "dia_semana": (lambda h: h.dia_semana, "dia_semana"),
+        "turno": (lambda h: h.turno, "turno"),
+        "turno_nombre": (lambda h: h.turno_nombre, "turno"),
+        "hora_inicio": (lambda h: str(h.hora_inicio), "turno"),
+        "hora_fin": (lambda h: str(h.hora_fin), "turno"),
+        "cupos": (lambda h: h.cupos, "cupos"),
+        "duracion_cupo": (lambda h: h.duracion_cupo, "duracion_cupo"),
+        "regla_id": (lambda h: h.regla_id, "regla_id"),
+        "medico_nombre": (lambda h: h.medico_nombre,
+                          "medico.persona.nombres", "medico.persona.apellido_paterno",
+                          "medico.persona.apellido_materno", "medico.persona.dni"),
+        "area_nombre": (lambda h: h.area.nombre if h.area else None, "area.nombre"),
+    }
+
+    @staticmethod
+    def marcar_modificados(horario_ids, sesion=None):
+        """
+        Anota en la sesión los horarios cuyos cupos u ocupados cambiaron, para
+        publicar su disponibilidad al confirmar la transacción
+        (ver services/disponibilidad_service.py).
+        """
+        sesion = sesion if sesion is not None else db.session
+        sesion.info.setdefault("horarios_modificados", set()).update(horario_ids)
+
+    @staticmethod
+    def marcar_eliminados(horarios, sesion=None):
+        """
+        Anota horarios eliminados como tuplas (id, area_id, fecha) o
+        (id, area_id, fecha, medico_id); con el médico solo se descarta su
+        resumen mensual en lugar del de todos los médicos de ese mes.
+        """
+        sesion = sesion if sesion is not None else db.session
+        sesion.info.setdefault("horarios_eliminados", set()).update(horarios)
+
+    @staticmethod
+    def reservar_cupo(horario_id, cantidad=1):
+        """
+        Ocupa `cantidad` cupos del horario si hay disponibles y les asigna
+        los primeros cupos libres del mapa de bits. El horario se lee con
+        SELECT ... FOR UPDATE, así que dos reservas simultáneas no reciben la
+        misma hora, y el UPDATE conserva la condición ocupados + cantidad <=
+        cupos: aunque el bloqueo no exista (SQLite), los cupos no se
+        sobrepasan y None significa que de verdad no quedaban.
+
+        Retorna una Reserva (ocupados, horas), o None si no había cupos suficientes.
+        """
+        HorarioMedico.marcar_modificados([horario_id])
+        fila = db.session.query(
+            HorarioMedico.cupos, HorarioMedico.ocupados, HorarioMedico.slots_ocupados,
+            HorarioMedico.turno, HorarioMedico.duracion_cupo
+        ).filter(HorarioMedico.id == horario_id).with_for_update().one_or_none()
+        if fila is None or fila.ocupados + cantidad > fila.cupos:
+            return None
+
+        slots, mascara = HorarioMedico.siguientes_slots(
+            fila.slots_ocupados, min(fila.cupos, HorarioMedico.MAX_SLOTS), cantidad
+        )
+        sentencia = update(HorarioMedico).where(
+            HorarioMedico.id == horario_id,
+            HorarioMedico.ocupados + cantidad <= HorarioMedico.cupos
+        ).values(
+            ocupados=HorarioMedico.ocupados + cantidad,
+            slots_ocupados=HorarioMedico.slots_ocupados.op('|')(mascara ^ fila.slots_ocupados)
+        )
+        opciones = {"synchronize_session": False}
+        if db.engine.dialect.update_returning:
+            ocupados = db.session.execute(
+                sentencia.returning(HorarioMedico.ocupados), execution_options=opciones
+            ).scalar()
+        elif db.session.execute(sentencia, execution_options=opciones).rowcount == 1:
+            ocupados = db.session.query(HorarioMedico.ocupados).filter(HorarioMedico.id == horario_id).scalar()
+        else:
+            ocupados = None
+        if ocupados is None:
+            return None
+        horas = [HorarioMedico.hora_slot(fila.turno, fila.duracion_cupo, slot) for slot in slots]
+        return Reserva(ocupados, horas + [None] * (cantidad - len(horas)))
+
+    @staticmethod
+    def liberar_cupo(horario_id, cantidad=1, horas=()):
+        """
+        Libera `cantidad` cupos del horario (sin bajar de cero) y, en el mapa
+        de bits, los de las `horas` que tenían asignadas las citas.
+        """
+        HorarioMedico.marcar_modificados([horario_id])
+        valores = {
+            "ocupados": case(
+                (HorarioMedico.ocupados > cantidad, HorarioMedico.ocupados - cantidad),
+                else_=0
+            )
         }
+
+        horas = [hora for hora in horas if hora is not None]
+        if horas:
+            turno, duracion = db.session.query(HorarioMedico.turno, HorarioMedico.duracion_cupo)\
+                .filter(HorarioMedico.id == horario_id).one()
+            mascara = 0
+            for hora in horas:
+                slot = HorarioMedico.slot_de_hora(turno, duracion, hora)
+                if slot is not None:
+                    mascara |= 1 << slot
+            if mascara:
+                valores["slots_ocupados"] = HorarioMedico.slots_ocupados - HorarioMedico.slots_ocupados.op('&')(mascara)
+
+        db.session.execute(
+            update(HorarioMedico).where(HorarioMedico.id == horario_id).values(**valores),
+            execution_options={"synchronize_session": False}
+        )
+
+    @staticmethod
+    def recalcular_ocupados(horario_ids=None):
+        """
+        Recalcula el contador ocupados a partir de las citas no canceladas.
+        Se usa al migrar y para corregir contadores; sin `horario_ids`
+        recalcula todos los horarios.
+        """
+        from models.cita_model import Cita
+        from models.estado_cita_model import EstadoCita
+
+        canceladas = EstadoCita.catalogo().ids('cancelada')
+        activas = db.session.query(db.func.count(Cita.id)).filter(
+            Cita.horario_id == HorarioMedico.id,
+            db.or_(Cita.estado_id.is_(None), Cita.estado_id.not_in(canceladas))
+        ).correlate(HorarioMedico).scalar_subquery()
+
+        sentencia = update(HorarioMedico).values(ocupados=activas)
+        if horario_ids is not None:
+            sentencia = sentencia.where(HorarioMedico.id.in_(horario_ids))
+            HorarioMedico.marcar_modificados(horario_ids)
+        db.session.execute(sentencia, execution_options={"synchronize_session": False})
+
+    @staticmethod
+    def recalcular_slots(horario_ids=None):
+        """
+        Recalcula el mapa de bits slots_ocupados a partir de la hora de las
+        citas no canceladas. Se usa al migrar; sin `horario_ids` recalcula
+        todos los horarios.
+        """
+        from models.cita_model import Cita
+        from models.estado_cita_model import EstadoCita
+
+        horarios = db.session.query(HorarioMedico.id, HorarioMedico.turno, HorarioMedico.duracion_cupo)
+        citas = db.session.query(Cita.horario_id, Cita.hora).filter(
+            Cita.hora.isnot(None),
+            db.or_(Cita.estado_id.is_(None), Cita.estado_id.not_in(EstadoCita.catalogo().ids('cancelada')))
+        )
+        if horario_ids is not None:
+            horarios = horarios.filter(HorarioMedico.id.in_(horario_ids))
+            citas = citas.filter(Cita.horario_id.in_(horario_ids))
+
+        datos = {horario_id: (turno, duracion) for horario_id, turno, duracion in horarios}
+        mascaras = dict.fromkeys(datos, 0)
+        for horario_id, hora in citas:
+            if horario_id not in datos:
+                continue
+            slot = HorarioMedico.slot_de_hora(*datos[horario_id], hora)
+            if slot is not None:
+                mascaras[horario_id] |= 1 << slot
+
+        if mascaras:
+            tabla = HorarioMedico.__table__
+            db.session.execute(
+                update(tabla).where(tabla.c.id == bindparam("b_id")).values(slots_ocupados=bindparam("b_mascara")),
+                [{"b_id": horario_id, "b_mascara": mascara} for horario_id, mascara in mascaras.items()]
+            )
+            HorarioMedico.marcar_modificados(mascaras)
+
+    def to_dict(self, campos=None):
+        """Serializa el horario; `campos` limita las claves (None = todas)."""
+        return serializar(self, self.CAMPOS, campos)
+
+
+@event.listens_for(HorarioMedico, "after_insert")
+@event.listens_for(HorarioMedico, "after_update")
+def _horario_guardado(mapper, connection, target):
+    sesion = object_session(target)
+    if sesion is None:
+        return
+    HorarioMedico.marcar_modificados([target.id], sesion)
+    # Si cambió de área, fecha o médico, desaparece de la disponibilidad (y del resumen) anterior
+    estado = inspect(target)
+    area, fecha, medico = estado.attrs.area_id.history, estado.attrs.fecha.history, estado.attrs.medico_id.history
+    if area.deleted or fecha.deleted or medico.deleted:
+        HorarioMedico.marcar_eliminados([(
+            target.id,
+            (area.deleted or [target.area_id])[0],
+            (fecha.deleted or [target.fecha])[0],
+            (medico.deleted or [target.medico_id])[0]
+        )], sesion)
+
+
+@event.listens_for(HorarioMedico, "after_delete")
+def _horario_eliminado(mapper, connection, target):
+    sesion = object_session(target)
+    if sesion is not None:
+        HorarioMedico.marcar_eliminados([(target.id, target.area_id, target.fecha, target.medico_id)], sesion)
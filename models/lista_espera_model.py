@@ -0,0 +1,146 @@
+from extensions.database import db
+from datetime import datetime
+
+class ListaEspera(db.Model):
+    """
+    Pacientes en espera de un cupo, para un horario concreto o para
+    cualquier horario de un área en una fecha (horario_id NULL).
+
+    Cuando se libera un cupo (cita cancelada o eliminada) se asigna al
+    primero de la fila con ListaEspera.promover, en la misma transacción.
+    """
+    __tablename__ = "lista_espera"
+
+    ESPERANDO = "esperando"
+    PROMOVIDA = "promovida"
+    RETIRADA = "retirada"
+
+    id = db.Column(db.Integer, primary_key=True)
+    paciente_id = db.Column(db.Integer, db.ForeignKey('pacientes.id'), nullable=False)
+    horario_id = db.Column(db.Integer, db.ForeignKey('horarios_medicos.id'), nullable=True)
+    area_id = db.Column(db.Integer, db.ForeignKey('areas.id'), nullable=False)
+    fecha = db.Column(db.Date, nullable=False)
+    sintomas = db.Column(db.Text, nullable=False)
+    estado = db.Column(db.String(20), nullable=False, default=ESPERANDO)
+
+    # Cita creada al promover la entrada
+    cita_id = db.Column(db.Integer, db.ForeignKey('citas.id', ondelete='SET NULL'), nullable=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=True)
+    fecha_registro = db.Column(db.DateTime, default=datetime.utcnow)
+    fecha_promocion = db.Column(db.DateTime, nullable=True)
+
+    # La cabeza de la fila de un área/fecha se obtiene recorriendo este índice
+    __table_args__ = (
+        db.Index('ix_lista_espera_area_fecha_estado', 'area_id', 'fecha', 'estado', 'fecha_registro'),
+    )
+
+    paciente = db.relationship('Paciente', backref=db.backref('lista_espera', lazy=True))
+    horario = db.relationship('HorarioMedico')
+    area = db.relationship('Area')
+    cita = db.relationship('Cita')
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "paciente_id": self.paciente_id,
+            "paciente_nombre": f"{self.paciente.nombres} {self.paciente.apellido_paterno} {self.paciente.apellido_materno}" if self.paciente else None,
+            "paciente_dni": self.paciente.dni if self.paciente else None,
+            "horario_id": self.horario_id,
+            "area_id": self.area_id,
+            "area_nombre": self.area.nombre if self.area else None,
+            "fecha": str(self.fecha) if self.fecha else None,
+            "sintomas": self.sintomas,
+            "estado": self.estado,
+            "cita_id": self.cita_id,
+            "fecha_registro": self.fecha_registro.isoformat() if self.fecha_registro else None,
+            "fecha_promocion": self.fecha_promocion.isoformat() if self.fecha_promocion else None
+        }
+
+    @staticmethod
+    def filtro_horario(horario):
+        """Condición de las entradas que pueden ocupar un cupo de `horario`."""
+        return db.and_(
+            ListaEspera.area_id == horario.area_id,
+            ListaEspera.fecha == horario.fecha,
+            ListaEspera.estado == ListaEspera.ESPERANDO,
+            db.or_(ListaEspera.horario_id == horario.id, ListaEspera.horario_id.is_(None))
+        )
+
+    @staticmethod
+    def siguiente(horario):
+        """
+        Primera entrada en espera para `horario`, bloqueada para la
+        transacción actual. Se omiten los pacientes que ya tienen una cita
+        activa en ese horario.
+        """
+        from models.cita_model import Cita
+        from models.estado_cita_model import EstadoCita
+
+        canceladas = EstadoCita.catalogo().ids('cancelada')
+        cita_activa = db.session.query(Cita.id).filter(
+            Cita.horario_id == horario.id,
+            Cita.paciente_id == ListaEspera.paciente_id,
+            db.or_(Cita.estado_id.is_(None), Cita.estado_id.not_in(canceladas))
+        ).exists()
+
+        return ListaEspera.query.filter(ListaEspera.filtro_horario(horario), ~cita_activa)\
+            .order_by(ListaEspera.fecha_registro.asc(), ListaEspera.id.asc())\
+            .with_for_update(skip_locked=True)\
+            .first()
+
+    @staticmethod
+    def promover(horario_id, cantidad=1, usuario_id=None, ip_address=None):
+        """
+        Asigna hasta `cantidad` cupos libres de un horario a los primeros
+        pacientes en espera: reserva el cupo, crea la cita pendiente, marca
+        la entrada como promovida y registra el cambio en el historial.
+        No confirma la transacción.
+
+        Retorna la lista de citas creadas.
+        """
+        from models.cita_model import Cita
+        from models.estado_cita_model import EstadoCita
+        from models.horario_medico_model import HorarioMedico
+        from models.historial_estado_cita_model import HistorialEstadoCita
+
+        horario = HorarioMedico.query.get(horario_id)
+        if not horario:
+            return []
+
+        estado_pendiente = EstadoCita.catalogo().por_nombre("pendiente")
+        citas = []
+        for _ in range(cantidad):
+            entrada = ListaEspera.siguiente(horario)
+            reserva = HorarioMedico.reservar_cupo(horario.id) if entrada is not None else None
+            if reserva is None:
+                break
+
+            cita = Cita(
+                paciente_id=entrada.paciente_id,
+                horario_id=horario.id,
+                doctor_id=horario.medico_id,
+                area_id=horario.area_id,
+                fecha=horario.fecha,
+                hora=reserva.horas[0],
+                sintomas=entrada.sintomas,
+                estado_id=estado_pendiente.id if estado_pendiente else None
+            )
+            db.session.add(cita)
+            db.session.flush()
+
+            entrada.estado = ListaEspera.PROMOVIDA
+            entrada.horario_id = horario.id
+            entrada.cita_id = cita.id
+            entrada.fecha_promocion = datetime.utcnow()
+
+            if estado_pendiente:
+                HistorialEstadoCita.registrar_cambio(
+                    cita_id=cita.id,
+                    estado_anterior_id=None,
+                    estado_nuevo_id=estado_pendiente.id,
+                    usuario_id=usuario_id,
+                    comentario=f"Cupo asignado desde la lista de espera (#{entrada.id})",
+                    ip_address=ip_address
+                )
+            citas.append(cita)
+        return citas
@@ -1,6 +1,7 @@
 from extensions.database import db
 from datetime import datetime
 from models.persona_model import Persona
+from utils.fields import serializar
 
 class Paciente(db.Model):
     __tablename__ = "pacientes"
@@ -102,36 +103,41 @@ class Paciente(db.Model):
 
     fecha_registro = db.Column(db.DateTime, default=datetime.utcnow)
 
-    def to_dict(self):
-        # Calcular edad
-        today = datetime.now().date()
-        age = 0
+    @property
+    def edad(self):
         f_nac = self.fecha_nacimiento
-        if f_nac:
-            age = today.year - f_nac.year - ((today.month, today.day) < (f_nac.month, f_nac.day))
-
-        return {
-            "id": self.id,
-            "persona_id": self.persona_id,
-            "dni": self.dni,
-            "nombres": self.nombres,
-            "apellido_paterno": self.apellido_paterno,
-            "apellidoPaterno": self.apellido_paterno,
-            "apellido_materno": self.apellido_materno,
-            "apellidoMaterno": self.apellido_materno,
-            "fecha_nacimiento": str(f_nac) if f_nac else None,
-            "fechaNacimiento": str(f_nac) if f_nac else None,
-            "edad": age,
-            "sexo": self.sexo,
-            "estado_civil": self.estado_civil,
-            "grado_instruccion": self.grado_instruccion,
-            "religion": self.religion,
-            "procedencia": self.procedencia,
-            "ocupacion": self.ocupacion,
-            "telefono": self.telefono,
-            "email": self.email,
-            "direccion": self.direccion,
-            "seguro": self.seguro,
-            "numero_seguro": self.numero_seguro,
-            "fecha_registro": str(self.fecha_registro)
-        }
+        if not f_nac:
+            return 0
+        today = datetime.now().date()
+        return today.year - f_nac.year - ((today.month, today.day) < (f_nac.month, f_nac.day))
+
+    # Campo de to_dict -> (serializador, atributos que necesita cargar)
+    CAMPOS = {
+        "id": (lambda p: p.id, "id"),
+        "persona_id": (lambda p: p.persona_id, "persona_id"),
+        "dni": (lambda p: p.dni, "persona.dni"),
+        "nombres": (lambda p: p.nombres, "persona.nombres"),
+        "apellido_paterno": (lambda p: p.apellido_paterno, "persona.apellido_paterno"),
+        "apellidoPaterno": (lambda p: p.apellido_paterno, "persona.apellido_paterno"),
+        "apellido_materno": (lambda p: p.apellido_materno, "persona.apellido_materno"),
+        "apellidoMaterno": (lambda p: p.apellido_materno, "persona.apellido_materno"),
+        "fecha_nacimiento": (lambda p: str(p.fecha_nacimiento) if p.fecha_nacimiento else None, "persona.fecha_nacimiento"),
+        "fechaNacimiento": (lambda p: str(p.fecha_nacimiento) if p.fecha_nacimiento else None, "persona.fecha_nacimiento"),
+        "edad": (lambda p: p.edad, "persona.fecha_nacimiento"),
+        "sexo": (lambda p: p.sexo, "persona.sexo"),
+        "estado_civil": (lambda p: p.estado_civil, "estado_civil"),
+        "grado_instruccion": (lambda p: p.grado_instruccion, "grado_instruccion"),
+        "religion": (lambda p: p.religion, "religion"),
+        "procedencia": (lambda p: p.procedencia, "procedencia"),
+        "ocupacion": (lambda p: p.ocupacion, "ocupacion"),
+        "telefono": (lambda p: p.telefono, "persona.telefono"),
+        "email": (lambda p: p.email, "persona.email"),
+        "direccion": (lambda p: p.direccion, "persona.direccion"),
+        "seguro": (lambda p: p.seguro, "seguro"),
+        "numero_seguro": (lambda p: p.numero_seguro, "numero_seguro"),
+        "fecha_registro": (lambda p: str(p.fecha_registro), "fecha_registro"),
+    }
+
+    def to_dict(self, campos=None):
+        """Serializa el paciente; `campos` limita las claves (None = todas)."""
+        return serializar(self, self.CAMPOS, campos)
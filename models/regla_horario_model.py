@@ -0,0 +1,103 @@
+from extensions.database import db
+from datetime import datetime
+
+
+class ReglaHorario(db.Model):
+    """
+    Horario recurrente de un médico: un turno con sus cupos y área en los
+    días de la semana indicados, desde fecha_inicio hasta fecha_fin (o sin
+    fin).
+
+    Las filas de horarios_medicos se crean a partir de las reglas recién
+    cuando se consulta una fecha (ver services/regla_horario_service.py),
+    en lugar de enviar y guardar cada día del mes por adelantado.
+    """
+    __tablename__ = "reglas_horario"
+
+    id = db.Column(db.Integer, primary_key=True)
+    medico_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+    area_id = db.Column(db.Integer, db.ForeignKey('areas.id'), nullable=False)
+
+    # Bit d encendido = atiende el día d (0=Lunes, ..., 6=Domingo)
+    dias_semana = db.Column(db.Integer, nullable=False)
+    turno = db.Column(db.String(1), nullable=False)
+    cupos = db.Column(db.Integer, nullable=False)
+
+    fecha_inicio = db.Column(db.Date, nullable=False)
+    fecha_fin = db.Column(db.Date, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_reglas_horario_medico', 'medico_id', 'turno'),
+    )
+
+    medico = db.relationship('Usuario')
+    area = db.relationship('Area')
+
+    @staticmethod
+    def mascara(dias):
+        """Lista de días de la semana (0-6) -> máscara de bits."""
+        return sum(1 << d for d in set(dias))
+
+    @property
+    def dias(self):
+        return [d for d in range(7) if self.dias_semana & (1 << d)]
+
+    def aplica(self, fecha):
+        """Indica si la regla genera un horario en `fecha`."""
+        return (
+            self.dias_semana & (1 << fecha.weekday()) != 0
+            and self.fecha_inicio <= fecha
+            and (self.fecha_fin is None or fecha <= self.fecha_fin)
+        )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "medico_id": self.medico_id,
+            "area_id": self.area_id,
+            "area_nombre": self.area.nombre if self.area else None,
+            "dias_semana": self.dias,
+            "turno": self.turno,
+            "cupos": self.cupos,
+            "fecha_inicio": str(self.fecha_inicio),
+            "fecha_fin": str(self.fecha_fin) if self.fecha_fin else None
+        }
+
+
+class ExcepcionHorario(db.Model):
+    """
+    Cambio de las reglas de un médico para una fecha (y turno, o ambos si
+    turno es NULL): sin atención ese día, u otros cupos y/o área.
+    """
+    __tablename__ = "excepciones_horario"
+
+    id = db.Column(db.Integer, primary_key=True)
+    medico_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+    fecha = db.Column(db.Date, nullable=False)
+    turno = db.Column(db.String(1), nullable=True)
+
+    sin_atencion = db.Column(db.Boolean, nullable=False, default=False)
+    # Valores que reemplazan a los de la regla (NULL = los de la regla)
+    cupos = db.Column(db.Integer, nullable=True)
+    area_id = db.Column(db.Integer, db.ForeignKey('areas.id'), nullable=True)
+    motivo = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('medico_id', 'fecha', 'turno', name='unique_excepcion_medico_fecha_turno'),
+    )
+
+    area = db.relationship('Area')
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "medico_id": self.medico_id,
+            "fecha": str(self.fecha),
+            "turno": self.turno,
+            "sin_atencion": self.sin_atencion,
+            "cupos": self.cupos,
+            "area_id": self.area_id,
+            "motivo": self.motivo
+        }
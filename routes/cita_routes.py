@@ -1,18 +1,87 @@
 from flask import Blueprint
 from controllers.cita_controller import CitaController
+from controllers.lista_espera_controller import ListaEsperaController
 from middleware.auth_middleware import token_required
+from middleware.idempotency_middleware import idempotente
 
 cita_bp = Blueprint("cita_bp", __name__)
 
 @cita_bp.post("/")
+@idempotente
 def crear_cita():
     return CitaController.crear()
 
+@cita_bp.post("/batch")
+@token_required
+@idempotente
+def crear_citas_lote():
+    """
+    Crear varias citas en una sola transacción (jornadas y campañas).
+    
+    Body: {"citas": [{"paciente_id", "horario_id", "fecha", "sintomas", ...}, ...]}
+    Retorna el resultado de cada cita en el orden recibido.
+    """
+    return CitaController.crear_lote()
+
 @cita_bp.get("/")
 @token_required
 def listar_citas():
     return CitaController.listar()
 
+@cita_bp.get("/export")
+@token_required
+def exportar_citas():
+    """
+    Exportar citas en streaming (NDJSON o CSV).
+    Acepta los mismos filtros que el listado.
+    
+    Query params:
+    - format: ndjson (default) o csv
+    - fecha_inicio / fecha_fin: Rango de fechas de cita (YYYY-MM-DD)
+    """
+    return CitaController.exportar()
+
+@cita_bp.patch("/estado")
+@token_required
+@idempotente
+def cambiar_estado_citas():
+    """
+    Cambiar el estado de varias citas en una sola transacción.
+    
+    Body: {"estado": "confirmada", "ids": [1, 2, 3], "comentario_cambio": "..."}
+    Sin "ids", se aplican los filtros del listado enviados como query params.
+    """
+    return CitaController.cambiar_estado_masivo()
+
+@cita_bp.post("/espera")
+@token_required
+@idempotente
+def agregar_lista_espera():
+    """
+    Agregar un paciente a la lista de espera de un horario (horario_id)
+    o de un área en una fecha (area_id + fecha).
+    Al cancelarse o eliminarse una cita, el cupo pasa al primero de la fila.
+    """
+    return ListaEsperaController.agregar()
+
+@cita_bp.get("/espera")
+@token_required
+def listar_lista_espera():
+    """
+    Lista de espera en orden de llegada.
+    
+    Query params:
+    - horario_id, o area_id y fecha (YYYY-MM-DD)
+    - estado: esperando (default), promovida, retirada
+    """
+    return ListaEsperaController.listar()
+
+@cita_bp.delete("/espera/<int:id>")
+@token_required
+@idempotente
+def retirar_lista_espera(id):
+    return ListaEsperaController.retirar(id)
+
 @cita_bp.get("/<int:id>")
 @token_required
 def obtener_cita(id):
@@ -20,11 +89,13 @@ def obtener_cita(id):
 
 @cita_bp.put("/<int:id>")
 @token_required
+@idempotente
 def actualizar_cita(id):
     return CitaController.actualizar(id)
 
 @cita_bp.delete("/<int:id>")
 @token_required
+@idempotente
 def eliminar_cita(id):
     return CitaController.eliminar(id)
 
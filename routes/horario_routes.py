@@ -1,5 +1,6 @@
 from flask import Blueprint
 from controllers.horario_controller import HorarioController
+from controllers.regla_horario_controller import ReglaHorarioController
 from middleware.auth_middleware import token_required
 
 horario_bp = Blueprint('horario_bp', __name__)
@@ -7,6 +8,9 @@ horario_bp = Blueprint('horario_bp', __name__)
 # Crear horarios mensuales (nuevo endpoint principal)
 horario_bp.route('/mensual', methods=['POST'])(token_required(HorarioController.create_horarios_mensuales))
 
+# Clonar los horarios de un mes a otro (con simulación)
+horario_bp.route('/clonar', methods=['POST'])(token_required(HorarioController.clonar_horarios_mes))
+
 # Obtener resumen de horarios por mes (para calendario)
 horario_bp.route('/resumen', methods=['GET'])(token_required(HorarioController.get_horarios_resumen_mes))
 
@@ -19,6 +23,26 @@ horario_bp.route('/', methods=['POST'])(token_required(HorarioController.create_
 # Obtener lista de horarios (con filtros opcionales: area_id, medico_id, mes, fecha, turno)
 horario_bp.route('/', methods=['GET'])(token_required(HorarioController.get_horarios))
 
+# Matriz de cupos libres de un área en un mes (día x turno x médico)
+horario_bp.route('/disponibilidad', methods=['GET'])(token_required(HorarioController.get_disponibilidad_mes))
+
+# Primer horario con cupos libres de un área desde una fecha (entre todos los médicos)
+horario_bp.route('/proximo-disponible', methods=['GET'])(token_required(HorarioController.get_proximo_disponible))
+
+# Disponibilidad de cupos en vivo (Server-Sent Events) para un área y fecha
+horario_bp.route('/stream', methods=['GET'])(token_required(HorarioController.stream_disponibilidad))
+
+# Reglas de horario recurrentes (los horarios de cada fecha se crean al consultarla)
+horario_bp.route('/reglas', methods=['POST'])(token_required(ReglaHorarioController.crear))
+horario_bp.route('/reglas', methods=['GET'])(token_required(ReglaHorarioController.listar))
+horario_bp.route('/reglas/<int:id>', methods=['PUT'])(token_required(ReglaHorarioController.actualizar))
+horario_bp.route('/reglas/<int:id>', methods=['DELETE'])(token_required(ReglaHorarioController.eliminar))
+
+# Excepciones de las reglas para una fecha (sin atención u otros cupos/área)
+horario_bp.route('/reglas/excepciones', methods=['POST'])(token_required(ReglaHorarioController.crear_excepcion))
+horario_bp.route('/reglas/excepciones', methods=['GET'])(token_required(ReglaHorarioController.listar_excepciones))
+horario_bp.route('/reglas/excepciones/<int:id>', methods=['DELETE'])(token_required(ReglaHorarioController.eliminar_excepcion))
+
 # Eliminar horario individual por ID
 horario_bp.route('/<int:id>', methods=['DELETE'])(token_required(HorarioController.delete_horario))
 
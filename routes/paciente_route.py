@@ -1,9 +1,11 @@
 from flask import Blueprint, request
 from controllers.paciente_controller import PacienteController
+from middleware.idempotency_middleware import idempotente
 
 paciente_bp = Blueprint("paciente_bp", __name__)
 
 @paciente_bp.post("/")
+@idempotente
 def registrar_paciente():
     data = request.get_json()
     return PacienteController.registrar(data)
@@ -22,6 +24,7 @@ def obtener_paciente(paciente_id):
     return PacienteController.obtener_por_id(paciente_id)
 
 @paciente_bp.put("/<int:paciente_id>")
+@idempotente
 def actualizar_paciente(paciente_id):
     """Actualiza los datos de un paciente existente."""
     data = request.get_json()
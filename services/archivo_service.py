@@ -0,0 +1,90 @@
+"""
+Archivo de citas antiguas.
+
+Las citas con fecha anterior al horizonte (ARCHIVO_CITAS_MESES) y su
+historial de estados se mueven a citas_archivo e
+historial_estado_citas_archivo por lotes: cada lote es una transacción con
+un INSERT ... SELECT y un DELETE por tabla, de modo que las tablas de uso
+diario solo guardan los meses recientes.
+
+Las lecturas del historial (PacienteController.obtener_historial_citas y
+CitaController.obtener_historial) continúan en las tablas de archivo
+cuando lo pedido ya no está en las tablas principales. Los indicadores y
+listados por fecha solo cubren lo que no se archivó.
+"""
+from datetime import date, datetime
+
+from sqlalchemy import delete, insert, literal, select
+
+from extensions.database import db
+from models.cita_model import Cita
+from models.historial_estado_cita_model import HistorialEstadoCita
+from models.cita_archivada_model import CitaArchivada, HistorialEstadoCitaArchivado
+
+
+def fecha_corte(meses, hoy=None):
+    """Primer día del mes que está `meses` meses antes del mes de `hoy`."""
+    hoy = hoy or date.today()
+    total = hoy.year * 12 + hoy.month - 1 - meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+class ArchivoService:
+    """Traslado de citas antiguas a las tablas de archivo."""
+
+    TAMANO_LOTE = 2000
+
+    @staticmethod
+    def archivar_lote(corte, tamano_lote=TAMANO_LOTE):
+        """
+        Archiva hasta `tamano_lote` citas con fecha anterior a `corte` y
+        confirma la transacción. Retorna (citas, historial) archivados.
+        """
+        ids = db.session.execute(
+            select(Cita.id).where(Cita.fecha < corte).order_by(Cita.id).limit(tamano_lote)
+        ).scalars().all()
+        if not ids:
+            return 0, 0
+
+        try:
+            ahora = datetime.utcnow()
+            db.session.execute(insert(CitaArchivada).from_select(
+                [*CitaArchivada.COLUMNAS, "fecha_archivo"],
+                select(*[getattr(Cita, c) for c in CitaArchivada.COLUMNAS], literal(ahora, db.DateTime))
+                .where(Cita.id.in_(ids))
+            ))
+            historial = db.session.execute(insert(HistorialEstadoCitaArchivado).from_select(
+                list(HistorialEstadoCitaArchivado.COLUMNAS),
+                select(*[getattr(HistorialEstadoCita, c) for c in HistorialEstadoCitaArchivado.COLUMNAS])
+                .where(HistorialEstadoCita.cita_id.in_(ids))
+            )).rowcount
+
+            # Historial (ya copiado al archivo) y lista de espera, sin depender de las FK
+            Cita.desvincular_dependientes(ids)
+            db.session.execute(
+                delete(Cita).where(Cita.id.in_(ids)),
+                execution_options={"synchronize_session": False}
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        db.session.expunge_all()
+        return len(ids), historial
+
+    @staticmethod
+    def archivar(corte, tamano_lote=TAMANO_LOTE, max_lotes=None):
+        """
+        Archiva por lotes todas las citas con fecha anterior a `corte`.
+        Retorna (citas, historial) archivados.
+        """
+        total_citas = total_historial = lotes = 0
+        while max_lotes is None or lotes < max_lotes:
+            citas, historial = ArchivoService.archivar_lote(corte, tamano_lote)
+            if not citas:
+                break
+            total_citas += citas
+            total_historial += historial
+            lotes += 1
+        return total_citas, total_historial
@@ -0,0 +1,213 @@
+"""
+Vistas mensuales de horarios guardadas en memoria: la matriz de
+disponibilidad de cada área (/api/horarios/disponibilidad) y el resumen de
+cada médico (/api/horarios/resumen).
+
+Se invalidan con los cambios de horarios que reparte
+services/disponibilidad_service.py al confirmar cada transacción.
+"""
+import time
+from calendar import monthrange
+from collections import OrderedDict
+from datetime import date
+from threading import Lock
+
+from sqlalchemy import func
+
+from extensions.database import db
+from models.area_model import Area
+from models.horario_medico_model import HorarioMedico
+from models.persona_model import Persona
+from models.usuario_model import Usuario
+from services.disponibilidad_service import nombre_medico, registrar
+from services.regla_horario_service import ReglaHorarioService
+
+
+def leer_matriz(area_id, anio, mes):
+    """
+    Cupos libres de un área en un mes por día, turno y médico, con una sola
+    consulta agrupada sobre horarios_medicos (sin cargar objetos del ORM),
+    más los días que las reglas recurrentes generan, expandidos en memoria.
+    """
+    inicio = date(anio, mes, 1)
+    fin = date(anio, mes, monthrange(anio, mes)[1])
+    filas = db.session.query(
+        HorarioMedico.fecha, HorarioMedico.turno, HorarioMedico.medico_id,
+        Persona.nombres, Persona.apellido_paterno, Persona.apellido_materno, Persona.dni,
+        func.sum(HorarioMedico.cupos - HorarioMedico.ocupados)
+    ).join(Usuario, Usuario.id == HorarioMedico.medico_id)\
+        .join(Persona, Persona.id == Usuario.persona_id)\
+        .filter(
+            HorarioMedico.area_id == area_id,
+            HorarioMedico.fecha >= inicio,
+            HorarioMedico.fecha <= fin
+        ).group_by(
+            HorarioMedico.fecha, HorarioMedico.turno, HorarioMedico.medico_id,
+            Persona.nombres, Persona.apellido_paterno, Persona.apellido_materno, Persona.dni
+        ).order_by(HorarioMedico.fecha, HorarioMedico.turno, HorarioMedico.medico_id).all()
+
+    medicos = {}
+    dias = {}
+    for fecha, turno, medico_id, nombres, paterno, materno, dni, libres in filas:
+        if medico_id not in medicos:
+            medicos[medico_id] = nombre_medico(nombres, paterno, materno, dni)
+        turnos = dias.setdefault(str(fecha), {})
+        turnos.setdefault(turno, {})[str(medico_id)] = max(int(libres or 0), 0)
+
+    # Días que generan las reglas recurrentes y aún no tienen fila: todos sus cupos están libres
+    pendientes = ReglaHorarioService.pendientes(inicio, fin, area_id=area_id)
+    faltan = {medico_id for medico_id, _, _ in pendientes} - set(medicos)
+    if faltan:
+        for medico_id, nombres, paterno, materno, dni in db.session.query(
+            Usuario.id, Persona.nombres, Persona.apellido_paterno, Persona.apellido_materno, Persona.dni
+        ).join(Persona, Persona.id == Usuario.persona_id).filter(Usuario.id.in_(faltan)):
+            medicos[medico_id] = nombre_medico(nombres, paterno, materno, dni)
+    for (medico_id, fecha, turno), (_, cupos, _) in pendientes.items():
+        dias.setdefault(str(fecha), {}).setdefault(turno, {})[str(medico_id)] = max(cupos, 0)
+
+    return {
+        "area_id": area_id,
+        "mes": f"{anio:04d}-{mes:02d}",
+        "medicos": [{"id": medico_id, "nombre": nombre} for medico_id, nombre in medicos.items()],
+        "dias": dias
+    }
+
+
+def leer_resumen(medico_id, anio, mes):
+    """
+    Horarios de un médico en un mes agrupados por día, con cupos ocupados y
+    libres por turno, en una sola consulta de columnas unida a áreas.
+    Antes crea los horarios que las reglas recurrentes generan en el mes
+    (en una transacción propia, sin confirmar la sesión) para que cada
+    turno tenga su id.
+    """
+    inicio = date(anio, mes, 1)
+    fin = date(anio, mes, monthrange(anio, mes)[1])
+    ReglaHorarioService.materializar_aparte(inicio, fin, medico_id=medico_id)
+
+    filas = db.session.query(
+        HorarioMedico.id, HorarioMedico.fecha, HorarioMedico.dia_semana, HorarioMedico.turno,
+        HorarioMedico.cupos, HorarioMedico.ocupados, HorarioMedico.area_id, Area.nombre
+    ).outerjoin(Area, Area.id == HorarioMedico.area_id)\
+        .filter(
+            HorarioMedico.medico_id == medico_id,
+            HorarioMedico.fecha >= inicio,
+            HorarioMedico.fecha <= fin
+        ).order_by(HorarioMedico.fecha, HorarioMedico.turno).all()
+
+    dias = {}
+    for horario_id, fecha, dia_semana, turno, cupos, ocupados, area_id, area_nombre in filas:
+        dia = dias.setdefault(fecha, {"fecha": str(fecha), "dia_semana": dia_semana, "turnos": {}})
+        manana = turno == 'M'
+        dia["turnos"][turno] = {
+            "id": horario_id,
+            "turno": turno,
+            "turno_nombre": "Mañana" if manana else "Tarde",
+            "hora_inicio": str(HorarioMedico.HORARIO_MANANA_INICIO if manana else HorarioMedico.HORARIO_TARDE_INICIO),
+            "hora_fin": str(HorarioMedico.HORARIO_MANANA_FIN if manana else HorarioMedico.HORARIO_TARDE_FIN),
+            "cupos": cupos,
+            "ocupados": ocupados,
+            "cupos_disponibles": max(cupos - ocupados, 0),
+            "area_id": area_id,
+            "area_nombre": area_nombre
+        }
+
+    return {
+        "medico_id": medico_id,
+        "mes": f"{anio:04d}-{mes:02d}",
+        "dias": list(dias.values())
+    }
+
+
+class CacheMensual:
+    """
+    Vistas mensuales por (id, año, mes) del proceso, leídas con `leer`:
+    la matriz de un área (leer_matriz) o el resumen de un médico
+    (leer_resumen).
+
+    Se invalidan al confirmar una transacción que modificó horarios de ese
+    área o médico y mes (reservas, liberaciones, cambios de horarios). Las
+    escrituras de otros workers no llegan a este proceso, por eso cada
+    entrada además vence a los `ttl` segundos.
+    """
+
+    def __init__(self, leer, max_entradas=256):
+        self._leer = leer
+        self._lock = Lock()
+        self._entradas = OrderedDict()
+        self._max_entradas = max_entradas
+        # Cambia con cada invalidación: una lectura que empezó antes no se guarda
+        self._version = 0
+
+    def hay_entradas(self):
+        return bool(self._entradas)
+
+    def obtener(self, id, anio, mes, ttl):
+        """Vista del área o médico y mes, desde memoria o leyéndola de la base."""
+        clave = (id, anio, mes)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[0] > time.monotonic():
+                self._entradas.move_to_end(clave)
+                return entrada[1]
+            version = self._version
+
+        vista = self._leer(id, anio, mes)
+        with self._lock:
+            if version == self._version:
+                self._entradas[clave] = (time.monotonic() + ttl, vista)
+                self._entradas.move_to_end(clave)
+                while len(self._entradas) > self._max_entradas:
+                    self._entradas.popitem(last=False)
+        return vista
+
+    def invalidar(self, claves):
+        """`claves`: iterable de (id, año, mes)."""
+        with self._lock:
+            self._version += 1
+            for clave in claves:
+                self._entradas.pop(clave, None)
+
+    def invalidar_meses(self, meses):
+        """Descarta las entradas de cualquier id en los (año, mes) dados."""
+        with self._lock:
+            self._version += 1
+            for clave in [c for c in self._entradas if c[1:] in meses]:
+                del self._entradas[clave]
+
+    def limpiar(self):
+        with self._lock:
+            self._version += 1
+            self._entradas.clear()
+
+
+matrices = CacheMensual(leer_matriz)
+resumenes = CacheMensual(leer_resumen)
+
+
+def limpiar_caches():
+    """Descarta todas las vistas mensuales."""
+    matrices.limpiar()
+    resumenes.limpiar()
+
+
+def _invalidar(cambios):
+    """Descarta el mes de cada área y médico con horarios modificados."""
+    matrices.invalidar({(area_id, fecha.year, fecha.month) for area_id, fecha in cambios})
+    resumenes.invalidar({
+        (datos["medico_id"], fecha.year, fecha.month)
+        for (_, fecha), lista in cambios.items() for datos in lista if "medico_id" in datos
+    })
+    # Un horario eliminado sin su médico anotado: se descarta el mes de todos
+    resumenes.invalidar_meses({
+        (fecha.year, fecha.month)
+        for (_, fecha), lista in cambios.items()
+        if any(datos.get("eliminado") and "medico_id" not in datos for datos in lista)
+    })
+
+
+registrar(
+    activo=lambda: matrices.hay_entradas() or resumenes.hay_entradas(),
+    aplicar=_invalidar,
+    invalidar=limpiar_caches
+)
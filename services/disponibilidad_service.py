@@ -0,0 +1,229 @@
+"""
+Publicación en vivo de la disponibilidad de cupos por área y fecha.
+
+Las escrituras anotan en la sesión qué horarios cambiaron
+(HorarioMedico.marcar_modificados / marcar_eliminados; las reservas y
+liberaciones de cupo y los cambios ORM sobre horarios lo hacen solos).
+Antes de confirmar se leen sus cupos con una sola consulta y, una vez
+confirmada la transacción, se envían a los suscriptores del área y fecha
+afectadas. Si la transacción se revierte no se publica nada.
+
+El publicador vive en el proceso: cada worker de gunicorn tiene el suyo.
+Los streams de /api/horarios/stream además releen la disponibilidad cuando
+pasan INTERVALO_SINCRONIZACION segundos sin eventos, de modo que también
+reflejan las escrituras hechas en otros workers.
+
+Los mismos cambios se reparten a las demás vistas en memoria que se
+registran con `registrar`: las vistas mensuales
+(services/cache_disponibilidad.py) y el índice de cupos libres
+(services/indice_disponibilidad.py). Un único juego de listeners de la
+sesión los atiende a todos.
+"""
+from collections import defaultdict
+from queue import Queue, Full, Empty
+from threading import Lock
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from extensions.database import db
+from models.horario_medico_model import HorarioMedico
+
+
+def disponibilidad_horario(horario_id, turno, medico_id, cupos, ocupados):
+    """Datos de un horario que se envían en cada evento."""
+    return {
+        "id": horario_id,
+        "turno": turno,
+        "medico_id": medico_id,
+        "cupos": cupos,
+        "ocupados": ocupados,
+        "cupos_disponibles": cupos - ocupados
+    }
+
+
+def leer_disponibilidad(area_id=None, fecha=None, horario_ids=None, sesion=None):
+    """
+    Disponibilidad actual de los horarios de un área y fecha (o de los ids dados).
+    Retorna {horario_id: (area_id, fecha, datos)}.
+    """
+    sesion = sesion if sesion is not None else db.session
+    query = sesion.query(
+        HorarioMedico.id, HorarioMedico.area_id, HorarioMedico.fecha, HorarioMedico.turno,
+        HorarioMedico.medico_id, HorarioMedico.cupos, HorarioMedico.ocupados
+    )
+    if horario_ids is not None:
+        query = query.filter(HorarioMedico.id.in_(horario_ids))
+    else:
+        query = query.filter(HorarioMedico.area_id == area_id, HorarioMedico.fecha == fecha)
+
+    return {
+        h_id: (h_area, h_fecha, disponibilidad_horario(h_id, turno, medico_id, cupos, ocupados))
+        for h_id, h_area, h_fecha, turno, medico_id, cupos, ocupados
+        in query.order_by(HorarioMedico.turno, HorarioMedico.id)
+    }
+
+
+class Suscripcion:
+    """Cola acotada de un stream. Si se llena, se marca para releer la disponibilidad."""
+
+    def __init__(self, area_id, fecha, tamano_cola):
+        self.area_id = area_id
+        self.fecha = fecha
+        self.cola = Queue(maxsize=tamano_cola)
+        self.desbordada = False
+
+    def entregar(self, cambios):
+        try:
+            self.cola.put_nowait(cambios)
+        except Full:
+            # Cliente lento: se descartan los cambios pendientes y el stream relee todo
+            self.desbordada = True
+
+    def descartar_pendientes(self):
+        self.desbordada = False
+        while True:
+            try:
+                self.cola.get_nowait()
+            except Empty:
+                return
+
+
+class PublicadorDisponibilidad:
+    """
+    Reparte los cambios de disponibilidad entre los streams abiertos.
+
+    Cada stream ocupa un hilo de gunicorn mientras está abierto, por eso la
+    cantidad de suscriptores por proceso está acotada (SSE_MAX_SUSCRIPTORES)
+    y cada suscriptor tiene una cola de tamaño fijo. Publicar nunca bloquea
+    a la petición que escribe.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._canales = defaultdict(set)
+        self._total = 0
+
+    def suscribir(self, area_id, fecha, max_suscriptores, tamano_cola):
+        """Retorna una Suscripcion, o None si se alcanzó el máximo del proceso."""
+        with self._lock:
+            if self._total >= max_suscriptores:
+                return None
+            suscripcion = Suscripcion(area_id, fecha, tamano_cola)
+            self._canales[(area_id, fecha)].add(suscripcion)
+            self._total += 1
+            return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            canal = self._canales.get((suscripcion.area_id, suscripcion.fecha))
+            if canal is None or suscripcion not in canal:
+                return
+            canal.discard(suscripcion)
+            self._total -= 1
+            if not canal:
+                del self._canales[(suscripcion.area_id, suscripcion.fecha)]
+
+    def hay_suscriptores(self):
+        return self._total > 0
+
+    def publicar(self, cambios_por_canal):
+        """`cambios_por_canal`: {(area_id, fecha): [datos de horario, ...]}"""
+        with self._lock:
+            destinos = [
+                (suscripcion, cambios)
+                for canal, cambios in cambios_por_canal.items()
+                for suscripcion in self._canales.get(canal, ())
+            ]
+        for suscripcion, cambios in destinos:
+            suscripcion.entregar(cambios)
+
+
+publicador = PublicadorDisponibilidad()
+
+
+def nombre_medico(nombres, paterno, materno, dni):
+    return f"{nombres} {paterno} {materno}".strip() or dni
+
+
+# Vistas en memoria que siguen los cambios de horarios: [(activo, aplicar, invalidar)]
+_vistas = []
+
+
+def registrar(activo, aplicar, invalidar):
+    """
+    Suscribe una vista en memoria a los cambios de horarios confirmados.
+
+    Args:
+        activo: función sin argumentos; False si la vista no guarda nada y
+            no hace falta leer los cambios por ella.
+        aplicar: recibe {(area_id, fecha): [datos de horario o {"id", "eliminado"}]}
+            después de cada commit que modificó horarios.
+        invalidar: función sin argumentos; descarta toda la vista cuando no
+            se sabe qué cambió.
+    """
+    _vistas.append((activo, aplicar, invalidar))
+
+
+def invalidar_vistas():
+    """Descarta todas las vistas en memoria (p. ej. al cambiar reglas de horario)."""
+    for _, _, invalidar in _vistas:
+        invalidar()
+
+
+def _vistas_activas():
+    return [vista for vista in _vistas if vista[0]()]
+
+
+@event.listens_for(Session, "before_commit")
+def _preparar_publicacion(session):
+    if not (publicador.hay_suscriptores() or _vistas_activas()):
+        return
+
+    # Los cambios ORM sobre horarios se anotan al hacer flush
+    session.flush()
+    modificados = session.info.pop("horarios_modificados", None)
+    eliminados = session.info.pop("horarios_eliminados", None)
+    if not (modificados or eliminados):
+        return
+
+    cambios = defaultdict(list)
+    for horario_id, area_id, fecha, *medico in eliminados or ():
+        datos = {"id": horario_id, "eliminado": True}
+        if medico:
+            datos["medico_id"] = medico[0]
+        cambios[(area_id, fecha)].append(datos)
+
+    if modificados:
+        # Misma transacción: se leen los valores que se van a confirmar
+        actuales = leer_disponibilidad(horario_ids=sorted(modificados), sesion=session)
+        for area_id, fecha, datos in actuales.values():
+            cambios[(area_id, fecha)].append(datos)
+
+    session.info["disponibilidad_pendiente"] = dict(cambios)
+
+
+def _limpiar(session):
+    session.info.pop("horarios_modificados", None)
+    session.info.pop("horarios_eliminados", None)
+    return session.info.pop("disponibilidad_pendiente", None)
+
+
+@event.listens_for(Session, "after_commit")
+def _publicar(session):
+    sin_leer = session.info.get("horarios_modificados") or session.info.get("horarios_eliminados")
+    cambios = _limpiar(session)
+    if cambios:
+        # Primero las vistas: un cliente que recibe el evento y relee ya no ve datos viejos
+        for _, aplicar, _ in _vistas:
+            aplicar(cambios)
+        publicador.publicar(cambios)
+    elif sin_leer:
+        # Una vista se llenó mientras se confirmaba: no se sabe qué área o médico afecta
+        for _, _, invalidar in _vistas_activas():
+            invalidar()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _descartar(session, previous_transaction):
+    _limpiar(session)
@@ -0,0 +1,337 @@
+"""
+Registro en bloque de horarios por (medico_id, fecha, turno).
+
+Un solo INSERT ... ON CONFLICT (medico_id, fecha, turno) DO UPDATE en
+PostgreSQL y SQLite, en lugar de un SELECT por horario más un INSERT o
+UPDATE por objeto. Solo se actualizan las filas cuyo área o cupos cambian;
+RETURNING indica cuáles se crearon y cuáles se actualizaron.
+
+La clonación de un mes a otro (clonar_mes) también es una sola sentencia:
+INSERT ... SELECT sobre los horarios del mes origen unidos a la tabla de
+fechas origen -> destino, con ON CONFLICT DO NOTHING.
+"""
+from calendar import monthrange
+from datetime import date, timedelta
+
+from sqlalchemy import Date, Integer, and_, bindparam, case, exists, insert, literal, literal_column, or_, select, union_all, update
+from sqlalchemy.orm import aliased
+from sqlalchemy.dialects import postgresql, sqlite
+
+from extensions.database import db
+from models.horario_medico_model import HorarioMedico
+
+# Dialectos con INSERT ... ON CONFLICT
+_INSERT_ON_CONFLICT = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def alinear_fechas(anio_origen, mes_origen, anio_destino, mes_destino):
+    """
+    Empareja cada fecha del mes origen con la del mes destino que cae en el
+    mismo día de la semana y la misma semana del mes (el 2do martes con el
+    2do martes). Un 5to día de la semana sin par en el destino se omite.
+
+    Returns:
+        dict: {fecha_origen: fecha_destino}
+    """
+    primero_destino = date(anio_destino, mes_destino, 1)
+    fechas = {}
+    for dia in range(1, monthrange(anio_origen, mes_origen)[1] + 1):
+        origen = date(anio_origen, mes_origen, dia)
+        desplazamiento = (origen.weekday() - primero_destino.weekday()) % 7
+        destino = primero_destino + timedelta(days=desplazamiento + 7 * ((dia - 1) // 7))
+        if destino.month == mes_destino:
+            fechas[origen] = destino
+    return fechas
+
+
+class CuposOcupadosError(Exception):
+    """Un horario existente quedaría con menos cupos que citas."""
+
+    def __init__(self, conflictos):
+        self.conflictos = conflictos
+        super().__init__(
+            "No se pueden dejar menos cupos que citas en: " + ", ".join(
+                f"médico {c['medico_id']} {c['fecha']} {c['turno']} ({c['ocupados']} citas)" for c in conflictos
+            )
+        )
+
+
+class HorarioService:
+    """Creación y actualización de horarios en bloque."""
+
+    @staticmethod
+    def upsert_lote(horarios: list) -> dict:
+        """
+        Crea o actualiza horarios. Cada elemento es un dict con medico_id,
+        area_id, fecha (date), turno, cupos y opcionalmente duracion_cupo
+        (por defecto el turno se reparte entre los cupos); puede haber varios
+        médicos. Si una clave (medico_id, fecha, turno) se repite, vale la
+        última.
+
+        Un horario que ya existía y se modifica aquí deja de depender de su
+        regla recurrente (regla_id = NULL). La duración de los cupos solo
+        cambia en los horarios sin citas, y los cupos no pueden quedar por
+        debajo de sus citas (CuposOcupadosError, sin escribir nada). Si
+        cupos * duracion_cupo no cabe en el turno o hay más de MAX_SLOTS
+        cupos lanza ValueError (HorarioMedico.validar_cupos). No confirma
+        la transacción.
+
+        Returns:
+            dict: {"creados": int, "actualizados": int, "ids": [id por clave, en orden]}
+        """
+        por_clave = {(h["medico_id"], h["fecha"], h["turno"]): h for h in horarios}
+        if not por_clave:
+            return {"creados": 0, "actualizados": 0, "ids": []}
+        for h in por_clave.values():
+            HorarioMedico.validar_cupos(h["cupos"], h.get("duracion_cupo"))
+
+        fechas = [fecha for _, fecha, _ in por_clave]
+        # Los existentes quedan bloqueados: una reserva simultánea no cambia ocupados hasta confirmar
+        existentes = {
+            (medico_id, fecha, turno): (horario_id, area_id, cupos, regla_id, ocupados, duracion_cupo)
+            for horario_id, medico_id, fecha, turno, area_id, cupos, regla_id, ocupados, duracion_cupo
+            in db.session.query(
+                HorarioMedico.id, HorarioMedico.medico_id, HorarioMedico.fecha, HorarioMedico.turno,
+                HorarioMedico.area_id, HorarioMedico.cupos, HorarioMedico.regla_id,
+                HorarioMedico.ocupados, HorarioMedico.duracion_cupo
+            ).filter(
+                HorarioMedico.medico_id.in_({medico_id for medico_id, _, _ in por_clave}),
+                HorarioMedico.fecha >= min(fechas),
+                HorarioMedico.fecha <= max(fechas)
+            ).with_for_update()
+            if (medico_id, fecha, turno) in por_clave
+        }
+
+        conflictos = [
+            {"medico_id": clave[0], "fecha": str(clave[1]), "turno": clave[2], "ocupados": existente[4]}
+            for clave, existente in sorted(existentes.items())
+            if por_clave[clave]["cupos"] < existente[4]
+        ]
+        if conflictos:
+            raise CuposOcupadosError(conflictos)
+        # Con citas se conserva la duración actual: los cupos nuevos también deben caber con ella
+        for clave, existente in existentes.items():
+            if existente[4] > 0:
+                HorarioMedico.validar_cupos(por_clave[clave]["cupos"], existente[5])
+
+        # Los que cambian de área desaparecen de la disponibilidad anterior
+        HorarioMedico.marcar_eliminados([
+            (existente[0], existente[1], clave[1], clave[0])
+            for clave, existente in existentes.items()
+            if existente[1] != por_clave[clave]["area_id"]
+        ])
+
+        filas = [
+            {
+                "medico_id": medico_id, "area_id": h["area_id"], "fecha": fecha,
+                "dia_semana": fecha.weekday(), "turno": turno, "cupos": h["cupos"],
+                "duracion_cupo": h.get("duracion_cupo") or HorarioMedico.duracion_repartida(h["cupos"]),
+                "ocupados": 0, "slots_ocupados": 0, "regla_id": None
+            }
+            for (medico_id, fecha, turno), h in sorted(por_clave.items())
+        ]
+
+        dialecto = db.session.get_bind().dialect
+        insertar = _INSERT_ON_CONFLICT.get(dialecto.name)
+        if insertar is not None and dialecto.insert_returning:
+            escritos = HorarioService._upsert_on_conflict(insertar, dialecto, filas, existentes)
+        else:
+            escritos = HorarioService._upsert_sin_on_conflict(filas, existentes)
+
+        HorarioMedico.marcar_modificados([horario_id for horario_id, _ in escritos.values()])
+
+        # Las instancias ya cargadas en la sesión no ven el INSERT/UPDATE
+        for horario_id, _ in escritos.values():
+            horario = db.session.identity_map.get(db.session.identity_key(HorarioMedico, horario_id))
+            if horario is not None:
+                db.session.expire(horario)
+
+        creados = sum(1 for _, creado in escritos.values() if creado)
+        return {
+            "creados": creados,
+            "actualizados": len(escritos) - creados,
+            "ids": [
+                escritos[clave][0] if clave in escritos else existentes[clave][0]
+                for clave in sorted(por_clave)
+            ]
+        }
+
+    @staticmethod
+    def _upsert_on_conflict(insertar, dialecto, filas, existentes):
+        """Una sentencia; retorna {clave: (id, creado)} de las filas escritas."""
+        sentencia = insertar(HorarioMedico.__table__).values(filas)
+        excluido = sentencia.excluded
+        tabla = HorarioMedico.__table__.c
+        sentencia = sentencia.on_conflict_do_update(
+            index_elements=["medico_id", "fecha", "turno"],
+            set_={
+                "area_id": excluido.area_id,
+                "cupos": excluido.cupos,
+                # Las citas ya tienen su hora: la duración solo cambia sin citas
+                "duracion_cupo": case((tabla.ocupados == 0, excluido.duracion_cupo), else_=tabla.duracion_cupo),
+                "regla_id": None
+            },
+            # Las filas sin cambios no se reescriben ni se devuelven
+            where=or_(
+                tabla.area_id != excluido.area_id,
+                tabla.cupos != excluido.cupos,
+                and_(tabla.ocupados == 0, tabla.duracion_cupo != excluido.duracion_cupo),
+                tabla.regla_id.isnot(None)
+            )
+        )
+
+        columnas = [tabla.id, tabla.medico_id, tabla.fecha, tabla.turno]
+        if dialecto.name == "postgresql":
+            # xmax = 0 solo en las filas recién insertadas
+            columnas.append(literal_column("xmax") == 0)
+            return {
+                (medico_id, fecha, turno): (horario_id, creado)
+                for horario_id, medico_id, fecha, turno, creado in db.session.execute(sentencia.returning(*columnas))
+            }
+
+        return {
+            (medico_id, fecha, turno): (horario_id, (medico_id, fecha, turno) not in existentes)
+            for horario_id, medico_id, fecha, turno in db.session.execute(sentencia.returning(*columnas))
+        }
+
+    @staticmethod
+    def _upsert_sin_on_conflict(filas, existentes):
+        """Motores sin ON CONFLICT/RETURNING: un INSERT y un UPDATE con executemany."""
+        nuevas, cambios = [], []
+        for fila in filas:
+            clave = (fila["medico_id"], fila["fecha"], fila["turno"])
+            existente = existentes.get(clave)
+            if existente is None:
+                nuevas.append(fila)
+                continue
+            horario_id, area_id, cupos, regla_id, ocupados, duracion = existente
+            # Las citas ya tienen su hora: la duración solo cambia sin citas
+            nueva_duracion = fila["duracion_cupo"] if ocupados == 0 else duracion
+            if (area_id, cupos, regla_id, duracion) != (fila["area_id"], fila["cupos"], None, nueva_duracion):
+                cambios.append({
+                    "b_id": horario_id, "b_area_id": fila["area_id"], "b_cupos": fila["cupos"],
+                    "b_duracion": nueva_duracion
+                })
+
+        escritos = {}
+        if nuevas:
+            db.session.execute(insert(HorarioMedico.__table__), nuevas)
+            fechas = [f["fecha"] for f in nuevas]
+            for horario_id, medico_id, fecha, turno in db.session.query(
+                HorarioMedico.id, HorarioMedico.medico_id, HorarioMedico.fecha, HorarioMedico.turno
+            ).filter(
+                HorarioMedico.medico_id.in_({f["medico_id"] for f in nuevas}),
+                HorarioMedico.fecha >= min(fechas),
+                HorarioMedico.fecha <= max(fechas)
+            ):
+                if (medico_id, fecha, turno) not in existentes:
+                    escritos[(medico_id, fecha, turno)] = (horario_id, True)
+        if cambios:
+            tabla = HorarioMedico.__table__
+            db.session.execute(
+                update(tabla).where(tabla.c.id == bindparam("b_id"))
+                .values(area_id=bindparam("b_area_id"), cupos=bindparam("b_cupos"),
+                        duracion_cupo=bindparam("b_duracion"), regla_id=None),
+                cambios
+            )
+            ids = {c["b_id"] for c in cambios}
+            escritos.update({clave: (e[0], False) for clave, e in existentes.items() if e[0] in ids})
+        return escritos
+
+    @staticmethod
+    def clonar_mes(origen, destino, medico_id=None, area_id=None, feriados=(), simular=False):
+        """
+        Copia los horarios de un mes (`origen`, tupla (año, mes)) a otro
+        (`destino`) según alinear_fechas, para un médico, un área o todos.
+        Se omiten las fechas destino en `feriados` y los horarios generados
+        por reglas (las reglas ya generan el mes destino). Los horarios que
+        ya existen en el destino se conservan. No confirma la transacción.
+
+        Con `simular` no escribe nada y retorna el detalle de lo que haría.
+
+        Returns:
+            dict: {"creados", "conservados"} o, al simular,
+                  {"crear": [...], "conservados": [...]}
+        """
+        feriados = set(feriados)
+        fechas = {
+            f_origen: f_destino
+            for f_origen, f_destino in alinear_fechas(*origen, *destino).items()
+            if f_destino not in feriados
+        }
+        if not fechas:
+            return {"crear": [], "conservados": []} if simular else {"creados": 0, "conservados": 0}
+
+        # Tabla de fechas origen -> destino (a lo sumo 31 filas) en la misma sentencia
+        mapa = union_all(*[
+            select(literal(f_origen, Date).label("fecha_origen"), literal(f_destino, Date).label("fecha_destino"))
+            for f_origen, f_destino in sorted(fechas.items())
+        ]).subquery("mapa")
+
+        tabla = HorarioMedico.__table__
+        filtros = [tabla.c.regla_id.is_(None)]
+        if medico_id:
+            filtros.append(tabla.c.medico_id == medico_id)
+        if area_id:
+            filtros.append(tabla.c.area_id == area_id)
+
+        existente = aliased(HorarioMedico.__table__, name="existente")
+        coincide = and_(
+            existente.c.medico_id == tabla.c.medico_id,
+            existente.c.fecha == mapa.c.fecha_destino,
+            existente.c.turno == tabla.c.turno
+        )
+
+        if simular:
+            filas = db.session.execute(
+                select(
+                    tabla.c.medico_id, tabla.c.area_id, tabla.c.fecha, mapa.c.fecha_destino,
+                    tabla.c.turno, tabla.c.cupos, existente.c.id, existente.c.area_id, existente.c.cupos
+                ).join(mapa, tabla.c.fecha == mapa.c.fecha_origen)
+                .outerjoin(existente, coincide)
+                .where(*filtros)
+                .order_by(mapa.c.fecha_destino, tabla.c.medico_id, tabla.c.turno)
+            )
+            detalle = {"crear": [], "conservados": []}
+            for medico, area, f_origen, f_destino, turno, cupos, existente_id, existente_area, existente_cupos in filas:
+                item = {
+                    "medico_id": medico, "area_id": area, "fecha_origen": str(f_origen),
+                    "fecha": str(f_destino), "turno": turno, "cupos": cupos
+                }
+                if existente_id is None:
+                    detalle["crear"].append(item)
+                else:
+                    item["horario_existente"] = {"id": existente_id, "area_id": existente_area, "cupos": existente_cupos}
+                    detalle["conservados"].append(item)
+            return detalle
+
+        origen_filas = select(
+            tabla.c.medico_id, tabla.c.area_id, mapa.c.fecha_destino, tabla.c.dia_semana,
+            tabla.c.turno, tabla.c.cupos, tabla.c.duracion_cupo, literal(0, Integer), literal(0, Integer)
+        ).join(mapa, tabla.c.fecha == mapa.c.fecha_origen).where(*filtros)
+        columnas = ["medico_id", "area_id", "fecha", "dia_semana", "turno", "cupos", "duracion_cupo",
+                    "ocupados", "slots_ocupados"]
+
+        total = db.session.execute(select(db.func.count()).select_from(origen_filas.subquery())).scalar()
+
+        dialecto = db.session.get_bind().dialect
+        insertar = _INSERT_ON_CONFLICT.get(dialecto.name)
+        if insertar is not None:
+            sentencia = insertar(HorarioMedico.__table__).from_select(columnas, origen_filas)\
+                .on_conflict_do_nothing(index_elements=["medico_id", "fecha", "turno"])
+        else:
+            # Motores sin ON CONFLICT: se excluyen las claves que ya existen en el destino
+            sentencia = insert(HorarioMedico.__table__).from_select(
+                columnas, origen_filas.where(~exists().where(coincide))
+            )
+
+        if dialecto.insert_returning:
+            creados = db.session.execute(sentencia.returning(tabla.c.id)).scalars().all()
+            HorarioMedico.marcar_modificados(creados)
+            creados = len(creados)
+        else:
+            creados = db.session.execute(sentencia).rowcount
+        return {"creados": creados, "conservados": total - creados}
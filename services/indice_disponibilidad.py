@@ -0,0 +1,204 @@
+"""
+Índice en memoria de los horarios con cupos libres de cada área, que
+responde /api/horarios/proximo-disponible.
+
+Se actualiza con los cambios de horarios que reparte
+services/disponibilidad_service.py al confirmar cada transacción.
+"""
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import date, timedelta
+from threading import Lock
+
+from extensions.database import db
+from models.horario_medico_model import HorarioMedico
+from models.persona_model import Persona
+from models.usuario_model import Usuario
+from services.disponibilidad_service import disponibilidad_horario, nombre_medico, registrar
+from services.regla_horario_service import ReglaHorarioService
+
+
+class IndiceDisponibilidad:
+    """
+    Horarios con cupos libres de cada área, ordenados por (fecha, turno,
+    médico), para encontrar el primer cupo desde una fecha con una
+    búsqueda binaria y sin consultar la base.
+
+    Se construye con una sola consulta al arrancar el proceso e incluye
+    los días que las reglas recurrentes generan en los próximos
+    HORIZONTE_REGLAS días (sin id hasta que se materializan). Al confirmar
+    una transacción que reservó, liberó o modificó horarios se actualizan
+    solo esas entradas. Las escrituras de otros workers no llegan a este
+    proceso: el índice se reconstruye cuando pasan `ttl` segundos.
+    """
+
+    HORIZONTE_REGLAS = 62
+
+    def __init__(self):
+        self._lock = Lock()
+        # area_id -> lista ordenada de (fecha, turno, medico_id)
+        self._claves = {}
+        # (area_id, fecha, turno, medico_id) -> datos del horario
+        self._datos = {}
+        # horario_id -> (area_id, fecha, turno, medico_id)
+        self._ubicacion = {}
+        self._medicos = {}
+        self._vence = 0.0
+        # Cambios confirmados mientras se reconstruye: se vuelven a aplicar al nuevo índice
+        self._reconstrucciones = 0
+        self._registro = []
+
+    @property
+    def construido(self):
+        return self._vence > 0
+
+    def invalidar(self):
+        """Fuerza la reconstrucción en la próxima búsqueda."""
+        with self._lock:
+            if self._vence:
+                self._vence = time.monotonic()
+
+    def reconstruir(self, ttl, hoy=None):
+        hoy = hoy or date.today()
+        with self._lock:
+            self._reconstrucciones += 1
+            inicio_registro = len(self._registro)
+
+        try:
+            filas = db.session.query(
+                HorarioMedico.id, HorarioMedico.area_id, HorarioMedico.fecha, HorarioMedico.turno,
+                HorarioMedico.medico_id, HorarioMedico.cupos, HorarioMedico.ocupados
+            ).filter(
+                HorarioMedico.fecha >= hoy,
+                HorarioMedico.area_id.isnot(None),
+                HorarioMedico.ocupados < HorarioMedico.cupos
+            ).all()
+            pendientes = ReglaHorarioService.pendientes(hoy, hoy + timedelta(days=self.HORIZONTE_REGLAS))
+
+            claves = defaultdict(list)
+            datos = {}
+            ubicacion = {}
+            for horario_id, area_id, fecha, turno, medico_id, cupos, ocupados in filas:
+                datos[(area_id, fecha, turno, medico_id)] = disponibilidad_horario(
+                    horario_id, turno, medico_id, cupos, ocupados
+                )
+                ubicacion[horario_id] = (area_id, fecha, turno, medico_id)
+            for (medico_id, fecha, turno), (area_id, cupos, _) in pendientes.items():
+                if area_id is not None and cupos > 0:
+                    datos[(area_id, fecha, turno, medico_id)] = disponibilidad_horario(
+                        None, turno, medico_id, cupos, 0
+                    )
+            for area_id, fecha, turno, medico_id in datos:
+                claves[area_id].append((fecha, turno, medico_id))
+            for lista in claves.values():
+                lista.sort()
+
+            ids_medicos = {clave[3] for clave in datos}
+            medicos = {
+                medico_id: nombre_medico(nombres, paterno, materno, dni)
+                for medico_id, nombres, paterno, materno, dni in db.session.query(
+                    Usuario.id, Persona.nombres, Persona.apellido_paterno, Persona.apellido_materno, Persona.dni
+                ).join(Persona, Persona.id == Usuario.persona_id).filter(Usuario.id.in_(ids_medicos))
+            } if ids_medicos else {}
+        except Exception:
+            with self._lock:
+                self._reconstrucciones -= 1
+                if not self._reconstrucciones:
+                    self._registro.clear()
+            raise
+
+        with self._lock:
+            self._claves = dict(claves)
+            self._datos = datos
+            self._ubicacion = ubicacion
+            self._medicos.update(medicos)
+            for area_id, fecha, horario in self._registro[inicio_registro:]:
+                self._aplicar(area_id, fecha, horario)
+            self._reconstrucciones -= 1
+            if not self._reconstrucciones:
+                self._registro.clear()
+            self._vence = time.monotonic() + ttl
+
+    def _quitar(self, ubicacion):
+        area_id, fecha, turno, medico_id = ubicacion
+        self._datos.pop(ubicacion, None)
+        lista = self._claves.get(area_id)
+        if lista:
+            posicion = bisect_left(lista, (fecha, turno, medico_id))
+            if posicion < len(lista) and lista[posicion] == (fecha, turno, medico_id):
+                del lista[posicion]
+
+    def _aplicar(self, area_id, fecha, horario):
+        anterior = self._ubicacion.pop(horario["id"], None)
+        if anterior is not None:
+            self._quitar(anterior)
+        if horario.get("eliminado") or horario["cupos_disponibles"] <= 0:
+            return
+
+        ubicacion = (area_id, fecha, horario["turno"], horario["medico_id"])
+        if ubicacion not in self._datos:
+            insort(self._claves.setdefault(area_id, []), ubicacion[1:])
+        else:
+            # Un día de regla que se materializó: la entrada pasa a tener id
+            self._ubicacion.pop(self._datos[ubicacion]["id"], None)
+        self._datos[ubicacion] = horario
+        self._ubicacion[horario["id"]] = ubicacion
+
+    def aplicar(self, cambios):
+        """`cambios`: {(area_id, fecha): [datos de horario o {"id", "eliminado"}]}"""
+        with self._lock:
+            for (area_id, fecha), lista in cambios.items():
+                for horario in lista:
+                    if area_id is None:
+                        # Horario sin área: solo se quita su entrada anterior
+                        horario = {"id": horario["id"], "eliminado": True}
+                    self._aplicar(area_id, fecha, horario)
+                    if self._reconstrucciones:
+                        self._registro.append((area_id, fecha, horario))
+
+    def proximo(self, area_id, desde, turno=None, ttl=60, cantidad=1):
+        """
+        Primeros horarios con cupos libres del área desde `desde`, en orden
+        de fecha y turno. Los días de reglas sin materializar tienen id None.
+
+        Returns:
+            list: [(fecha, datos del horario), ...]
+        """
+        with self._lock:
+            # Con un índice ya construido, mientras otro hilo lo reconstruye se responde con el actual
+            vencido = self._vence <= time.monotonic() and not (self._vence and self._reconstrucciones)
+        if vencido:
+            self.reconstruir(ttl)
+
+        resultado = []
+        with self._lock:
+            lista = self._claves.get(area_id, ())
+            for posicion in range(bisect_left(lista, (desde,)), len(lista)):
+                fecha, turno_horario, medico_id = lista[posicion]
+                if turno and turno_horario != turno:
+                    continue
+                resultado.append((fecha, dict(self._datos[(area_id, fecha, turno_horario, medico_id)])))
+                if len(resultado) >= cantidad:
+                    break
+        return resultado
+
+    def nombres_medicos(self, medico_ids):
+        """Nombre de cada médico; los que no estaban al construir el índice se leen una vez."""
+        faltan = set(medico_ids) - set(self._medicos)
+        if faltan:
+            leidos = {
+                medico_id: nombre_medico(nombres, paterno, materno, dni)
+                for medico_id, nombres, paterno, materno, dni in db.session.query(
+                    Usuario.id, Persona.nombres, Persona.apellido_paterno, Persona.apellido_materno, Persona.dni
+                ).join(Persona, Persona.id == Usuario.persona_id).filter(Usuario.id.in_(faltan))
+            }
+            with self._lock:
+                self._medicos.update(leidos)
+        return {medico_id: self._medicos.get(medico_id) for medico_id in medico_ids}
+
+
+proximos = IndiceDisponibilidad()
+
+
+registrar(activo=lambda: proximos.construido, aplicar=proximos.aplicar, invalidar=proximos.invalidar)
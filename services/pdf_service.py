@@ -193,10 +193,12 @@ class PDFService:
                 nombre_completo = f"{paciente.get('apellido_paterno', '')} {paciente.get('apellido_materno', '')}, {paciente.get('nombres', '')}"
                 nombre_completo = nombre_completo.strip().strip(',').strip()
                 
-                # Horario
+                # Hora del cupo asignado; las citas sin hora muestran el rango del turno
                 hora_inicio = horario.get('hora_inicio', '')
                 hora_fin = horario.get('hora_fin', '')
-                if hora_inicio and hora_fin:
+                if cita.get('hora'):
+                    horario_str = cita['hora'][:5]
+                elif hora_inicio and hora_fin:
                     hora_inicio = hora_inicio[:5]
                     hora_fin = hora_fin[:5]
                     horario_str = f"{hora_inicio} - {hora_fin}"
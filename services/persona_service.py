@@ -0,0 +1,117 @@
+"""
+Servicio para registrar o actualizar personas por DNI.
+
+Un solo INSERT ... ON CONFLICT (dni) DO UPDATE ... RETURNING id en
+PostgreSQL y SQLite, en lugar de SELECT + INSERT/UPDATE + flush. Dos
+registros simultáneos del mismo DNI ya no chocan con la restricción única:
+el segundo actualiza la fila del primero.
+"""
+from collections import defaultdict
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from extensions.database import db
+from models.persona_model import Persona
+
+# Dialectos con INSERT ... ON CONFLICT
+_INSERT_ON_CONFLICT = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+class PersonaService:
+    """Registro de personas por DNI (individual y en bloque)."""
+
+    @staticmethod
+    def upsert(dni: str, datos: dict, por_defecto: dict = None, actualizar=None) -> int:
+        """
+        Crea la persona con DNI `dni` o actualiza la existente.
+
+        Args:
+            dni: DNI de la persona
+            datos: Columnas de Persona enviadas por el cliente
+            por_defecto: Valores que solo se usan al crear, para columnas que no vienen en `datos`
+            actualizar: Columnas de `datos` que se sobrescriben si la persona ya existe
+                (None = todas; vacío = no modificar a la persona existente)
+
+        Returns:
+            int: ID de la persona
+        """
+        return PersonaService.upsert_lote([{**datos, "dni": dni}], por_defecto, actualizar)[dni]
+
+    @staticmethod
+    def upsert_lote(filas: list, por_defecto: dict = None, actualizar=None) -> dict:
+        """
+        Crea o actualiza varias personas. Cada fila es un dict con "dni" y las
+        columnas enviadas; las filas con las mismas columnas se escriben con
+        una sola sentencia. Si un DNI se repite, vale la última fila.
+
+        Returns:
+            dict: {dni: persona_id}
+        """
+        por_dni = {fila["dni"]: fila for fila in filas}
+        grupos = defaultdict(list)
+        for fila in por_dni.values():
+            columnas = frozenset(fila) - {"dni"}
+            sobrescribir = columnas if actualizar is None else columnas & frozenset(actualizar)
+            grupos[(columnas, sobrescribir)].append({**(por_defecto or {}), **fila})
+
+        ids = {}
+        dialecto = db.session.get_bind().dialect
+        insertar = _INSERT_ON_CONFLICT.get(dialecto.name)
+        for (_, sobrescribir), valores in grupos.items():
+            if insertar is None:
+                ids.update(PersonaService._upsert_sin_on_conflict(valores, sobrescribir))
+            else:
+                ids.update(PersonaService._upsert_on_conflict(insertar, dialecto, valores, sobrescribir))
+
+        # Las instancias de Persona ya cargadas en la sesión no ven el UPDATE
+        for persona_id in ids.values():
+            persona = db.session.identity_map.get(db.session.identity_key(Persona, persona_id))
+            if persona is not None:
+                db.session.expire(persona)
+        return ids
+
+    @staticmethod
+    def _upsert_on_conflict(insertar, dialecto, valores, sobrescribir):
+        sentencia = insertar(Persona).values(valores)
+        # Sin columnas que sobrescribir se "actualiza" el propio dni para que RETURNING traiga el id
+        set_ = {c: sentencia.excluded[c] for c in sobrescribir} or {"dni": sentencia.excluded.dni}
+        sentencia = sentencia.on_conflict_do_update(index_elements=[Persona.dni], set_=set_)
+
+        if dialecto.insert_returning:
+            return {dni: persona_id for persona_id, dni in
+                    db.session.execute(sentencia.returning(Persona.id, Persona.dni))}
+
+        db.session.execute(sentencia)
+        return dict(db.session.execute(
+            select(Persona.dni, Persona.id).where(Persona.dni.in_([v["dni"] for v in valores]))
+        ).all())
+
+    @staticmethod
+    def _upsert_sin_on_conflict(valores, sobrescribir):
+        """Motores sin ON CONFLICT: SELECT y luego INSERT o UPDATE por fila."""
+        ids = {}
+        for fila in valores:
+            persona_id = db.session.execute(select(Persona.id).where(Persona.dni == fila["dni"])).scalar()
+            if persona_id is None:
+                try:
+                    with db.session.begin_nested():
+                        persona = Persona(**fila)
+                        db.session.add(persona)
+                    ids[fila["dni"]] = persona.id
+                    continue
+                except IntegrityError:
+                    # Otro proceso la registró entre el SELECT y el INSERT
+                    persona_id = db.session.execute(select(Persona.id).where(Persona.dni == fila["dni"])).scalar()
+
+            if sobrescribir:
+                db.session.execute(
+                    update(Persona).where(Persona.id == persona_id).values({c: fila[c] for c in sobrescribir}),
+                    execution_options={"synchronize_session": False}
+                )
+            ids[fila["dni"]] = persona_id
+        return ids
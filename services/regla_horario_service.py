@@ -0,0 +1,199 @@
+"""
+Horarios recurrentes (reglas) materializados bajo demanda.
+
+Una ReglaHorario describe un turno semanal de un médico; las
+ExcepcionHorario quitan o cambian una fecha concreta. Las filas de
+horarios_medicos que ya existen (creadas a mano, con
+create_horarios_mensuales o materializadas antes) siempre tienen
+prioridad sobre las reglas.
+
+- expandir: calcula en memoria los horarios que generan las reglas en un
+  rango de fechas, sin escribir nada (lecturas de disponibilidad).
+- materializar: inserta las filas que falten del rango con
+  INSERT ... ON CONFLICT DO NOTHING, para que tengan id y se puedan
+  reservar. Dos peticiones simultáneas sobre el mismo rango no chocan.
+  Las lecturas usan materializar_aparte, que lo hace en una transacción
+  propia sin confirmar la sesión de la petición.
+"""
+from datetime import timedelta
+
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from extensions.database import db
+from models.horario_medico_model import HorarioMedico
+from models.regla_horario_model import ReglaHorario, ExcepcionHorario
+
+# Dialectos con INSERT ... ON CONFLICT
+_INSERT_ON_CONFLICT = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+class ReglaHorarioService:
+    """Expansión y materialización de las reglas de horario."""
+
+    @staticmethod
+    def expandir(desde, hasta, medico_id=None, area_id=None):
+        """
+        Horarios que generan las reglas entre `desde` y `hasta` (inclusive),
+        con las excepciones aplicadas. No considera las filas existentes.
+
+        Returns:
+            dict: {(medico_id, fecha, turno): (area_id, cupos, regla_id)}
+        """
+        query = ReglaHorario.query.filter(
+            ReglaHorario.fecha_inicio <= hasta,
+            db.or_(ReglaHorario.fecha_fin.is_(None), ReglaHorario.fecha_fin >= desde)
+        )
+        excepciones = ExcepcionHorario.query.filter(
+            ExcepcionHorario.fecha >= desde,
+            ExcepcionHorario.fecha <= hasta
+        )
+        if medico_id:
+            query = query.filter(ReglaHorario.medico_id == medico_id)
+            excepciones = excepciones.filter(ExcepcionHorario.medico_id == medico_id)
+
+        horarios = {}
+        for regla in query.order_by(ReglaHorario.id):
+            fecha = max(desde, regla.fecha_inicio)
+            fin = min(hasta, regla.fecha_fin) if regla.fecha_fin else hasta
+            while fecha <= fin:
+                if regla.aplica(fecha):
+                    horarios[(regla.medico_id, fecha, regla.turno)] = (regla.area_id, regla.cupos, regla.id)
+                fecha += timedelta(days=1)
+
+        for excepcion in excepciones.order_by(ExcepcionHorario.turno.isnot(None)):
+            turnos = (excepcion.turno,) if excepcion.turno else ("M", "T")
+            for turno in turnos:
+                clave = (excepcion.medico_id, excepcion.fecha, turno)
+                if excepcion.sin_atencion:
+                    horarios.pop(clave, None)
+                    continue
+                actual = horarios.get(clave)
+                if actual is None and (excepcion.area_id is None or excepcion.cupos is None):
+                    # Un cambio sobre un día sin regla necesita área y cupos
+                    continue
+                area, cupos, regla_id = actual or (None, None, None)
+                horarios[clave] = (
+                    excepcion.area_id if excepcion.area_id is not None else area,
+                    excepcion.cupos if excepcion.cupos is not None else cupos,
+                    regla_id
+                )
+
+        if area_id:
+            horarios = {clave: datos for clave, datos in horarios.items() if datos[0] == int(area_id)}
+        return horarios
+
+    @staticmethod
+    def pendientes(desde, hasta, medico_id=None, area_id=None):
+        """Horarios de las reglas que todavía no tienen fila en horarios_medicos."""
+        horarios = ReglaHorarioService.expandir(desde, hasta, medico_id, area_id)
+        if not horarios:
+            return {}
+
+        existentes = db.session.query(
+            HorarioMedico.medico_id, HorarioMedico.fecha, HorarioMedico.turno
+        ).filter(
+            HorarioMedico.medico_id.in_({medico for medico, _, _ in horarios}),
+            HorarioMedico.fecha >= desde,
+            HorarioMedico.fecha <= hasta
+        )
+        for clave in existentes:
+            horarios.pop(tuple(clave), None)
+        return horarios
+
+    @staticmethod
+    def _filas(horarios):
+        return [
+            {
+                "medico_id": medico, "area_id": area, "fecha": fecha, "dia_semana": fecha.weekday(),
+                "turno": turno, "cupos": cupos, "ocupados": 0, "regla_id": regla_id
+            }
+            for (medico, fecha, turno), (area, cupos, regla_id) in sorted(horarios.items())
+        ]
+
+    @staticmethod
+    def _insertar(ejecutor, dialecto, filas):
+        """Inserta `filas` por la sesión o conexión `ejecutor`, omitiendo las que ya existen."""
+        insertar = _INSERT_ON_CONFLICT.get(dialecto.name)
+        if insertar is not None:
+            sentencia = insertar(HorarioMedico.__table__).on_conflict_do_nothing(
+                index_elements=["medico_id", "fecha", "turno"]
+            )
+            return ejecutor.execute(sentencia, filas).rowcount
+
+        # Motores sin ON CONFLICT: una inserción por fila dentro de un savepoint
+        creados = 0
+        for fila in filas:
+            try:
+                with ejecutor.begin_nested():
+                    ejecutor.execute(insert(HorarioMedico.__table__).values(fila))
+                creados += 1
+            except IntegrityError:
+                pass
+        return creados
+
+    @staticmethod
+    def materializar(desde, hasta, medico_id=None, area_id=None):
+        """
+        Crea las filas de horarios_medicos que las reglas generan en el rango
+        y todavía no existen. No confirma la transacción.
+
+        Returns:
+            int: Cantidad de horarios creados
+        """
+        horarios = ReglaHorarioService.pendientes(desde, hasta, medico_id, area_id)
+        if not horarios:
+            return 0
+        return ReglaHorarioService._insertar(
+            db.session, db.session.get_bind().dialect, ReglaHorarioService._filas(horarios)
+        )
+
+    @staticmethod
+    def materializar_aparte(desde, hasta, medico_id=None, area_id=None):
+        """
+        Como materializar, pero inserta en una transacción propia
+        (engine.begin()) que se confirma de inmediato. Para las lecturas:
+        no confirma la sesión de la petición ni dispara sus eventos de
+        confirmación (publicación de disponibilidad, cachés).
+
+        Returns:
+            int: Cantidad de horarios creados
+        """
+        horarios = ReglaHorarioService.pendientes(desde, hasta, medico_id, area_id)
+        if not horarios:
+            return 0
+        with db.engine.begin() as conexion:
+            return ReglaHorarioService._insertar(conexion, conexion.dialect, ReglaHorarioService._filas(horarios))
+
+    @staticmethod
+    def descartar_materializados(desde, medico_id, fecha=None, turno=None, regla_id=None):
+        """
+        Elimina las filas generadas por reglas sin cupos ocupados (desde
+        `desde` o solo en `fecha`), para que se vuelvan a generar con las
+        reglas vigentes. Las que ya tienen citas se conservan.
+        """
+        query = HorarioMedico.query.filter(
+            HorarioMedico.medico_id == medico_id,
+            HorarioMedico.regla_id.isnot(None),
+            HorarioMedico.ocupados == 0
+        )
+        if fecha is not None:
+            query = query.filter(HorarioMedico.fecha == fecha)
+        else:
+            query = query.filter(HorarioMedico.fecha >= desde)
+        if turno:
+            query = query.filter(HorarioMedico.turno == turno)
+        if regla_id is not None:
+            query = query.filter(HorarioMedico.regla_id == regla_id)
+
+        # El DELETE masivo no dispara eventos del ORM: anotar los horarios para el stream
+        HorarioMedico.marcar_eliminados(
+            query.with_entities(
+                HorarioMedico.id, HorarioMedico.area_id, HorarioMedico.fecha, HorarioMedico.medico_id
+            ).all()
+        )
+        return query.delete(synchronize_session=False)
@@ -0,0 +1,157 @@
+"""
+Datos de prueba para los scripts de verificación de tests/.
+
+Crea una app contra la base indicada en SQLALCHEMY_DATABASE_URI
+(por defecto SQLite en memoria) y la llena con roles, estados, áreas,
+médicos, horarios, pacientes y citas.
+
+Uso:
+    from seed_data import crear_app_prueba, sembrar
+    app = crear_app_prueba()
+    with app.app_context():
+        sembrar(num_citas=200)
+"""
+import os
+import sys
+import random
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("SQLALCHEMY_DATABASE_URI", "sqlite://")
+
+ESTADOS = [
+    ("pendiente", "orange"),
+    ("confirmada", "green"),
+    ("atendida", "blue"),
+    ("cancelada", "red"),
+    ("referido", "purple"),
+    ("no_asistio", "gray"),
+]
+
+
+def crear_app_prueba():
+    from factory import create_app
+    from extensions.database import db
+
+    app = create_app("development")
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def _persona(dni, nombres):
+    from models.persona_model import Persona
+    return Persona(
+        dni=dni,
+        nombres=nombres,
+        apellido_paterno="PRUEBA",
+        apellido_materno="DATOS",
+        fecha_nacimiento=date(1990, 1, 1),
+        sexo="M",
+        telefono="999999999",
+        direccion="Av. Principal 123"
+    )
+
+
+def sembrar(num_medicos=4, num_pacientes=50, num_citas=200, dias=30, cupos=20, semilla=7):
+    """
+    Inserta un conjunto de datos reproducible y retorna un resumen con los ids creados.
+    """
+    from extensions.database import db
+    from models.rol_model import Rol
+    from models.estado_cita_model import EstadoCita
+    from models.area_model import Area
+    from models.usuario_model import Usuario
+    from models.paciente_model import Paciente
+    from models.horario_medico_model import HorarioMedico
+    from models.cita_model import Cita
+
+    rnd = random.Random(semilla)
+
+    for rol_id, nombre in [(1, "Administrador"), (2, "Profesional"), (3, "Asistente")]:
+        if not db.session.get(Rol, rol_id):
+            db.session.add(Rol(id=rol_id, nombre=nombre))
+
+    estados = {}
+    for nombre, color in ESTADOS:
+        estado = EstadoCita.query.filter_by(nombre=nombre).first()
+        if not estado:
+            estado = EstadoCita(nombre=nombre, color=color)
+            db.session.add(estado)
+        estados[nombre] = estado
+
+    areas = [Area(nombre=f"Area {i}") for i in range(1, 4)]
+    db.session.add_all(areas)
+    db.session.flush()
+
+    medicos = []
+    for i in range(num_medicos):
+        persona = _persona(f"1{i:07d}", f"MEDICO {i}")
+        db.session.add(persona)
+        db.session.flush()
+        medico = Usuario(persona_id=persona.id, password="x", rol_id=2, activo=True)
+        db.session.add(medico)
+        medicos.append(medico)
+
+    pacientes = []
+    for i in range(num_pacientes):
+        persona = _persona(f"2{i:07d}", f"PACIENTE {i}")
+        db.session.add(persona)
+        db.session.flush()
+        paciente = Paciente(persona_id=persona.id, estado_civil="S", fecha_registro=datetime(2024, 1, 1) + timedelta(hours=i))
+        db.session.add(paciente)
+        pacientes.append(paciente)
+    db.session.flush()
+
+    inicio = date.today() - timedelta(days=dias // 2)
+    horarios = []
+    for medico_idx, medico in enumerate(medicos):
+        area = areas[medico_idx % len(areas)]
+        for d in range(dias):
+            fecha = inicio + timedelta(days=d)
+            for turno in ("M", "T"):
+                horarios.append(HorarioMedico(
+                    medico_id=medico.id,
+                    area_id=area.id,
+                    fecha=fecha,
+                    dia_semana=fecha.weekday(),
+                    turno=turno,
+                    cupos=cupos
+                ))
+    db.session.add_all(horarios)
+    db.session.flush()
+
+    nombres_estados = [nombre for nombre, _ in ESTADOS]
+    citas = []
+    for i in range(num_citas):
+        horario = rnd.choice(horarios)
+        acompanante_id = None
+        if i % 5 == 0:
+            acompanante = _persona(f"3{i:07d}", f"ACOMPANANTE {i}")
+            db.session.add(acompanante)
+            db.session.flush()
+            acompanante_id = acompanante.id
+        citas.append(Cita(
+            paciente_id=rnd.choice(pacientes).id,
+            horario_id=horario.id,
+            doctor_id=horario.medico_id,
+            area_id=horario.area_id,
+            fecha=horario.fecha,
+            sintomas="Dolor de cabeza",
+            acompanante_persona_id=acompanante_id,
+            estado_id=estados[rnd.choice(nombres_estados)].id,
+            fecha_registro=datetime.combine(horario.fecha, datetime.min.time()) - timedelta(hours=rnd.randint(1, 240))
+        ))
+    db.session.add_all(citas)
+    db.session.flush()
+    HorarioMedico.recalcular_ocupados()
+    db.session.commit()
+
+    return {
+        "areas": [a.id for a in areas],
+        "medicos": [m.id for m in medicos],
+        "pacientes": [p.id for p in pacientes],
+        "estados": {nombre: e.id for nombre, e in estados.items()},
+        "fecha_inicio": inicio,
+        "dias": dias,
+    }
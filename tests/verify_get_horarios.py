@@ -0,0 +1,127 @@
+"""
+Benchmark de HorarioController.get_horarios a medida que crece la tabla citas.
+
+Los cupos ocupados se leen del contador HorarioMedico.ocupados, así que el
+endpoint solo debe leer los horarios filtrados: ninguna consulta toca
+citas y la latencia de una consulta por fecha o por mes no depende de
+cuántas citas existan.
+
+Uso: python tests/verify_get_horarios.py
+"""
+import random
+import re
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from seed_data import crear_app_prueba, sembrar
+
+TAMANOS = [1_000, 20_000, 100_000, 200_000]
+REPETICIONES = 30
+# Latencia máxima permitida respecto de la medición con menos citas
+TOLERANCIA = 2.0
+
+
+def agregar_citas(cantidad, horarios, pacientes, estado_id, semilla):
+    """Inserta `cantidad` citas con un solo executemany."""
+    from extensions.database import db
+    from models.cita_model import Cita
+
+    rnd = random.Random(semilla)
+    filas = []
+    for _ in range(cantidad):
+        horario_id, medico_id, area_id, fecha = rnd.choice(horarios)
+        filas.append({
+            "paciente_id": rnd.choice(pacientes),
+            "horario_id": horario_id,
+            "doctor_id": medico_id,
+            "area_id": area_id,
+            "fecha": fecha,
+            "sintomas": "Control",
+            "estado_id": estado_id,
+            "fecha_registro": datetime.combine(fecha, datetime.min.time()) - timedelta(hours=1),
+        })
+    db.session.execute(Cita.__table__.insert(), filas)
+    db.session.commit()
+
+
+def medir(app, url):
+    """Mediana en ms de REPETICIONES llamadas y sentencias que leen citas."""
+    from sqlalchemy import event
+    from extensions.database import db
+    from controllers.horario_controller import HorarioController
+
+    sentencias = []
+
+    def _registrar(conn, cursor, statement, parameters, context, executemany):
+        sentencias.append(statement)
+
+    tiempos = []
+    event.listen(db.engine, "before_cursor_execute", _registrar)
+    try:
+        for _ in range(REPETICIONES):
+            with app.test_request_context(url):
+                db.session.expunge_all()
+                inicio = time.perf_counter()
+                response, status = HorarioController.get_horarios()
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            assert status == 200, response.get_json()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", _registrar)
+
+    leen_citas = [s for s in sentencias if re.search(r"\bcitas\b", s)]
+    return statistics.median(tiempos), leen_citas, len(response.get_json())
+
+
+def verify_get_horarios():
+    print("--- Benchmark de get_horarios vs tamaño de citas ---")
+    app = crear_app_prueba()
+
+    from extensions.database import db
+    from models.horario_medico_model import HorarioMedico
+
+    with app.app_context():
+        info = sembrar(num_medicos=10, num_pacientes=200, num_citas=TAMANOS[0], dias=120)
+        horarios = db.session.query(
+            HorarioMedico.id, HorarioMedico.medico_id, HorarioMedico.area_id, HorarioMedico.fecha
+        ).all()
+        fecha = info["fecha_inicio"] + timedelta(days=info["dias"] // 2)
+        casos = [
+            ("fecha + area", f"/api/horarios?fecha={fecha}&area_id={info['areas'][0]}"),
+            ("mes + medico", f"/api/horarios?mes={fecha:%Y-%m}&medico_id={info['medicos'][0]}"),
+        ]
+
+        resultados = {descripcion: [] for descripcion, _ in casos}
+        fallos = 0
+        total = TAMANOS[0]
+        for paso, tamano in enumerate(TAMANOS):
+            if tamano > total:
+                agregar_citas(tamano - total, horarios, info["pacientes"], info["estados"]["pendiente"], paso)
+                total = tamano
+
+            for descripcion, url in casos:
+                mediana, leen_citas, filas = medir(app, url)
+                resultados[descripcion].append(mediana)
+                print(f"  {total:>7} citas | {descripcion:<13} | {filas:>3} horarios | {mediana:6.2f} ms")
+                if leen_citas:
+                    fallos += 1
+                    print(f"ERR {descripcion}: consulta sobre citas: {' '.join(leen_citas[0].split())[:150]}")
+
+        for descripcion, tiempos in resultados.items():
+            relacion = max(tiempos) / tiempos[0]
+            if relacion > TOLERANCIA:
+                fallos += 1
+                print(f"ERR {descripcion}: la latencia creció {relacion:.1f}x con {TAMANOS[-1]} citas")
+            else:
+                print(f"OK  {descripcion}: latencia estable ({relacion:.2f}x de {TAMANOS[0]} a {TAMANOS[-1]} citas)")
+
+    if fallos:
+        print(f"Failure: {fallos} problemas")
+        return False
+    print("Success: get_horarios no depende del tamaño de citas")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if verify_get_horarios() else 1)
@@ -0,0 +1,152 @@
+"""
+Verifica que las consultas principales de CitaController, HorarioController
+e IndicadorController usen índices y no recorran completas las tablas grandes.
+
+Captura el SQL que ejecuta cada endpoint sobre un conjunto de datos sembrado
+y corre EXPLAIN (PostgreSQL) o EXPLAIN QUERY PLAN (SQLite) sobre cada sentencia.
+
+Uso:
+    python tests/verify_indices.py
+    SQLALCHEMY_DATABASE_URI=postgresql://... python tests/verify_indices.py
+"""
+import re
+import sys
+from datetime import timedelta
+
+from seed_data import crear_app_prueba, sembrar
+
+TABLAS_GRANDES = {"citas", "horarios_medicos", "historial_estado_citas"}
+
+
+def capturar_sentencias(app, engine, url, funcion, *args, method="GET", json=None):
+    from sqlalchemy import event
+
+    sentencias = []
+
+    def _registrar(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            sentencias.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", _registrar)
+    try:
+        with app.test_request_context(url, method=method, json=json):
+            respuesta = funcion(*args)
+    finally:
+        event.remove(engine, "before_cursor_execute", _registrar)
+
+    status = respuesta[1] if isinstance(respuesta, tuple) else respuesta.status_code
+    assert status < 300, f"{url} -> {status}"
+    return sentencias
+
+
+def recorridos_secuenciales(engine, statement, parameters, tablas):
+    """Retorna las tablas de `tablas` que el plan recorre completas."""
+    with engine.connect() as conn:
+        cursor = conn.connection.cursor()
+        if engine.dialect.name == "sqlite":
+            cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+            plan = [fila[-1] for fila in cursor.fetchall()]
+            patron = re.compile(r"^SCAN (\w+)")
+        else:
+            cursor.execute("EXPLAIN " + statement, parameters)
+            plan = [fila[0] for fila in cursor.fetchall()]
+            patron = re.compile(r"Seq Scan on (\w+)")
+
+    encontrados = set()
+    for linea in plan:
+        match = patron.search(linea.strip())
+        if match and match.group(1) in tablas:
+            encontrados.add(match.group(1))
+    return encontrados
+
+
+def verify_indices():
+    print("--- Verificando planes de ejecución ---")
+    app = crear_app_prueba()
+
+    from extensions.database import db
+    from controllers.cita_controller import CitaController
+    from controllers.horario_controller import HorarioController
+    from controllers.indicador_controller import IndicadorController
+    from models.horario_medico_model import HorarioMedico
+    from models.cita_model import Cita
+
+    with app.app_context():
+        info = sembrar(num_medicos=10, num_pacientes=500, num_citas=20000, dias=365)
+        engine = db.engine
+        # Estadísticas actualizadas para que el planificador elija como en producción
+        db.session.execute(db.text("ANALYZE"))
+        db.session.commit()
+
+        area_id = info["areas"][0]
+        fecha = info["fecha_inicio"] + timedelta(days=info["dias"] // 2)
+        fin = fecha + timedelta(days=30)
+        horario = HorarioMedico.query.filter_by(area_id=area_id, fecha=fecha).first()
+        cita = Cita.query.filter_by(horario_id=horario.id).first() or Cita.query.first()
+
+        # (descripción, sentencias, tablas que no deben recorrerse completas)
+        casos = [
+            ("CitaController.listar fecha+area+estado",
+             capturar_sentencias(app, engine, f"/api/citas?fecha={fecha}&area_id={area_id}&estado=confirmada",
+                                 CitaController.listar),
+             {"citas"}),
+            ("CitaController.listar fecha_registro",
+             capturar_sentencias(app, engine, f"/api/citas?fecha_registro={fecha}", CitaController.listar),
+             {"citas"}),
+            ("CitaController.listar doctor",
+             capturar_sentencias(app, engine, f"/api/citas?doctor_id={horario.medico_id}&fecha={fecha}",
+                                 CitaController.listar),
+             {"citas"}),
+            ("CitaController.obtener_historial",
+             capturar_sentencias(app, engine, f"/api/citas/{cita.id}/historial",
+                                 CitaController.obtener_historial, cita.id),
+             TABLAS_GRANDES),
+            ("CitaController.crear (reserva de cupo)",
+             capturar_sentencias(app, engine, "/api/citas", CitaController.crear, method="POST", json={
+                 "paciente_id": info["pacientes"][0],
+                 "horario_id": horario.id,
+                 "fecha": str(fecha),
+                 "sintomas": "Control"
+             }),
+             {"citas", "horarios_medicos"}),
+            ("HorarioController.get_horarios area+fecha",
+             capturar_sentencias(app, engine, f"/api/horarios?area_id={area_id}&fecha={fecha}",
+                                 HorarioController.get_horarios),
+             {"horarios_medicos"}),
+            ("HorarioController.get_disponibilidad_mes",
+             capturar_sentencias(app, engine, f"/api/horarios/disponibilidad?area_id={area_id}&mes={fecha:%Y-%m}",
+                                 HorarioController.get_disponibilidad_mes),
+             {"horarios_medicos"}),
+            ("HorarioController.get_horarios_resumen_mes",
+             capturar_sentencias(app, engine, f"/api/horarios/resumen?medico_id={horario.medico_id}&mes={fecha:%Y-%m}",
+                                 HorarioController.get_horarios_resumen_mes),
+             {"horarios_medicos"}),
+            ("IndicadorController.obtener_indicadores",
+             capturar_sentencias(app, engine,
+                                 f"/api/indicadores?fecha_inicio={fecha}&fecha_fin={fin}&area_id={area_id}",
+                                 IndicadorController.obtener_indicadores),
+             TABLAS_GRANDES),
+        ]
+
+        fallos = 0
+        for descripcion, sentencias, tablas in casos:
+            fallos_caso = 0
+            for statement, parameters in sentencias:
+                recorridas = recorridos_secuenciales(engine, statement, parameters, tablas)
+                if recorridas:
+                    fallos_caso += 1
+                    print(f"ERR {descripcion}: recorrido completo de {', '.join(sorted(recorridas))}")
+                    print("    " + " ".join(statement.split())[:200])
+            if not fallos_caso:
+                print(f"OK  {descripcion}: {len(sentencias)} consultas revisadas")
+            fallos += fallos_caso
+
+    if fallos:
+        print(f"Failure: {fallos} consultas sin índice")
+        return False
+    print("Success: todas las consultas usan índices")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if verify_indices() else 1)
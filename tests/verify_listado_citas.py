@@ -0,0 +1,74 @@
+"""
+Verifica que GET /api/citas ejecute un número fijo de consultas
+sin importar el tamaño de la página (sin N+1 por cita).
+
+Uso: python tests/verify_listado_citas.py
+"""
+import sys
+from contextlib import contextmanager
+
+from seed_data import crear_app_prueba, sembrar
+
+MAX_CONSULTAS = 1  # Un SELECT con relaciones cargadas y total por COUNT(*) OVER ()
+
+
+@contextmanager
+def contar_consultas(engine):
+    consultas = []
+
+    def _registrar(conn, cursor, statement, parameters, context, executemany):
+        consultas.append(statement)
+
+    from sqlalchemy import event
+    event.listen(engine, "before_cursor_execute", _registrar)
+    try:
+        yield consultas
+    finally:
+        event.remove(engine, "before_cursor_execute", _registrar)
+
+
+def consultas_listado(app, query_string):
+    from extensions.database import db
+    from controllers.cita_controller import CitaController
+
+    with app.test_request_context(f"/api/citas?{query_string}"):
+        db.session.expunge_all()
+        with contar_consultas(db.engine) as consultas:
+            response, status = CitaController.listar()
+        assert status == 200, response.get_json()
+        return len(consultas), len(response.get_json()["data"])
+
+
+def verify_listado_citas():
+    print("--- Verificando consultas de CitaController.listar ---")
+    app = crear_app_prueba()
+    with app.app_context():
+        sembrar(num_citas=300)
+        # Como al iniciar la app: el catálogo de estados queda cargado en memoria
+        from models.estado_cita_model import EstadoCita
+        EstadoCita.catalogo()
+
+    fallos = 0
+    casos = [
+        "per_page=5",
+        "per_page=50",
+        "per_page=200",
+        "per_page=50&estado=confirmada",
+        "per_page=50&paciente_dni=2&turno=M",
+    ]
+    with app.app_context():
+        for query_string in casos:
+            total, filas = consultas_listado(app, query_string)
+            ok = total <= MAX_CONSULTAS
+            fallos += 0 if ok else 1
+            print(f"{'OK ' if ok else 'ERR'} {query_string}: {filas} citas, {total} consultas")
+
+    if fallos:
+        print(f"Failure: {fallos} casos superan {MAX_CONSULTAS} consultas")
+        return False
+    print("Success: el listado usa un número fijo de consultas")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if verify_listado_citas() else 1)
@@ -0,0 +1,190 @@
+"""
+Verifica que las consultas por fecha de IndicadorController, dashboard y
+CitaController.listar solo lean las particiones mensuales de citas que
+corresponden al rango pedido (partition pruning), y que sin las FK hacia
+citas eliminar (CitaController.eliminar) y archivar citas
+(ArchivoService.archivar_lote) no deje historial ni lista de espera
+apuntando a citas inexistentes.
+
+Solo aplica a PostgreSQL: siembra datos, particiona las tablas con
+migrate_particiones.py y corre EXPLAIN sobre el SQL que ejecuta cada
+endpoint. La partición DEFAULT siempre se admite.
+
+Uso:
+    SQLALCHEMY_DATABASE_URI=postgresql://.../base_de_prueba python tests/verify_particiones.py
+"""
+import re
+import sys
+from datetime import date, timedelta
+
+from seed_data import crear_app_prueba, sembrar
+
+
+def capturar_sentencias(app, engine, url, funcion, *args):
+    from sqlalchemy import event
+
+    sentencias = []
+
+    def _registrar(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "citas" in statement:
+            sentencias.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", _registrar)
+    try:
+        with app.test_request_context(url):
+            funcion(*args)
+    finally:
+        event.remove(engine, "before_cursor_execute", _registrar)
+    return sentencias
+
+
+def particiones_leidas(engine, statement, parameters):
+    """Particiones de citas que aparecen en el plan."""
+    with engine.connect() as conn:
+        cursor = conn.connection.cursor()
+        cursor.execute("EXPLAIN " + statement, parameters)
+        plan = "\n".join(fila[0] for fila in cursor.fetchall())
+    return set(re.findall(r" on (citas_(?:\d{4}_\d{2}|default))\b", plan))
+
+
+def particiones_del_rango(inicio, fin):
+    nombres = {"citas_default"}
+    mes = date(inicio.year, inicio.month, 1)
+    while mes <= fin:
+        nombres.add(f"citas_{mes:%Y_%m}")
+        mes = date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+    return nombres
+
+
+def huerfanos(conn):
+    """Filas de historial_estado_citas y lista_espera cuya cita ya no existe."""
+    from sqlalchemy import text
+
+    historial = conn.execute(text(
+        "SELECT count(*) FROM historial_estado_citas h "
+        "WHERE NOT EXISTS (SELECT 1 FROM citas c WHERE c.id = h.cita_id)"
+    )).scalar()
+    espera = conn.execute(text(
+        "SELECT count(*) FROM lista_espera l "
+        "WHERE l.cita_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM citas c WHERE c.id = l.cita_id)"
+    )).scalar()
+    return historial, espera
+
+
+def verificar_integridad(app):
+    """Elimina y archiva citas con historial y lista de espera; retorna la cantidad de fallos."""
+    from extensions.database import db
+    from controllers.cita_controller import CitaController
+    from models.cita_model import Cita
+    from models.historial_estado_cita_model import HistorialEstadoCita
+    from models.lista_espera_model import ListaEspera
+    from services.archivo_service import ArchivoService, fecha_corte
+
+    # Una cita reciente (para eliminar) y las más antiguas (para archivar), con historial y lista de espera
+    corte = fecha_corte(3)
+    citas = [Cita.query.filter(Cita.fecha >= date.today()).order_by(Cita.id).first()]
+    citas += Cita.query.filter(Cita.fecha < corte).order_by(Cita.id).limit(5).all()
+    for cita in citas:
+        db.session.add(HistorialEstadoCita(cita_id=cita.id, estado_nuevo_id=cita.estado_id))
+        db.session.add(ListaEspera(
+            paciente_id=cita.paciente_id, area_id=cita.area_id, fecha=cita.fecha,
+            sintomas="Control", estado=ListaEspera.PROMOVIDA, cita_id=cita.id
+        ))
+    db.session.commit()
+    eliminada = citas[0].id
+
+    with app.test_request_context(f"/api/citas/{eliminada}", method="DELETE"):
+        respuesta, status = CitaController.eliminar(eliminada)
+    ArchivoService.archivar_lote(corte)
+
+    with db.engine.connect() as conn:
+        historial, espera = huerfanos(conn)
+    ok = status == 200 and not historial and not espera
+    print(f"{'OK ' if ok else 'ERR'} integridad sin FK hacia citas: eliminar -> {status}, "
+          f"{historial} historial y {espera} lista de espera huérfanos")
+    return 0 if ok else 1
+
+
+def verify_particiones():
+    print("--- Verificando partition pruning ---")
+    app = crear_app_prueba()
+
+    from extensions.database import db
+
+    with app.app_context():
+        if db.engine.dialect.name != "postgresql":
+            print("Solo PostgreSQL: defina SQLALCHEMY_DATABASE_URI con una base de prueba")
+            return True
+
+        from migrate_particiones import TABLAS, convertir_tabla, esta_particionada
+        from controllers.cita_controller import CitaController
+        from controllers.indicador_controller import IndicadorController
+        from controllers import dashboard_controller
+
+        info = sembrar(num_medicos=10, num_pacientes=500, num_citas=20000, dias=365)
+        with db.engine.begin() as conn:
+            for tabla, (modelo, columna) in TABLAS.items():
+                if not esta_particionada(conn, tabla):
+                    convertir_tabla(conn, tabla, modelo, columna)
+
+        engine = db.engine
+        area_id = info["areas"][0]
+        fecha = info["fecha_inicio"] + timedelta(days=info["dias"] // 2)
+        fin = fecha + timedelta(days=30)
+        hoy = date.today()
+        ultimo = info["fecha_inicio"] + timedelta(days=info["dias"])
+
+        # (descripción, sentencias, particiones permitidas)
+        casos = [
+            ("CitaController.listar fecha",
+             capturar_sentencias(app, engine, f"/api/citas?fecha={fecha}&area_id={area_id}", CitaController.listar),
+             particiones_del_rango(fecha, fecha)),
+            ("CitaController.listar fecha_inicio/fecha_fin",
+             capturar_sentencias(app, engine, f"/api/citas?fecha_inicio={fecha}&fecha_fin={fin}",
+                                 CitaController.listar),
+             particiones_del_rango(fecha, fin)),
+            ("IndicadorController.obtener_indicadores",
+             capturar_sentencias(app, engine, f"/api/indicadores?fecha_inicio={fecha}&fecha_fin={fin}",
+                                 IndicadorController.obtener_indicadores),
+             particiones_del_rango(fecha, fin)),
+            ("IndicadorController.obtener_indicadores_por_periodo",
+             capturar_sentencias(app, engine,
+                                 f"/api/indicadores/tendencia?fecha_inicio={fecha}&fecha_fin={fin}&agrupacion=semana",
+                                 IndicadorController.obtener_indicadores_por_periodo),
+             particiones_del_rango(fecha, fin)),
+            ("IndicadorController.obtener_indicadores_por_area",
+             capturar_sentencias(app, engine, f"/api/indicadores/por-area?fecha_inicio={fecha}&fecha_fin={fin}",
+                                 IndicadorController.obtener_indicadores_por_area),
+             particiones_del_rango(fecha, fin)),
+            ("dashboard citas por especialidad (hoy)",
+             capturar_sentencias(app, engine, "/api/dashboard", dashboard_controller.get_appointments_by_specialty_today),
+             particiones_del_rango(hoy, hoy)),
+            ("dashboard próximas citas",
+             capturar_sentencias(app, engine, "/api/dashboard", dashboard_controller.get_upcoming_appointments),
+             particiones_del_rango(hoy, max(hoy, ultimo))),
+        ]
+
+        fallos = 0
+        for descripcion, sentencias, permitidas in casos:
+            fallos_caso = 0
+            for statement, parameters in sentencias:
+                extra = particiones_leidas(engine, statement, parameters) - permitidas
+                if extra:
+                    fallos_caso += 1
+                    print(f"ERR {descripcion}: lee {', '.join(sorted(extra))}")
+                    print("    " + " ".join(statement.split())[:200])
+            if not fallos_caso:
+                print(f"OK  {descripcion}: {len(sentencias)} consultas revisadas")
+            fallos += fallos_caso
+
+        fallos += verificar_integridad(app)
+
+    if fallos:
+        print(f"Failure: {fallos} consultas leen particiones fuera del rango")
+        return False
+    print("Success: las consultas por fecha solo leen las particiones del rango y no quedan filas huérfanas")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if verify_particiones() else 1)
@@ -0,0 +1,124 @@
+"""
+Verifica GET /api/horarios/proximo-disponible.
+
+- El índice en memoria responde lo mismo que una consulta directa a
+  horarios_medicos para varias áreas, fechas y turnos.
+- Con el índice construido la búsqueda no ejecuta consultas.
+- Reservar el último cupo de un horario y liberarlo actualiza el índice al
+  confirmar, sin reconstruirlo.
+- Un día generado por una regla recurrente se crea al elegirlo y la
+  respuesta trae su id.
+
+Uso: python tests/verify_proximo_disponible.py
+"""
+import sys
+from datetime import date, timedelta
+
+from seed_data import crear_app_prueba, sembrar
+from verify_listado_citas import contar_consultas
+
+
+def buscar(app, query_string):
+    from controllers.horario_controller import HorarioController
+
+    with app.test_request_context(f"/api/horarios/proximo-disponible?{query_string}"):
+        response, status = HorarioController.get_proximo_disponible()
+    assert status == 200, response.get_json()
+    return response.get_json()["horario"]
+
+
+def esperado(area_id, desde, turno=None):
+    """Primer horario con cupos libres según la base: (fecha, turno, medico_id) o None."""
+    from models.horario_medico_model import HorarioMedico
+
+    query = HorarioMedico.query.filter(
+        HorarioMedico.area_id == area_id,
+        HorarioMedico.fecha >= desde,
+        HorarioMedico.ocupados < HorarioMedico.cupos
+    )
+    if turno:
+        query = query.filter(HorarioMedico.turno == turno)
+    horario = query.order_by(HorarioMedico.fecha, HorarioMedico.turno, HorarioMedico.medico_id).first()
+    return (str(horario.fecha), horario.turno, horario.medico_id) if horario else None
+
+
+def clave(horario):
+    return (horario["fecha"], horario["turno"], horario["medico_id"]) if horario else None
+
+
+def verify_proximo_disponible():
+    print("--- Verificando próximo cupo disponible ---")
+    app = crear_app_prueba()
+
+    from extensions.database import db
+    from models.horario_medico_model import HorarioMedico
+    from models.regla_horario_model import ReglaHorario
+    from services.indice_disponibilidad import proximos
+
+    fallos = 0
+
+    def comprobar(descripcion, ok, detalle=""):
+        nonlocal fallos
+        fallos += 0 if ok else 1
+        print(f"{'OK ' if ok else 'ERR'} {descripcion}{': ' + detalle if detalle else ''}")
+
+    with app.app_context():
+        # Pocos cupos para que haya horarios llenos entre los libres
+        info = sembrar(num_medicos=6, num_citas=600, dias=40, cupos=3)
+        hoy = date.today()
+        proximos.reconstruir(app.config["PROXIMO_DISPONIBLE_SEGUNDOS"])
+
+        for area_id in info["areas"]:
+            for dias in (0, 3, 10):
+                for turno in (None, "M", "T"):
+                    desde = hoy + timedelta(days=dias)
+                    query_string = f"area_id={area_id}&desde={desde}" + (f"&turno={turno}" if turno else "")
+                    obtenido = clave(buscar(app, query_string))
+                    correcto = esperado(area_id, desde, turno)
+                    comprobar(query_string, obtenido == correcto, f"{obtenido} (esperado {correcto})")
+
+        area_id = info["areas"][0]
+        db.session.expunge_all()
+        with contar_consultas(db.engine) as consultas:
+            buscar(app, f"area_id={area_id}")
+        comprobar("búsqueda sin consultas", not consultas, f"{len(consultas)} consultas")
+
+        # Llenar el primer horario libre: el siguiente pasa a ser otro
+        horario = buscar(app, f"area_id={area_id}")
+        HorarioMedico.reservar_cupo(horario["id"], horario["cupos_disponibles"])
+        db.session.commit()
+        siguiente = buscar(app, f"area_id={area_id}")
+        comprobar("reserva actualiza el índice",
+                  siguiente["id"] != horario["id"] and clave(siguiente) == esperado(area_id, hoy))
+
+        HorarioMedico.liberar_cupo(horario["id"])
+        db.session.commit()
+        comprobar("liberación actualiza el índice", buscar(app, f"area_id={area_id}")["id"] == horario["id"])
+
+        # Regla en un área sin horarios, después de los días sembrados: el primer día se crea al elegirlo
+        from models.area_model import Area
+        inicio_regla = info["fecha_inicio"] + timedelta(days=info["dias"] + 2)
+        area = Area(nombre="Area reglas")
+        db.session.add(area)
+        db.session.flush()
+        db.session.add(ReglaHorario(
+            medico_id=info["medicos"][0], area_id=area.id, dias_semana=ReglaHorario.mascara(range(7)),
+            turno="T", cupos=4, fecha_inicio=inicio_regla
+        ))
+        db.session.commit()
+        proximos.reconstruir(app.config["PROXIMO_DISPONIBLE_SEGUNDOS"])
+        horario = buscar(app, f"area_id={area.id}")
+        creado = horario and db.session.get(HorarioMedico, horario["id"])
+        comprobar("día de regla materializado",
+                  bool(creado) and creado.fecha == inicio_regla and horario["cupos_disponibles"] == 4,
+                  str(horario))
+
+    if fallos:
+        print(f"Failure: {fallos} casos fallaron")
+        return False
+    print("Success: el índice responde como la base y se actualiza con cada reserva")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if verify_proximo_disponible() else 1)
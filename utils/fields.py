@@ -0,0 +1,191 @@
+"""
+Selección de campos (`fields=`) para los endpoints de listado.
+
+Cada modelo declara un diccionario CAMPOS con la forma:
+
+    "clave_json": (serializador, "ruta.de.atributo", ...)
+
+donde el serializador recibe la instancia y las rutas indican qué columnas
+y relaciones necesita ese campo. A partir de los campos pedidos se arma el
+plan de carga (load_only + joinedload) y solo se serializan esas claves,
+de modo que las relaciones no solicitadas nunca se cargan.
+
+Para los listados de solo lectura, PlanFilas evita además el ORM: consulta
+las mismas columnas como tuplas y arma objetos livianos (sin identity map
+ni instrumentación) sobre los que corren los mismos serializadores, por lo
+que la salida es idéntica a la de to_dict().
+"""
+from functools import lru_cache
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import aliased, joinedload, load_only
+from sqlalchemy.orm.attributes import QueryableAttribute
+
+
+def parsear_campos(valor, disponibles):
+    """
+    Convierte el parámetro `fields` ("id,fecha,estado") en un set de claves.
+    Retorna None si no se envió (todos los campos).
+    Lanza ValueError si alguna clave no existe en `disponibles`.
+    """
+    if valor is None:
+        return None
+
+    campos = [c.strip() for c in valor.split(",") if c.strip()]
+    if not campos:
+        return None
+
+    invalidos = [c for c in campos if c not in disponibles]
+    if invalidos:
+        raise ValueError(f"Campos no válidos: {', '.join(invalidos)}")
+    return set(campos)
+
+
+def _arbol_rutas(rutas):
+    arbol = {}
+    for ruta in rutas:
+        nodo = arbol
+        for parte in ruta.split("."):
+            nodo = nodo.setdefault(parte, {})
+    return arbol
+
+
+def _opciones_modelo(modelo, arbol):
+    mapper = inspect(modelo)
+    columnas = [getattr(modelo, c.key) for c in mapper.primary_key]
+    relaciones = []
+
+    for nombre, subarbol in arbol.items():
+        if nombre in mapper.relationships:
+            destino = mapper.relationships[nombre].mapper.class_
+            relaciones.append(
+                joinedload(getattr(modelo, nombre)).options(*_opciones_modelo(destino, subarbol))
+            )
+        else:
+            columnas.append(getattr(modelo, nombre))
+
+    return [load_only(*columnas), *relaciones]
+
+
+def rutas_campos(definicion, campos=None):
+    """Rutas de atributos que necesitan `campos` (o todos si es None)."""
+    claves = definicion.keys() if campos is None else campos
+    return [ruta for clave in claves for ruta in definicion[clave][1:]]
+
+
+def opciones_carga(modelo, definicion, campos=None):
+    """
+    Plan de carga para serializar `campos` (o todos si es None) según
+    `definicion`, el diccionario CAMPOS del modelo o una extensión de él.
+    """
+    return _opciones_modelo(modelo, _arbol_rutas(rutas_campos(definicion, campos)))
+
+
+def serializar(instancia, definicion, campos=None):
+    """Serializa solo las claves pedidas, en el orden de `definicion`."""
+    return {
+        clave: entrada[0](instancia)
+        for clave, entrada in definicion.items()
+        if campos is None or clave in campos
+    }
+
+
+@lru_cache(maxsize=None)
+def _clase_fila(modelo):
+    """
+    Clase sin instrumentación con las propiedades, métodos y constantes de
+    `modelo`. Sus instancias se llenan directamente con valores de una fila,
+    así que propiedades como Cita.estado_nombre funcionan sin cambios.
+    """
+    atributos = {
+        nombre: valor for nombre, valor in vars(modelo).items()
+        if not nombre.startswith("_") and not isinstance(valor, QueryableAttribute)
+    }
+    return type(f"{modelo.__name__}Fila", (), atributos)
+
+
+class _NodoFila:
+    __slots__ = ("clase", "columnas", "hijos", "indice_pk")
+
+    def __init__(self, clase, columnas, hijos):
+        self.clase = clase
+        self.columnas = columnas  # [(atributo, índice en la fila)]
+        self.hijos = hijos        # [(relación, _NodoFila)]
+        self.indice_pk = columnas[0][1]
+
+
+def _construir(nodo, fila):
+    objeto = nodo.clase()
+    atributos = objeto.__dict__
+    for nombre, indice in nodo.columnas:
+        atributos[nombre] = fila[indice]
+    for nombre, hijo in nodo.hijos:
+        # OUTER JOIN sin coincidencia: la relación no existe
+        atributos[nombre] = _construir(hijo, fila) if fila[hijo.indice_pk] is not None else None
+    return objeto
+
+
+class PlanFilas:
+    """
+    Lectura por columnas de `modelo` y las relaciones de `rutas`.
+
+    - aplicar(query): reemplaza las entidades de una consulta ya filtrada por
+      las columnas necesarias, con un OUTER JOIN (alias propio) por relación.
+    - construir(fila): arma el objeto liviano de una fila de esa consulta.
+
+    Las columnas del modelo raíz se etiquetan con su nombre, de modo que la
+    paginación por cursor puede leer la clave de ordenamiento de la fila.
+    Solo admite relaciones many-to-one.
+    """
+
+    def __init__(self, modelo, rutas):
+        self.columnas = []
+        self.joins = []
+        self.raiz = self._nodo(modelo, modelo, _arbol_rutas(rutas), "")
+
+    def _nodo(self, modelo, entidad, arbol, prefijo):
+        mapper = inspect(modelo)
+        nombres = [c.key for c in mapper.primary_key]
+        nombres += [n for n in arbol if n not in mapper.relationships and n not in nombres]
+
+        columnas = []
+        for nombre in nombres:
+            columnas.append((nombre, len(self.columnas)))
+            self.columnas.append(getattr(entidad, nombre).label(prefijo + nombre))
+
+        hijos = []
+        for nombre, subarbol in arbol.items():
+            if nombre not in mapper.relationships:
+                continue
+            relacion = mapper.relationships[nombre]
+            if relacion.uselist:
+                raise ValueError(f"{modelo.__name__}.{nombre}: solo se admiten relaciones many-to-one")
+            destino = aliased(relacion.mapper.class_)
+            self.joins.append(getattr(entidad, nombre).of_type(destino))
+            hijos.append((nombre, self._nodo(relacion.mapper.class_, destino, subarbol, f"{prefijo}{nombre}__")))
+
+        return _NodoFila(_clase_fila(modelo), columnas, hijos)
+
+    def aplicar(self, query):
+        query = query.with_entities(*self.columnas)
+        for relacion in self.joins:
+            query = query.outerjoin(relacion)
+        return query
+
+    def construir(self, fila):
+        return _construir(self.raiz, fila)
+
+
+@lru_cache(maxsize=256)
+def _plan_cacheado(modelo, rutas):
+    return PlanFilas(modelo, rutas)
+
+
+def plan_filas(modelo, rutas):
+    """PlanFilas para `rutas`, compilado una sola vez por combinación."""
+    return _plan_cacheado(modelo, tuple(sorted(set(rutas))))
+
+
+def plan_campos(modelo, definicion, campos=None):
+    """PlanFilas para serializar `campos` (o todos) según `definicion`."""
+    return plan_filas(modelo, rutas_campos(definicion, campos))
@@ -0,0 +1,146 @@
+"""
+Utilidades de paginación compartidas por los controladores.
+
+Paginación por página: `paginar` obtiene las filas de la página y el total
+en una sola consulta usando COUNT(*) OVER (), en lugar del COUNT separado
+de Flask-SQLAlchemy que repite todos los JOIN y filtros.
+
+Paginación por cursor (keyset): en lugar de OFFSET + COUNT(*), cada página
+continúa a partir de la clave de ordenamiento de la última fila entregada,
+por lo que el costo de una página no depende de su profundidad.
+"""
+import base64
+import json
+import math
+from collections import namedtuple
+from datetime import date, datetime
+
+from sqlalchemy import and_, or_, false, func
+
+# Mismos atributos que usan los controladores del objeto Pagination de Flask-SQLAlchemy
+Pagina = namedtuple("Pagina", ["items", "total", "pages", "page", "per_page"])
+
+
+def _soporta_window(dialect):
+    """Indica si el motor soporta funciones de ventana (COUNT(*) OVER ())."""
+    if dialect.name == "sqlite":
+        return dialect.dbapi.sqlite_version_info >= (3, 25, 0)
+    if dialect.name in ("mysql", "mariadb"):
+        version = dialect.server_version_info or (0,)
+        return version >= ((10, 2) if getattr(dialect, "is_mariadb", False) else (8, 0))
+    return True
+
+
+def paginar(query, page, per_page):
+    """
+    Pagina `query` (ya filtrada y ordenada) y retorna un objeto Pagina.
+
+    Las filas y el total salen de la misma consulta. Solo si la página pedida
+    está fuera de rango (no trae filas) se ejecuta un COUNT aparte para
+    informar el total. En motores sin funciones de ventana se usa paginate().
+    """
+    page = page if page and page > 0 else 1
+    per_page = per_page if per_page and per_page > 0 else 20
+
+    if not _soporta_window(query.session.get_bind().dialect):
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        return Pagina(pagination.items, pagination.total, pagination.pages, page, per_page)
+
+    filas = query.add_columns(func.count().over().label("total_filas"))\
+        .offset((page - 1) * per_page).limit(per_page).all()
+
+    if filas:
+        total = filas[0][-1]
+    elif page == 1:
+        total = 0
+    else:
+        total = query.order_by(None).count()
+
+    # Consulta de una entidad: la instancia. Consulta por columnas: la fila sin el total
+    una_entidad = len(query.column_descriptions) == 1
+    items = [fila[0] if una_entidad else fila[:-1] for fila in filas]
+    pages = math.ceil(total / per_page) if total else 0
+    return Pagina(items, total, pages, page, per_page)
+
+
+def codificar_cursor(valores):
+    """Serializa los valores de la clave de ordenamiento en un token opaco."""
+    serializados = [v.isoformat() if isinstance(v, (date, datetime)) else v for v in valores]
+    raw = json.dumps(serializados, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decodificar_cursor(token, tipos):
+    """
+    Reconstruye los valores de un cursor generado por codificar_cursor.
+    `tipos` indica el tipo de cada posición (date, datetime o int).
+    Lanza ValueError si el token no es válido.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        valores = json.loads(raw)
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+    if not isinstance(valores, list) or len(valores) != len(tipos):
+        raise ValueError("Cursor inválido")
+
+    resultado = []
+    try:
+        for valor, tipo in zip(valores, tipos):
+            if valor is None:
+                resultado.append(None)
+            elif tipo is datetime:
+                resultado.append(datetime.fromisoformat(valor))
+            elif tipo is date:
+                resultado.append(date.fromisoformat(valor))
+            else:
+                resultado.append(tipo(valor))
+    except (TypeError, ValueError):
+        raise ValueError("Cursor inválido")
+    return resultado
+
+
+def filtro_keyset(claves, valores):
+    """
+    Condición "viene después de `valores`" para un orden DESC NULLS LAST
+    sobre `claves`, una lista de tuplas (columna, admite_nulos).
+    """
+    (columna, admite_nulos), valor = claves[0], valores[0]
+    resto = filtro_keyset(claves[1:], valores[1:]) if len(claves) > 1 else None
+
+    if valor is None:
+        # Con NULLS LAST, después de un nulo solo quedan otros nulos
+        return and_(columna.is_(None), resto) if resto is not None else false()
+
+    siguiente = or_(columna < valor, columna.is_(None)) if admite_nulos else columna < valor
+    if resto is None:
+        return siguiente
+    return or_(siguiente, and_(columna == valor, resto))
+
+
+def paginar_por_cursor(query, claves, cursor, per_page):
+    """
+    Aplica orden y filtro keyset a `query` y retorna (items, next_cursor).
+
+    - claves: lista de (columna, admite_nulos) que definen el orden DESC NULLS LAST.
+      La última debe ser única (normalmente el id) para desempatar.
+    - cursor: token recibido del cliente, o vacío/None para la primera página.
+
+    No ejecuta COUNT: se pide una fila extra para saber si hay más páginas.
+    """
+    per_page = max(1, per_page)
+    if cursor:
+        tipos = [columna.type.python_type for columna, _ in claves]
+        valores = decodificar_cursor(cursor, tipos)
+        query = query.filter(filtro_keyset(claves, valores))
+
+    query = query.order_by(*[columna.desc().nullslast() for columna, _ in claves])
+    filas = query.limit(per_page + 1).all()
+
+    items = filas[:per_page]
+    next_cursor = None
+    if len(filas) > per_page:
+        ultimo = items[-1]
+        next_cursor = codificar_cursor([getattr(ultimo, columna.key) for columna, _ in claves])
+    return items, next_cursor